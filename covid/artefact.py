@@ -0,0 +1,224 @@
+"""Inter-task artefacts stored as a directory of memory-mappable `.npy`
+arrays and JSON metadata"""
+
+import collections.abc
+import hashlib
+import json
+import os
+import pickle as pkl
+import shutil
+
+import numpy as np
+import pandas as pd
+import xarray
+
+__all__ = ["Artefact", "save_artefact", "open_artefact", "is_artefact"]
+
+FORMAT = "covid-artefact"
+VERSION = 1
+METADATA_FILE = "meta.json"
+
+
+def _as_saveable(arr):
+    """Converts object arrays, e.g. of strings, to fixed-width strings, so
+    that they may be saved and loaded without pickle"""
+    arr = np.asarray(arr)
+    if arr.dtype == object:
+        arr = arr.astype(str)
+    return arr
+
+
+def _digest(arr):
+    """Returns the SHA-256 hex digest of an array's dtype, shape, and data"""
+    hasher = hashlib.sha256(f"{arr.dtype.str}{arr.shape}".encode())
+    hasher.update(np.ascontiguousarray(arr).reshape(-1).view(np.uint8).data)
+    return hasher.hexdigest()
+
+
+class _Writer:
+    def __init__(self, path):
+        self.path = path
+
+    def array(self, arr):
+        # Files are named by content, so a variable's metadata determines
+        # its content
+        arr = _as_saveable(arr)
+        filename = f"{_digest(arr)[:32]}.npy"
+        np.save(os.path.join(self.path, filename), arr, allow_pickle=False)
+        return filename
+
+    def spec(self, value):
+        spec = self.variable(value)
+        spec["hash"] = hashlib.sha256(
+            json.dumps(spec, sort_keys=True).encode()
+        ).hexdigest()
+        return spec
+
+    def variable(self, value):
+        if isinstance(value, xarray.DataArray):
+            return dict(
+                type="dataarray",
+                file=self.array(value.values),
+                dims=list(value.dims),
+                coords={
+                    k: dict(dims=list(v.dims), file=self.array(v.values))
+                    for k, v in value.coords.items()
+                },
+                name=value.name,
+            )
+        if isinstance(value, pd.DataFrame):
+            return dict(
+                type="dataframe",
+                columns={str(k): self.array(v) for k, v in value.items()},
+                index=self.array(value.index),
+                index_name=value.index.name,
+            )
+        if isinstance(value, (np.ndarray, np.generic, list, tuple)):
+            if isinstance(value, np.generic) or np.ndim(value) > 0:
+                return dict(type="array", file=self.array(value))
+        if value is None or isinstance(value, (bool, int, float, str, dict)):
+            try:
+                json.dumps(value)
+            except TypeError as e:
+                raise TypeError(f"Cannot store {value} in an artefact") from e
+            return dict(type="value", value=value)
+        raise TypeError(f"Cannot store a {type(value).__name__} in an artefact")
+
+
+def save_artefact(path, variables):
+    """Saves a dictionary of variables as an artefact directory.
+
+    Arrays, and the values and coordinates of `xarray.DataArray`s and
+    `pd.DataFrame` columns, are saved as `.npy` files, and names, types,
+    dims, scalar values, and a SHA-256 content hash of each variable as
+    JSON in `meta.json`.  The artefact is
+    written to a temporary directory and renamed into place, so readers
+    never see a partial artefact.
+
+    :param path: the artefact directory to create, replacing any existing
+                 artefact
+    :param variables: a dictionary of `np.ndarray`, lists or tuples of
+                      array-likes, `xarray.DataArray`, `pd.DataFrame`, and
+                      `None`, `bool`, `int`, `float`, `str`, or
+                      JSON-serialisable `dict` values, e.g. configuration
+    """
+    tmp_path = f"{path.rstrip(os.sep)}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    writer = _Writer(tmp_path)
+    metadata = dict(
+        format=FORMAT,
+        version=VERSION,
+        variables={k: writer.spec(v) for k, v in variables.items()},
+    )
+    with open(os.path.join(tmp_path, METADATA_FILE), "w") as f:
+        json.dump(metadata, f, indent=1)
+
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+    os.replace(tmp_path, path)
+
+
+def is_artefact(path):
+    """Returns `True` if `path` is an artefact directory"""
+    return os.path.isfile(os.path.join(path, METADATA_FILE))
+
+
+def _load(path, spec, mmap_mode):
+    def array(filename):
+        return np.load(
+            os.path.join(path, filename),
+            mmap_mode=mmap_mode,
+            allow_pickle=False,
+        )
+
+    if spec["type"] == "array":
+        return array(spec["file"])
+    if spec["type"] == "value":
+        return spec["value"]
+    if spec["type"] == "dataarray":
+        return xarray.DataArray(
+            array(spec["file"]),
+            coords={
+                k: (v["dims"], array(v["file"]))
+                for k, v in spec["coords"].items()
+            },
+            dims=spec["dims"],
+            name=spec["name"],
+        )
+    if spec["type"] == "dataframe":
+        # DataFrames are small tables, so are copied into memory
+        return pd.DataFrame(
+            {k: np.array(array(v)) for k, v in spec["columns"].items()},
+            index=pd.Index(
+                np.array(array(spec["index"])), name=spec["index_name"]
+            ),
+        )
+    raise ValueError(f"Unknown artefact variable type '{spec['type']}'")
+
+
+class Artefact(collections.abc.Mapping):
+    """A read-only mapping of the variables of an artefact, each loaded on
+    first access.
+
+    :param path: an artefact directory
+    :param mmap_mode: the `np.load` memory-map mode, or `None` to read
+                      arrays into memory
+    """
+
+    def __init__(self, path, mmap_mode="r"):
+        with open(os.path.join(path, METADATA_FILE), "r") as f:
+            metadata = json.load(f)
+        if metadata.get("format") != FORMAT or metadata["version"] > VERSION:
+            raise ValueError(f"'{path}' is not a version {VERSION} artefact")
+        self.path = path
+        self.mmap_mode = mmap_mode
+        self._specs = metadata["variables"]
+        self._loaded = {}
+
+    def __getitem__(self, name):
+        if name not in self._loaded:
+            self._loaded[name] = _load(
+                self.path, self._specs[name], self.mmap_mode
+            )
+        return self._loaded[name]
+
+    def __iter__(self):
+        return iter(self._specs)
+
+    def __len__(self):
+        return len(self._specs)
+
+    def hash(self, name):
+        """Returns the SHA-256 content hash of variable `name`, without
+        loading it"""
+        return self._specs[name]["hash"]
+
+
+def open_artefact(path, keys=None, mmap_mode="r"):
+    """Opens an artefact, without reading its arrays into memory.
+
+    Variables are loaded on first access, and arrays are memory-mapped, so
+    only the variables and slices that are used are read from disc.  For
+    compatibility with earlier pipeline runs, `path` may instead be a
+    pickle file, which is loaded whole.
+
+    :param path: an artefact directory, or a pickle file
+    :param keys: an optional list of the variables to load
+    :param mmap_mode: the `np.load` memory-map mode, or `None` to read
+                      arrays into memory
+    :returns: an `Artefact`, or a dictionary of variables if `path` is a
+              pickle or `keys` is given
+    """
+    if is_artefact(path):
+        variables = Artefact(path, mmap_mode)
+    else:
+        with open(path, "rb") as f:
+            variables = pkl.load(f)
+    if keys is not None:
+        variables = {k: variables[k] for k in keys}
+    return variables
@@ -0,0 +1,58 @@
+"""Tests the artefact store"""
+
+import os
+import pickle as pkl
+
+import numpy as np
+import pandas as pd
+import xarray
+
+from covid.artefact import save_artefact, open_artefact, is_artefact
+
+
+def _variables():
+    return dict(
+        C=np.random.default_rng(0).uniform(size=[3, 3]),
+        date_range=[np.datetime64("2021-01-01"), np.datetime64("2021-02-01")],
+        locations=pd.DataFrame(
+            {"lad19cd": np.array(["E1", "E2", "E3"], dtype=object)}
+        ),
+        cases=xarray.DataArray(
+            np.arange(6).reshape(3, 2),
+            coords=[
+                np.array(["E1", "E2", "E3"], dtype=object),
+                pd.date_range("2021-01-01", periods=2),
+            ],
+            dims=["lad19cd", "date"],
+        ),
+        mobility_sparsity=dict(threshold=0.1, top_k=None),
+    )
+
+
+def test_artefact_roundtrip(tmp_path):
+    path = os.path.join(tmp_path, "data")
+    variables = _variables()
+    save_artefact(path, variables)
+    save_artefact(path, variables)  # Replaces an existing artefact
+
+    assert is_artefact(path)
+    loaded = open_artefact(path)
+    assert isinstance(loaded["C"], np.memmap)
+    np.testing.assert_array_equal(loaded["C"], variables["C"])
+    assert loaded["date_range"][1] == variables["date_range"][1]
+    pd.testing.assert_frame_equal(
+        loaded["locations"], variables["locations"], check_dtype=False
+    )
+    xarray.testing.assert_equal(loaded["cases"], variables["cases"])
+    assert loaded["mobility_sparsity"] == variables["mobility_sparsity"]
+
+    assert list(open_artefact(path, keys=["C"])) == ["C"]
+
+
+def test_open_pickle(tmp_path):
+    path = os.path.join(tmp_path, "data.pkl")
+    with open(path, "wb") as f:
+        pkl.dump(dict(x=np.ones(3), y=1.0), f)
+
+    assert not is_artefact(path)
+    assert open_artefact(path, keys=["y"]) == dict(y=1.0)
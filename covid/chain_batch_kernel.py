@@ -0,0 +1,72 @@
+"""Runs independent Markov chains as a batch dimension of one kernel"""
+
+import tensorflow as tf
+import tensorflow_probability as tfp
+
+__all__ = ["ChainBatchKernel"]
+
+
+class ChainBatchKernel(tfp.mcmc.TransitionKernel):
+    """Vectorizes a single-chain transition kernel over a leading chain
+    dimension of the state and kernel results.
+
+    Each chain receives its own seed, split from the seed passed to
+    `one_step`.  Operations that cannot be vectorized fall back to a
+    `tf.while_loop` over chains, so arbitrary single-chain kernels may be
+    wrapped.  Traced samples and results from `tfp.mcmc.sample_chain` then
+    have shape `[num_results, num_chains, ...]`, as expected by the
+    `tfp.mcmc` convergence diagnostics.
+
+    :param inner_kernel: a single-chain `TransitionKernel`
+    :param num_chains: the number of chains
+    :param name: an optional name
+    """
+
+    def __init__(self, inner_kernel, num_chains, name=None):
+        self._parameters = dict(
+            inner_kernel=inner_kernel, num_chains=num_chains, name=name
+        )
+
+    @property
+    def inner_kernel(self):
+        return self._parameters["inner_kernel"]
+
+    @property
+    def num_chains(self):
+        return self._parameters["num_chains"]
+
+    @property
+    def name(self):
+        return self._parameters["name"]
+
+    @property
+    def parameters(self):
+        return self._parameters
+
+    @property
+    def is_calibrated(self):
+        return self.inner_kernel.is_calibrated
+
+    def one_step(self, current_state, previous_results, seed=None):
+        with tf.name_scope(self.name or "chain_batch_kernel"):
+            seeds = tf.stack(
+                tfp.random.split_seed(seed, n=self.num_chains, salt="chains")
+            )
+
+            def fn(args):
+                state, results, seed_ = args
+                return self.inner_kernel.one_step(state, results, seed=seed_)
+
+            return tf.vectorized_map(
+                fn,
+                elems=(current_state, previous_results, seeds),
+                fallback_to_while_loop=True,
+            )
+
+    def bootstrap_results(self, current_state):
+        with tf.name_scope(self.name or "chain_batch_kernel"):
+            return tf.vectorized_map(
+                self.inner_kernel.bootstrap_results,
+                elems=current_state,
+                fallback_to_while_loop=True,
+            )
@@ -0,0 +1,29 @@
+"""Tests the chain batch kernel"""
+
+import numpy as np
+import tensorflow as tf
+import tensorflow_probability as tfp
+
+from covid.chain_batch_kernel import ChainBatchKernel
+
+
+def test_chain_batch_kernel():
+    def target_log_prob_fn(x):
+        return -0.5 * tf.reduce_sum(x**2)
+
+    kernel = ChainBatchKernel(
+        tfp.mcmc.RandomWalkMetropolis(target_log_prob_fn), num_chains=3
+    )
+    init_state = np.zeros([3, 2], dtype=np.float64)
+    samples, is_accepted = tfp.mcmc.sample_chain(
+        10,
+        init_state,
+        kernel=kernel,
+        trace_fn=lambda _, results: results.is_accepted,
+        seed=[0, 1],
+    )
+
+    assert samples.shape == [10, 3, 2]
+    assert is_accepted.shape == [10, 3]
+    # Chains receive distinct seeds
+    assert not np.allclose(samples[:, 0], samples[:, 1])
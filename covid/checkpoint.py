@@ -0,0 +1,148 @@
+"""Checkpointing of MCMC chain state to the posterior HDF5 file"""
+
+import h5py
+import numpy as np
+import tensorflow as tf
+
+__all__ = [
+    "PosteriorAppender",
+    "burst_seed",
+    "write_checkpoint",
+    "read_checkpoint",
+    "has_checkpoint",
+]
+
+CHECKPOINT_GROUP = "checkpoint"
+
+
+class PosteriorAppender:
+    """Re-opens an existing posterior HDF5 file to continue writing
+    samples and results.  Mirrors the write interface of
+    `gemlib.mcmc.Posterior`.
+
+    :param filename: the name of an existing posterior HDF5 file
+    """
+
+    def __init__(self, filename):
+        self._file = h5py.File(
+            filename, "r+", rdcc_nbytes=1024**2 * 200, rdcc_nslots=100000
+        )
+
+    def __del__(self):
+        self._file.close()
+
+    def __getitem__(self, path):
+        return self._file[path]
+
+    def _write(self, data_dict, group, first_dim_offset):
+        for k, v in data_dict.items():
+            if isinstance(v, dict):
+                self._write(v, group[k], first_dim_offset)
+            else:
+                v = np.asarray(v)
+                group[k][
+                    first_dim_offset : (first_dim_offset + v.shape[0]), ...
+                ] = v
+
+    def write_samples(self, samples, first_dim_offset=0):
+        self._write(samples, self._file["samples"], first_dim_offset)
+        self._file.flush()
+
+    def write_results(self, results, first_dim_offset=0):
+        self._write(results, self._file["results"], first_dim_offset)
+        self._file.flush()
+
+
+def burst_seed(seed, burst):
+    """Returns the stateless seed for a burst of MCMC iterations.
+
+    Each burst's seed is a deterministic function of the chain's base
+    `seed` and the burst index, such that a resumed chain continues the
+    same random number stream.
+
+    :param seed: the base integer seed of the chain
+    :param burst: the burst index
+    :returns: a `[2]` int32 stateless seed
+    """
+    return np.array([seed, burst], dtype=np.int32)
+
+
+def has_checkpoint(h5file):
+    return (
+        CHECKPOINT_GROUP in h5file and "burst" in h5file[CHECKPOINT_GROUP].attrs
+    )
+
+
+def write_checkpoint(h5file, state, kernel_results, seed, burst):
+    """Writes the chain state at the end of `burst` into `h5file`.
+
+    The checkpoint is overwritten in place, so the file only holds the
+    most recent burst.  The burst index is written last.
+
+    :param h5file: an open, writable `h5py.File`
+    :param state: a list of chain state parts
+    :param kernel_results: the final kernel results of the burst
+    :param seed: the base integer seed of the chain
+    :param burst: the index of the burst just completed
+    """
+    group = h5file.require_group(CHECKPOINT_GROUP)
+
+    def write_leaves(name, structure):
+        subgroup = group.require_group(name)
+        for i, leaf in enumerate(tf.nest.flatten(structure)):
+            if leaf is None:
+                continue
+            leaf = np.asarray(leaf)
+            key = str(i)
+            if key in subgroup and subgroup[key].shape == leaf.shape:
+                subgroup[key][...] = leaf
+            else:
+                if key in subgroup:
+                    del subgroup[key]
+                subgroup.create_dataset(key, data=leaf)
+
+    write_leaves("state", state)
+    write_leaves("kernel_results", kernel_results)
+    group.attrs["seed"] = seed
+    h5file.flush()
+    group.attrs["burst"] = burst
+    h5file.flush()
+
+
+def read_checkpoint(h5file, state_template, results_template):
+    """Reads a checkpoint written by `write_checkpoint`.
+
+    :param h5file: an open `h5py.File`
+    :param state_template: a list of state parts with the structure and
+                           dtypes of the chain state
+    :param results_template: kernel results with the structure and dtypes
+                             of the final kernel results, e.g. as returned
+                             by the kernel's `bootstrap_results` method.
+    :returns: a tuple `(state, kernel_results, seed, burst)`
+    """
+    if not has_checkpoint(h5file):
+        raise ValueError(f"No checkpoint found in '{h5file.filename}'")
+
+    group = h5file[CHECKPOINT_GROUP]
+
+    def read_leaves(name, template):
+        subgroup = group[name]
+        leaves = []
+        for i, leaf in enumerate(tf.nest.flatten(template)):
+            if leaf is None:
+                leaves.append(None)
+                continue
+            leaves.append(
+                tf.convert_to_tensor(
+                    subgroup[str(i)][()],
+                    dtype=tf.convert_to_tensor(leaf).dtype,
+                )
+            )
+        return tf.nest.pack_sequence_as(template, leaves)
+
+    return (
+        read_leaves("state", state_template),
+        read_leaves("kernel_results", results_template),
+        int(group.attrs["seed"]),
+        int(group.attrs["burst"]),
+    )
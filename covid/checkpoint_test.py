@@ -0,0 +1,42 @@
+"""Tests MCMC checkpointing"""
+
+import collections
+import h5py
+import numpy as np
+import pytest
+
+from covid.checkpoint import read_checkpoint, write_checkpoint
+
+
+Results = collections.namedtuple("Results", ["target_log_prob", "inner"])
+
+
+def test_checkpoint_roundtrip(tmp_path):
+
+    state = [np.array([0.6, 0.1]), np.zeros([2, 3])]
+    results = Results(np.float64(-10.0), [np.arange(4, dtype=np.int32), None])
+
+    with h5py.File(tmp_path / "posterior.hd5", "w") as f:
+        write_checkpoint(f, state, results, seed=2, burst=0)
+        write_checkpoint(
+            f,
+            [s + 1 for s in state],
+            results._replace(target_log_prob=1.0),
+            2,
+            1,
+        )
+
+    with h5py.File(tmp_path / "posterior.hd5", "r") as f:
+        state_, results_, seed, burst = read_checkpoint(f, state, results)
+
+    assert (seed, burst) == (2, 1)
+    np.testing.assert_array_equal(state_[0], state[0] + 1)
+    assert results_.target_log_prob.numpy() == 1.0
+    assert results_.inner[0].dtype.as_numpy_dtype == np.int32
+    assert results_.inner[1] is None
+
+
+def test_missing_checkpoint(tmp_path):
+    with h5py.File(tmp_path / "posterior.hd5", "w") as f:
+        with pytest.raises(ValueError):
+            read_checkpoint(f, [np.zeros(1)], None)
@@ -1,5 +1,46 @@
 """Tensorflow configuration options"""
+import os
+
 import tensorflow as tf
 import numpy as np
 
 floatX = np.float64
+
+PRECISIONS = {"float64": np.float64, "float32": np.float32}
+
+
+def precision_dtype(precision=None):
+    """Returns the floating point dtype for a precision option
+
+    :param precision: one of `PRECISIONS`, or `None` for `floatX`
+    :returns: a numpy dtype
+    """
+    if precision is None:
+        return floatX
+    try:
+        return PRECISIONS[precision]
+    except KeyError:
+        raise ValueError(
+            f"Unknown precision '{precision}', expected one of "
+            f"{list(PRECISIONS)}"
+        ) from None
+
+
+def mcmc_output_options(config, output_file):
+    """Resolves the posterior output options of an `Mcmc` configuration.
+
+    Keys left empty in the YAML configuration, i.e. `None`, take their
+    defaults.
+
+    :param config: the `Mcmc` configuration dictionary
+    :param output_file: the posterior HDF5 file
+    :returns: a dictionary of `read_stride`, `compression`,
+              `write_queue_size`, and `telemetry_file`
+    """
+    return dict(
+        read_stride=int(config.get("read_stride") or 1),
+        compression=config.get("compression") or "lzf",
+        write_queue_size=int(config.get("write_queue_size") or 1),
+        telemetry_file=config.get("telemetry_file")
+        or os.path.splitext(output_file)[0] + ".telemetry.jsonl",
+    )
@@ -0,0 +1,53 @@
+"""Tests configuration options"""
+
+import os
+
+import h5py
+import numpy as np
+import yaml
+
+from covid.config import mcmc_output_options
+from covid.posterior_layout import create_posterior
+from covid.posterior_writer import AsyncPosteriorWriter
+from covid.telemetry import TelemetryLog
+
+EXAMPLE_CONFIG = os.path.join(
+    os.path.dirname(__file__), os.pardir, "example_config.yaml"
+)
+
+
+def test_mcmc_output_options_example_config(tmp_path):
+    with open(EXAMPLE_CONFIG, "r") as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+
+    output_file = str(tmp_path / "posterior.hd5")
+    options = mcmc_output_options(config["Mcmc"], output_file)
+    assert options["read_stride"] == 1
+    assert options["telemetry_file"] == str(
+        tmp_path / "posterior.telemetry.jsonl"
+    )
+
+    posterior = create_posterior(
+        output_file,
+        sample_dict={"beta1": np.zeros([5, 4])},
+        results_dict={"block0": {"is_accepted": np.zeros([5], bool)}},
+        num_samples=10,
+        burst_length=5,
+        read_stride=options["read_stride"],
+        compression=options["compression"],
+    )
+    writer = AsyncPosteriorWriter(
+        posterior, max_queued=options["write_queue_size"]
+    )
+    writer.close()
+    with TelemetryLog(
+        options["telemetry_file"],
+        h5group=posterior["/"].file.require_group("telemetry"),
+        num_bursts=2,
+    ) as telemetry:
+        telemetry.record(0, {"sample_time": 1.0})
+    del posterior
+
+    with h5py.File(output_file, "r") as f:
+        assert f.attrs["compression"] == "lzf"
+        assert f["telemetry/sample_time"][0] == 1.0
@@ -0,0 +1,63 @@
+"""Covariate data with lazily loaded fields"""
+
+import hashlib
+
+from covid.artefact import Artefact, is_artefact, open_artefact, save_artefact
+
+__all__ = ["CovariateStore", "save_covariates", "open_covariates"]
+
+FIELDS = ("C", "W", "N", "weekday", "date_range", "locations", "cases")
+
+
+class CovariateStore(Artefact):
+    """Covariate data, as returned by `covid.model_spec.gather_data`, whose
+    fields are loaded on first access.
+
+    Each field is stored in its own files, so a task that uses only `N` or
+    `locations` reads only those, and arrays are memory-mapped.  Each field
+    has a content hash, such that data derived from covariates may be
+    cached against the fields it depends on.
+
+    :param path: a covariate artefact directory, see `save_covariates`
+    :param mmap_mode: the `np.load` memory-map mode, or `None` to read
+                      arrays into memory
+    """
+
+    def fingerprint(self, names=None):
+        """Returns a hash of the contents of fields `names`
+
+        :param names: a list of field names, by default all fields
+        :returns: a SHA-256 hex digest
+        """
+        if names is None:
+            names = sorted(self)
+        hasher = hashlib.sha256()
+        for name in names:
+            hasher.update(f"{name}:{self.hash(name)};".encode())
+        return hasher.hexdigest()
+
+
+def save_covariates(path, covariates):
+    """Saves covariate data as a `CovariateStore`
+
+    :param path: the directory to create
+    :param covariates: a dictionary of covariate data, as returned by
+                       `covid.model_spec.gather_data`
+    """
+    missing = [k for k in FIELDS if k not in covariates]
+    if len(missing) > 0:
+        raise KeyError(f"Covariate data is missing fields {missing}")
+    save_artefact(path, covariates)
+
+
+def open_covariates(path, mmap_mode="r"):
+    """Opens covariate data, loading no fields until they are accessed
+
+    :param path: a directory written by `save_covariates`, or, for
+                 compatibility with earlier pipeline runs, a pickle file
+    :param mmap_mode: the `np.load` memory-map mode
+    :returns: a `CovariateStore`, or a dictionary if `path` is a pickle
+    """
+    if is_artefact(path):
+        return CovariateStore(path, mmap_mode)
+    return open_artefact(path)
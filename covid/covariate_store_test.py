@@ -0,0 +1,50 @@
+"""Tests the lazily loaded covariate store"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray
+
+from covid.covariate_store import save_covariates, open_covariates
+
+
+def _covariates(N):
+    locations = np.array(["E1", "E2"], dtype=object)
+    return dict(
+        C=np.ones([2, 2]),
+        W=np.ones([4]),
+        N=np.asarray(N, dtype=np.float64),
+        weekday=np.array([1.0, 1.0, 0.0, 0.0]),
+        date_range=[np.datetime64("2021-01-01"), np.datetime64("2021-01-05")],
+        locations=pd.DataFrame({"lad19cd": locations}),
+        cases=xarray.DataArray(
+            np.zeros([2, 4]),
+            coords=[locations, pd.date_range("2021-01-01", periods=4)],
+            dims=["lad19cd", "date"],
+        ),
+    )
+
+
+def test_covariate_store(tmp_path):
+    path = os.path.join(tmp_path, "pipeline_data")
+    save_covariates(path, _covariates([100.0, 200.0]))
+
+    store = open_covariates(path)
+    np.testing.assert_array_equal(store["N"], [100.0, 200.0])
+    assert list(store._loaded) == ["N"]
+    assert store["date_range"][0] == np.datetime64("2021-01-01")
+
+    fingerprint = store.fingerprint(["C", "N"])
+    save_covariates(path, _covariates([100.0, 300.0]))
+    changed = open_covariates(path)
+    assert changed.hash("C") == store.hash("C")
+    assert changed.hash("N") != store.hash("N")
+    assert changed.fingerprint(["C", "N"]) != fingerprint
+    assert changed.fingerprint(["C"]) == store.fingerprint(["C"])
+
+
+def test_missing_fields(tmp_path):
+    with pytest.raises(KeyError):
+        save_covariates(os.path.join(tmp_path, "data"), dict(N=np.ones(2)))
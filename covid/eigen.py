@@ -0,0 +1,213 @@
+"""Batched dominant eigenvalue solvers"""
+
+import collections
+
+import tensorflow as tf
+
+__all__ = ["EigenResult", "dominant_eigenvalue", "METHODS"]
+
+METHODS = ("power", "lanczos", "arnoldi")
+
+EigenResult = collections.namedtuple(
+    "EigenResult", ["eigenvalue", "eigenvector", "num_iterations", "converged"]
+)
+EigenResult.__doc__ = """The dominant eigenpairs of a batch of matrices
+
+:param eigenvalue: the [B] dominant eigenvalues
+:param eigenvector: the [B, M] corresponding unit eigenvectors
+:param num_iterations: the [B] number of iterations (power) or restarts
+                       (Lanczos, Arnoldi) each matrix took to converge
+:param converged: a [B] boolean mask of converged matrices
+"""
+
+
+def _normalise(v):
+    return v / tf.linalg.norm(v, axis=-1, keepdims=True)
+
+
+def _residual(A, eigenvalue, eigenvector):
+    """Relative residual `|Av - lambda v| / |lambda|`"""
+    r = (
+        tf.linalg.matvec(A, eigenvector)
+        - eigenvalue[:, tf.newaxis] * eigenvector
+    )
+    return tf.linalg.norm(r, axis=-1) / tf.math.abs(eigenvalue)
+
+
+def _power_step(A, v):
+    w = tf.linalg.matvec(A, v)
+    eigenvalue = tf.reduce_sum(v * w, axis=-1)  # Rayleigh quotient, |v| = 1
+    return eigenvalue, _normalise(w)
+
+
+def _krylov_factorisation(A, v, krylov_dim):
+    """Builds a `krylov_dim` Arnoldi factorisation from `v`, returning the
+    [B, k, k] Hessenberg matrices and [B, M, k] Krylov bases"""
+    basis = [v]
+    H = [[None] * krylov_dim for _ in range(krylov_dim)]
+    for j in range(krylov_dim):
+        w = tf.linalg.matvec(A, basis[j])
+        # Full (modified Gram-Schmidt) orthogonalisation, also used for
+        # Lanczos for numerical stability
+        for i in range(j + 1):
+            H[i][j] = tf.reduce_sum(basis[i] * w, axis=-1)
+            w = w - H[i][j][:, tf.newaxis] * basis[i]
+        if j + 1 < krylov_dim:
+            H[j + 1][j] = tf.linalg.norm(w, axis=-1)
+            basis.append(tf.math.divide_no_nan(w, H[j + 1][j][:, tf.newaxis]))
+
+    zeros = tf.zeros_like(v[:, 0])
+    H = tf.stack(
+        [
+            tf.stack([h if h is not None else zeros for h in row], -1)
+            for row in H
+        ],
+        axis=-2,
+    )  # [B, k, k]
+    V = tf.stack(basis, axis=-1)  # [B, M, k]
+    return H, V
+
+
+def _ritz_pair(H, V, symmetric):
+    """Returns the dominant Ritz pair of a Krylov factorisation"""
+    if symmetric:
+        ritz_values, ritz_vectors = tf.linalg.eigh(
+            0.5 * (H + tf.linalg.matrix_transpose(H))
+        )
+        idx = tf.argmax(ritz_values, axis=-1)
+    else:
+        ritz_values, ritz_vectors = tf.linalg.eig(H)
+        idx = tf.argmax(tf.math.real(ritz_values), axis=-1)
+        ritz_values = tf.math.real(ritz_values)
+        ritz_vectors = tf.math.real(ritz_vectors)
+    eigenvalue = tf.gather(ritz_values, idx, batch_dims=1)
+    y = tf.gather(
+        tf.linalg.matrix_transpose(ritz_vectors), idx, batch_dims=1
+    )  # [B, k]
+    eigenvector = _normalise(tf.linalg.matvec(V, y))
+    # Fix the sign, such that Perron vectors are positive
+    eigenvector = eigenvector * tf.math.sign(
+        tf.reduce_sum(eigenvector, axis=-1, keepdims=True)
+    )
+    return eigenvalue, eigenvector
+
+
+def _iterate(A, v, step, tol, max_iterations):
+    """Applies `step` to the eigenvector estimates `v` until each matrix
+    has converged, or for `max_iterations`"""
+
+    def cond(i, eigenvalue, v, num_iterations, converged):
+        return (i < max_iterations) & ~tf.reduce_all(converged)
+
+    def body(i, eigenvalue, v, num_iterations, converged):
+        new_eigenvalue, new_v = step(v)
+        # Converged matrices keep their eigenpair
+        eigenvalue = tf.where(converged, eigenvalue, new_eigenvalue)
+        v = tf.where(converged[:, tf.newaxis], v, new_v)
+        num_iterations = num_iterations + tf.cast(~converged, tf.int32)
+        converged = converged | (_residual(A, eigenvalue, v) < tol)
+        return i + 1, eigenvalue, v, num_iterations, converged
+
+    batch_size = tf.shape(A)[0]
+    _, eigenvalue, v, num_iterations, converged = tf.while_loop(
+        cond,
+        body,
+        loop_vars=(
+            tf.constant(0),
+            tf.zeros([batch_size], A.dtype),
+            v,
+            tf.zeros([batch_size], tf.int32),
+            tf.zeros([batch_size], tf.bool),
+        ),
+    )
+    return EigenResult(eigenvalue, v, num_iterations, converged)
+
+
+@tf.function(experimental_relax_shapes=True, experimental_compile=True)
+def _solve(A, v, method, tol, max_iterations, krylov_dim):
+    """Runs power iteration or restarted Lanczos, XLA-compiled"""
+    if method == "power":
+
+        def step(v):
+            return _power_step(A, v)
+
+    else:
+
+        def step(v):
+            H, V = _krylov_factorisation(A, v, krylov_dim)
+            return _ritz_pair(H, V, symmetric=True)
+
+    return _iterate(A, v, step, tol, max_iterations)
+
+
+@tf.function(experimental_relax_shapes=True, experimental_compile=True)
+def _arnoldi_factorisation(A, v, krylov_dim):
+    return _krylov_factorisation(A, v, krylov_dim)
+
+
+@tf.function(experimental_relax_shapes=True)
+def _solve_arnoldi(A, v, tol, max_iterations, krylov_dim):
+    """Runs restarted Arnoldi.  `tf.linalg.eig` has no XLA kernel, so only
+    the Krylov factorisation, i.e. the `O(k M^2)` matrix-vector products,
+    is XLA-compiled, and the Ritz pairs of the `[k, k]` Hessenberg
+    matrices are computed outside it."""
+
+    def step(v):
+        H, V = _arnoldi_factorisation(A, v, krylov_dim)
+        return _ritz_pair(H, V, symmetric=False)
+
+    return _iterate(A, v, step, tol, max_iterations)
+
+
+def dominant_eigenvalue(
+    A,
+    method="power",
+    initial_vector=None,
+    tol=1e-8,
+    max_iterations=1000,
+    krylov_dim=20,
+):
+    """Computes the dominant eigenpair of each of a batch of matrices.
+
+    Each matrix has its own convergence test, the relative residual
+    `|Av - lambda v| / |lambda| < tol`, and stops updating once converged.
+    The default start vector is constant, so results are deterministic.
+    Power iteration and Lanczos are XLA-compiled as a whole, and Arnoldi
+    except for the eigen-decomposition of its small Hessenberg matrices,
+    for which XLA has no kernel.
+    For non-negative matrices, such as next generation matrices, the
+    dominant eigenvector is positive and a constant start vector, or the
+    eigenvectors of a similar batch (e.g. the previous day's), is a good
+    choice.
+
+    :param A: a [B, M, M] batch of matrices
+    :param method: `"power"` for power iteration, `"lanczos"` for
+                   restarted Lanczos (symmetric matrices only), or
+                   `"arnoldi"` for restarted Arnoldi
+    :param initial_vector: an optional [M] or [B, M] start vector, i.e. a
+                           warm start
+    :param tol: the relative residual at which a matrix has converged
+    :param max_iterations: the maximum number of iterations (power) or
+                           restarts (Lanczos, Arnoldi)
+    :param krylov_dim: the Krylov subspace dimension for Lanczos and
+                       Arnoldi
+    :returns: an `EigenResult`
+    """
+    if method not in METHODS:
+        raise ValueError(
+            f"Unknown method '{method}', expected one of {METHODS}"
+        )
+    A = tf.convert_to_tensor(A)
+    if initial_vector is None:
+        initial_vector = tf.ones(A.shape[-1:], dtype=A.dtype)
+    v = _normalise(
+        tf.broadcast_to(
+            tf.convert_to_tensor(initial_vector, dtype=A.dtype), A.shape[:-1]
+        )
+    )
+    tol = tf.constant(tol, A.dtype)
+    max_iterations = tf.constant(max_iterations)
+    krylov_dim = min(krylov_dim, A.shape[-1])
+    if method == "arnoldi":
+        return _solve_arnoldi(A, v, tol, max_iterations, krylov_dim)
+    return _solve(A, v, method, tol, max_iterations, krylov_dim)
@@ -0,0 +1,45 @@
+"""Tests the batched dominant eigenvalue solvers"""
+
+import numpy as np
+import pytest
+
+from covid.eigen import dominant_eigenvalue
+
+
+@pytest.fixture
+def matrices():
+    return np.random.default_rng(1).uniform(size=[10, 30, 30])
+
+
+@pytest.mark.parametrize("method", ["power", "arnoldi"])
+def test_dominant_eigenvalue(matrices, method):
+    result = dominant_eigenvalue(matrices, method=method)
+
+    expected = np.max(np.linalg.eigvals(matrices).real, axis=-1)
+    assert np.all(result.converged)
+    np.testing.assert_allclose(result.eigenvalue, expected, rtol=1e-6)
+    np.testing.assert_allclose(
+        np.einsum("bij,bj->bi", matrices, result.eigenvector),
+        result.eigenvalue[:, np.newaxis] * result.eigenvector,
+        atol=1e-6,
+    )
+
+
+def test_lanczos(matrices):
+    symmetric = matrices + np.transpose(matrices, [0, 2, 1])
+    result = dominant_eigenvalue(symmetric, method="lanczos")
+
+    np.testing.assert_allclose(
+        result.eigenvalue, np.linalg.eigvalsh(symmetric)[:, -1], rtol=1e-6
+    )
+
+
+def test_warm_start(matrices):
+    cold = dominant_eigenvalue(matrices)
+    warm = dominant_eigenvalue(matrices, initial_vector=cold.eigenvector)
+
+    assert np.all(warm.num_iterations <= 1)
+    np.testing.assert_allclose(warm.eigenvalue, cold.eigenvalue, rtol=1e-6)
+    np.testing.assert_array_equal(
+        dominant_eigenvalue(matrices).eigenvalue, cold.eigenvalue
+    )
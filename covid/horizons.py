@@ -0,0 +1,73 @@
+"""Sums of events over windows of time, e.g. prediction horizons"""
+
+import numpy as np
+import pandas as pd
+import xarray
+
+from covid.quantiles import QuantileSummary
+
+__all__ = ["horizon_sums", "summarise_horizons"]
+
+
+def horizon_sums(x, windows, dim="time"):
+    """Sums `x` over windows of dimension `dim`.
+
+    All windows are differences of a single cumulative sum along `dim`, so
+    `x` is read once however many, or however long, the windows are.
+
+    :param x: an `xarray.DataArray`
+    :param windows: a dict of `name: (start, stop)` windows, indexed as the
+                    slice `start:stop`, so negative indices count back from
+                    the end of `dim`, and `None` means either end
+    :param dim: the dimension to sum over
+    :returns: an `xarray.DataArray` in which `dim` is replaced by a final
+              `horizon` dimension, with the window names as coordinates
+    """
+    x = x.transpose(..., dim)
+    num_times = x.shape[-1]
+    cum_x = np.zeros(x.shape[:-1] + (num_times + 1,), dtype=x.dtype)
+    np.cumsum(x.values, axis=-1, out=cum_x[..., 1:])
+
+    starts, stops = [], []
+    for start, stop in windows.values():
+        start, stop, _ = slice(start, stop).indices(num_times)
+        starts.append(start)
+        stops.append(max(start, stop))
+
+    template = x.isel({dim: 0}, drop=True)
+    return xarray.DataArray(
+        cum_x[..., stops] - cum_x[..., starts],
+        coords={**template.coords, "horizon": list(windows)},
+        dims=template.dims + ("horizon",),
+    )
+
+
+def summarise_horizons(batches, windows, dim="time", **kwargs):
+    """Summarises sums over windows of batches of posterior samples in a
+    single wide table.
+
+    :param batches: an iterable of `[iteration, ..., time]`
+                    `xarray.DataArray`s, e.g. from
+                    `covid.prediction_store.iter_prediction`
+    :param windows: a dict of `name: (start, stop)` windows, see
+                    `horizon_sums`
+    :param dim: the dimension to sum over
+    :param kwargs: options for `covid.quantiles.QuantileSummary`
+    :returns: a `pd.DataFrame` indexed by the remaining dimensions, with
+              columns `{name}_mean` and `{name}_{q}` for each window
+    """
+    summary = QuantileSummary(**kwargs)
+    for batch in batches:
+        sums = horizon_sums(batch, windows, dim).transpose("iteration", ...)
+        for i, name in enumerate(windows):
+            summary.update(name, sums.values[..., i])
+
+    template = sums.isel(iteration=0, horizon=0, drop=True)
+    return pd.DataFrame(
+        {
+            k: np.reshape(v, -1)
+            for name in windows
+            for k, v in summary.result(name).items()
+        },
+        index=template.to_series().index,
+    )
@@ -0,0 +1,53 @@
+"""Tests sums over prediction horizons"""
+
+import numpy as np
+import xarray
+
+from covid.horizons import horizon_sums, summarise_horizons
+
+WINDOWS = {"first": (0, 1), "week": (1, 8), "last": (-5, None)}
+
+
+def _prediction(num_samples=20):
+    return xarray.DataArray(
+        np.random.default_rng(3).poisson(2.0, size=[num_samples, 3, 10]),
+        coords=[np.arange(num_samples), ["a", "b", "c"], np.arange(10)],
+        dims=["iteration", "location", "time"],
+    )
+
+
+def test_horizon_sums():
+    x = _prediction()
+    sums = horizon_sums(x, WINDOWS)
+
+    assert sums.dims == ("iteration", "location", "horizon")
+    np.testing.assert_array_equal(sums.sel(horizon="first"), x[..., 0])
+    np.testing.assert_array_equal(
+        sums.sel(horizon="week"), x[..., 1:8].sum(dim="time")
+    )
+    np.testing.assert_array_equal(
+        sums.sel(horizon="last"), x[..., -5:].sum(dim="time")
+    )
+
+
+def test_summarise_horizons():
+    x = _prediction()
+    table = summarise_horizons(
+        (x[i : i + 7] for i in range(0, 20, 7)),
+        WINDOWS,
+        q=[0.5],
+        interpolation="linear",
+    )
+
+    assert list(table.index) == ["a", "b", "c"]
+    assert list(table.columns) == [
+        "first_mean",
+        "first_0.5",
+        "week_mean",
+        "week_0.5",
+        "last_mean",
+        "last_0.5",
+    ]
+    np.testing.assert_allclose(
+        table["week_0.5"], x[..., 1:8].sum(dim="time").median(dim="iteration")
+    )
@@ -0,0 +1,90 @@
+"""Incremental target log probability evaluation for local MCMC moves"""
+
+import tensorflow as tf
+import tensorflow_probability as tfp
+
+__all__ = ["IncrementalLogProbKernel"]
+
+
+def _zero_log_prob(*state):
+    return tf.zeros([], dtype=tf.nest.flatten(state)[0].dtype)
+
+
+class IncrementalLogProbKernel(tfp.mcmc.TransitionKernel):
+    """Evaluates the target log probability of an uncalibrated proposal
+    kernel incrementally.
+
+    The proposal kernel is built with a dummy target log probability, so
+    proposing a move costs nothing beyond the proposal itself.  The
+    proposed target log probability is then computed as the current
+    target log probability plus `delta_log_prob_fn(current, proposed)`,
+    which need only evaluate the part of the model affected by the move.
+    Wrap in `tfp.mcmc.MetropolisHastings` to calibrate, as for the
+    proposal kernel itself.
+
+    :param make_inner_kernel: a function taking a target log probability
+                              function and returning an uncalibrated
+                              `TransitionKernel`
+    :param target_log_prob_fn: the full target log probability function,
+                               used for `bootstrap_results`
+    :param delta_log_prob_fn: a function taking the current and proposed
+                              states, returning the difference in their
+                              target log probabilities
+    :param name: an optional name
+    """
+
+    def __init__(
+        self,
+        make_inner_kernel,
+        target_log_prob_fn,
+        delta_log_prob_fn,
+        name=None,
+    ):
+        self._parameters = dict(
+            make_inner_kernel=make_inner_kernel,
+            target_log_prob_fn=target_log_prob_fn,
+            delta_log_prob_fn=delta_log_prob_fn,
+            name=name,
+        )
+        self._inner_kernel = make_inner_kernel(_zero_log_prob)
+
+    @property
+    def inner_kernel(self):
+        return self._inner_kernel
+
+    @property
+    def target_log_prob_fn(self):
+        return self._parameters["target_log_prob_fn"]
+
+    @property
+    def delta_log_prob_fn(self):
+        return self._parameters["delta_log_prob_fn"]
+
+    @property
+    def name(self):
+        return self._parameters["name"]
+
+    @property
+    def parameters(self):
+        return self._parameters
+
+    @property
+    def is_calibrated(self):
+        return False
+
+    def one_step(self, current_state, previous_results, seed=None):
+        with tf.name_scope(self.name or "incremental_log_prob_kernel"):
+            proposed_state, proposed_results = self.inner_kernel.one_step(
+                current_state, previous_results, seed=seed
+            )
+            delta = self.delta_log_prob_fn(current_state, proposed_state)
+            return proposed_state, proposed_results._replace(
+                target_log_prob=previous_results.target_log_prob + delta
+            )
+
+    def bootstrap_results(self, current_state):
+        with tf.name_scope(self.name or "incremental_log_prob_kernel"):
+            results = self.inner_kernel.bootstrap_results(current_state)
+            return results._replace(
+                target_log_prob=self.target_log_prob_fn(current_state)
+            )
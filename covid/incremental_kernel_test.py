@@ -0,0 +1,37 @@
+"""Tests the incremental log probability kernel"""
+
+import numpy as np
+import tensorflow as tf
+import tensorflow_probability as tfp
+
+from covid.incremental_kernel import IncrementalLogProbKernel
+
+
+def test_matches_full_evaluation():
+    def target_log_prob_fn(x):
+        return -0.5 * tf.reduce_sum(x**2)
+
+    def delta_log_prob_fn(current, proposed):
+        return -0.5 * tf.reduce_sum(proposed**2 - current**2)
+
+    def make_inner_kernel(log_prob_fn):
+        return tfp.mcmc.UncalibratedRandomWalk(log_prob_fn)
+
+    def run(kernel):
+        return tfp.mcmc.sample_chain(
+            20,
+            np.zeros([2], dtype=np.float64),
+            kernel=tfp.mcmc.MetropolisHastings(kernel),
+            trace_fn=lambda _, results: results.accepted_results.target_log_prob,
+            seed=[0, 1],
+        )
+
+    expected, expected_lp = run(make_inner_kernel(target_log_prob_fn))
+    actual, actual_lp = run(
+        IncrementalLogProbKernel(
+            make_inner_kernel, target_log_prob_fn, delta_log_prob_fn
+        )
+    )
+
+    np.testing.assert_allclose(actual, expected)
+    np.testing.assert_allclose(actual_lp, expected_lp)
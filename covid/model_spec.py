@@ -1,5 +1,7 @@
 """Implements the COVID SEIR model as a TFP Joint Distribution"""
 
+import collections
+import inspect
 import pandas as pd
 import numpy as np
 import tensorflow as tf
@@ -7,6 +9,8 @@ import tensorflow_probability as tfp
 
 from gemlib.distributions import DiscreteTimeStateTransitionModel
 from covid.util import impute_previous_cases
+from covid.util import sparsify_matrix, sparse_matvec
+from covid.simulation import chain_binomial_log_prob
 import covid.data as data
 
 tfd = tfp.distributions
@@ -57,10 +61,325 @@ def gather_data(config):
         date_range=date_range,
         locations=locations,
         cases=cases,
+        mobility_sparsity=config.get("mobility_sparsity"),
     )
 
 
-def impute_censored_events(cases):
+CovariateBundle = collections.namedtuple(
+    "CovariateBundle",
+    ["C", "Cstar", "W", "N", "inv_N", "weekday", "Cstar_sparse"],
+    defaults=(None,),
+)
+CovariateBundle.__doc__ = """Static covariate tensors consumed by the model
+
+:param C: the MxM commute matrix with zero diagonal
+:param Cstar: the symmetrised commute matrix `C + C^T` with diagonal
+              `-sum(C, axis=-2)`
+:param W: the [T] commute volume timeseries
+:param N: the [M] population sizes
+:param inv_N: `1/N`
+:param weekday: the [T] weekday indicator, centred on its mean
+:param Cstar_sparse: optionally, a tuple `(rows, cols, values, residual)`
+                     representing `Cstar` in sparse form (see
+                     `covid.util.sparsify_matrix`), used for the
+                     infection-rate matrix-vector product.
+"""
+
+
+def covariate_bundle(covariates, dtype=None):
+    """Assembles static covariate tensors once from `gather_data` output,
+       such that log probability evaluations do no conversion or matrix
+       assembly work.
+
+    The dtype of the bundle sets the precision of the transition rate
+    and state transition log probability computations.
+
+    :param covariates: a dictionary of covariate data as returned by
+                       `gather_data`, or a `CovariateBundle` which is
+                       returned unchanged if already of `dtype`.
+    :param dtype: the floating point dtype of the covariate tensors.  If
+                  `None`, a `CovariateBundle` keeps its dtype, and other
+                  covariates are assembled in `DTYPE`.
+    :returns: a `CovariateBundle`
+    """
+    if isinstance(covariates, CovariateBundle):
+        if dtype is None or covariates.W.dtype == dtype:
+            return covariates
+        return tf.nest.map_structure(
+            lambda x: x
+            if x is None or not x.dtype.is_floating
+            else tf.cast(x, dtype),
+            covariates,
+        )
+
+    C = tf.convert_to_tensor(covariates["C"], dtype=DTYPE)
+    C = tf.linalg.set_diag(C, tf.zeros(C.shape[0], dtype=DTYPE))
+
+    Cstar = C + tf.transpose(C)
+    Cstar = tf.linalg.set_diag(Cstar, -tf.reduce_sum(C, axis=-2))
+
+    W = tf.convert_to_tensor(tf.squeeze(covariates["W"]), dtype=DTYPE)
+    N = tf.convert_to_tensor(tf.squeeze(covariates["N"]), dtype=DTYPE)
+
+    weekday = tf.convert_to_tensor(covariates["weekday"], DTYPE)
+    weekday = weekday - tf.reduce_mean(weekday, axis=-1)
+
+    Cstar_sparse = None
+    sparsity = covariates.get("mobility_sparsity")
+    if sparsity is not None:
+        rows, cols, values, residual = sparsify_matrix(
+            Cstar.numpy(),
+            threshold=sparsity.get("threshold", 0.0),
+            top_k=sparsity.get("top_k"),
+        )
+        Cstar_sparse = (
+            tf.constant(rows, tf.int32),
+            tf.constant(cols, tf.int32),
+            tf.constant(values, DTYPE),
+            tf.constant(residual, DTYPE),
+        )
+
+    return covariate_bundle(
+        CovariateBundle(
+            C=C,
+            Cstar=Cstar,
+            W=W,
+            N=N,
+            inv_N=1.0 / N,
+            weekday=weekday,
+            Cstar_sparse=Cstar_sparse,
+        ),
+        dtype,
+    )
+
+
+def cstar_matvec(covariates, x):
+    """Computes `Cstar @ x`, using the sparse representation of `Cstar`
+       if present in `covariates`.
+
+    Elements dropped from the sparse representation contribute their
+    row sum times the mean of `x`, at O(M) cost.
+
+    :param covariates: a `CovariateBundle`
+    :param x: a [..., M] tensor
+    :returns: a [..., M] tensor
+    """
+    if covariates.Cstar_sparse is None:
+        return tf.linalg.matvec(covariates.Cstar, x)
+
+    rows, cols, values, residual = covariates.Cstar_sparse
+    return sparse_matvec(
+        rows, cols, values, x, residual.shape[0]
+    ) + residual * tf.reduce_mean(x, axis=-1, keepdims=True)
+
+
+def make_transition_rate_fn(covariates, beta2, xi, gamma0, gamma1):
+    """Returns the SEIR transition rate function for a set of parameters,
+       computed in the dtype of `covariates`
+
+    Parameters may have leading batch dimensions `[...]`, e.g. a batch of
+    posterior samples, in which case the state must be `[..., M, 4]`.
+
+    :param covariates: a `CovariateBundle`
+    :param beta2: the [...] commuting effect
+    :param xi: the [..., T // XI_FREQ] baseline log transmission rate
+    :param gamma0: the [...] intercept of the log I->R rate
+    :param gamma1: the [...] weekday effect on the log I->R rate
+    :returns: a function taking arguments `t` and `state`, returning a list
+              of [..., M] S->E, E->I, and I->R rates.
+    """
+    dtype = covariates.W.dtype
+    beta2 = tf.cast(beta2, dtype)[..., tf.newaxis]
+    xi = tf.cast(xi, dtype)
+    gamma0 = tf.cast(gamma0, dtype)[..., tf.newaxis]
+    gamma1 = tf.cast(gamma1, dtype)[..., tf.newaxis]
+    nu = tf.cast(NU, dtype)
+
+    W = covariates.W
+    inv_N = covariates.inv_N
+    weekday = covariates.weekday
+
+    def transition_rate_fn(t, state):
+
+        w_idx = tf.clip_by_value(tf.cast(t, tf.int64), 0, W.shape[0] - 1)
+        commute_volume = tf.gather(W, w_idx)
+        xi_idx = tf.cast(
+            tf.clip_by_value(t // XI_FREQ, 0, xi.shape[-1] - 1),
+            dtype=tf.int64,
+        )
+        xi_ = tf.gather(xi, xi_idx, axis=-1)[..., tf.newaxis]
+
+        weekday_idx = tf.clip_by_value(
+            tf.cast(t, tf.int64), 0, weekday.shape[0] - 1
+        )
+        weekday_t = tf.gather(weekday, weekday_idx)
+
+        infec_rate = tf.math.exp(xi_) * (
+            state[..., 2]
+            + beta2
+            * commute_volume
+            * cstar_matvec(covariates, state[..., 2] * inv_N)
+        )
+        infec_rate = infec_rate * inv_N + 0.000000001  # Vector of length nc
+
+        ei = tf.broadcast_to(nu, shape=state.shape[:-1])  # Vector of length nc
+        ir = tf.broadcast_to(
+            tf.math.exp(gamma0 + gamma1 * weekday_t),
+            shape=state.shape[:-1],
+        )  # Vector of length nc
+
+        return [infec_rate, ei, ir]
+
+    return transition_rate_fn
+
+
+def _seir_log_prob(transition_rates, initial_state, initial_step, events):
+    """Computes the log probability of `events` of the SEIR state transition
+       model, in the dtype of `events`, and returns it in `DTYPE`.
+
+    At reduced precision, the log probability of each event count is
+    computed in the dtype of `events`, but summed in `DTYPE`: summing the
+    `[M, T, 3]` terms in single precision would lose precision comparable
+    to the differences in log probability between MCMC proposals.
+    """
+    if events.dtype == DTYPE:
+        return DiscreteTimeStateTransitionModel(
+            transition_rates=transition_rates,
+            stoichiometry=STOICHIOMETRY,
+            initial_state=initial_state,
+            initial_step=initial_step,
+            time_delta=TIME_DELTA,
+            num_steps=events.shape[-2],
+        ).log_prob(events)
+
+    log_probs = chain_binomial_log_prob(
+        transition_rates,
+        STOICHIOMETRY,
+        initial_state,
+        initial_step,
+        events,
+        TIME_DELTA,
+    )
+    return tf.reduce_sum(tf.cast(log_probs, DTYPE))
+
+
+def seir_window_log_prob(
+    covariates,
+    initial_state,
+    initial_step,
+    params,
+    events,
+    window_start,
+    window_size,
+):
+    """Computes the log probability of the events in time steps
+       `[window_start, window_start + window_size)`, conditional on the
+       epidemic state at `window_start`.
+
+    The log probability of the epidemic factorises over time steps, so the
+    sum over consecutive windows equals the log probability of the
+    `seir` component of `CovidUK`.  All metapopulations are included, as
+    they are coupled through `Cstar`.
+
+    :param covariates: a `CovariateBundle`
+    :param initial_state: the [M, 4] initial state
+    :param initial_step: the initial time step
+    :param params: a dictionary with keys `beta2`, `xi`, `gamma0`, `gamma1`
+    :param events: the [M, T, 3] events tensor
+    :param window_start: a scalar int32 tensor, the first time step of the
+                         window
+    :param window_size: the (static) number of time steps in the window
+    :returns: a scalar log probability of dtype `DTYPE`, with the terms
+              of each event count computed in the dtype of `covariates`
+    """
+    dtype = covariates.W.dtype
+    events = tf.cast(events, dtype)
+    before = tf.cast(tf.range(events.shape[-2]) < window_start, dtype)
+    window_state = tf.cast(initial_state, dtype) + tf.einsum(
+        "...tr,t,rs->...s", events, before, tf.cast(STOICHIOMETRY, dtype)
+    )
+    window_events = tf.gather(
+        events, window_start + tf.range(window_size), axis=-2
+    )
+    return _seir_log_prob(
+        make_transition_rate_fn(covariates, **params),
+        window_state,
+        initial_step + tf.cast(window_start, dtype),
+        window_events,
+    )
+
+
+def seir_delta_log_prob(
+    covariates,
+    initial_state,
+    initial_step,
+    params,
+    current_events,
+    proposed_events,
+    window_size,
+):
+    """Computes `log p(proposed_events) - log p(current_events)` for the
+       `seir` component of `CovidUK`, re-evaluating only the time window
+       affected by the proposal.
+
+    The affected window spans the time steps at which either the events or
+    the epidemic state differ.  If it is wider than `window_size`, the full
+    log probabilities are evaluated instead.
+
+    :param covariates: a `CovariateBundle`
+    :param initial_state: the [M, 4] initial state
+    :param initial_step: the initial time step
+    :param params: a dictionary with keys `beta2`, `xi`, `gamma0`, `gamma1`
+    :param current_events: the [M, T, 3] current events
+    :param proposed_events: the [M, T, 3] proposed events
+    :param window_size: the (static) maximum width of the window
+    :returns: a scalar log probability difference
+    """
+    current_events = tf.convert_to_tensor(current_events)
+    proposed_events = tf.convert_to_tensor(proposed_events)
+    num_steps = current_events.shape[-2]
+    window_size = min(window_size, num_steps)
+
+    # The state at t differs iff the cumulative events before t differ
+    diff = proposed_events - current_events
+    affected = tf.reduce_any(diff != 0.0, axis=[-3, -1]) | tf.reduce_any(
+        tf.cumsum(diff, axis=-2, exclusive=True) != 0.0, axis=[-3, -1]
+    )
+    times = tf.range(num_steps)
+    first = tf.reduce_min(tf.where(affected, times, num_steps))
+    last = tf.reduce_max(tf.where(affected, times, -1))
+    window_start = tf.clip_by_value(first, 0, num_steps - window_size)
+
+    def delta(start, size):
+        def fn():
+            return seir_window_log_prob(
+                covariates,
+                initial_state,
+                initial_step,
+                params,
+                proposed_events,
+                start,
+                size,
+            ) - seir_window_log_prob(
+                covariates,
+                initial_state,
+                initial_step,
+                params,
+                current_events,
+                start,
+                size,
+            )
+
+        return fn
+
+    return tf.cond(
+        last < window_start + window_size,
+        delta(window_start, window_size),
+        delta(tf.constant(0, tf.int32), num_steps),
+    )
+
+
+def impute_censored_events(cases, seed=None):
     """Imputes censored S->E and E->I events using geometric
        sampling algorithm in `impute_previous_cases`
 
@@ -71,11 +390,15 @@ def impute_censored_events(cases):
     trajectories.
 
     :param cases: a MxT matrix of case numbers (I->R)
+    :param seed: an optional stateless seed, for reproducible imputation
     :returns: a MxTx3 tensor of events where the first two indices of
               the right-most dimension contain the imputed event times.
     """
-    ei_events, lag_ei = impute_previous_cases(cases, 0.25)
-    se_events, lag_se = impute_previous_cases(ei_events, 0.5)
+    ei_seed, se_seed = (
+        [None, None] if seed is None else tfp.random.split_seed(seed, n=2)
+    )
+    ei_events, lag_ei = impute_previous_cases(cases, 0.25, seed=ei_seed)
+    se_events, lag_se = impute_previous_cases(ei_events, 0.5, seed=se_seed)
     ir_events = np.pad(cases, ((0, 0), (lag_ei + lag_se - 2, 0)))
     ei_events = np.pad(ei_events, ((0, 0), (lag_se - 1, 0)))
     return tf.stack([se_events, ei_events, ir_events], axis=-1)
@@ -92,6 +415,22 @@ def conditional_gp(gp, observations, new_index_points):
 
 
 def CovidUK(covariates, initial_state, initial_step, num_steps):
+    """The COVID-19 UK model
+
+    The `seir` component is computed in the dtype of `covariates`, with
+    the other components in `DTYPE`.  Use `mixed_precision_log_prob` to
+    evaluate the joint log probability if these differ.
+
+    :param covariates: a dictionary of covariate data as returned by
+                       `gather_data`, or a `CovariateBundle`
+    :param initial_state: the [M, 4] initial state
+    :param initial_step: the initial time step
+    :param num_steps: the number of time steps
+    :returns: a `tfd.JointDistributionNamed` instance
+    """
+    covariates = covariate_bundle(covariates)
+    seir_initial_state = tf.cast(initial_state, covariates.W.dtype)
+
     def beta1():
         return tfd.Normal(
             loc=tf.constant(0.0, dtype=DTYPE),
@@ -133,62 +472,12 @@ def CovidUK(covariates, initial_state, initial_step, num_steps):
         )
 
     def seir(beta2, xi, gamma0, gamma1):
-        beta2 = tf.convert_to_tensor(beta2, DTYPE)
-        xi = tf.convert_to_tensor(xi, DTYPE)
-        gamma0 = tf.convert_to_tensor(gamma0, DTYPE)
-        gamma1 = tf.convert_to_tensor(gamma1, DTYPE)
-
-        C = tf.convert_to_tensor(covariates["C"], dtype=DTYPE)
-        C = tf.linalg.set_diag(C, tf.zeros(C.shape[0], dtype=DTYPE))
-
-        Cstar = C + tf.transpose(C)
-        Cstar = tf.linalg.set_diag(Cstar, -tf.reduce_sum(C, axis=-2))
-
-        W = tf.convert_to_tensor(tf.squeeze(covariates["W"]), dtype=DTYPE)
-        N = tf.convert_to_tensor(tf.squeeze(covariates["N"]), dtype=DTYPE)
-
-        weekday = tf.convert_to_tensor(covariates["weekday"], DTYPE)
-        weekday = weekday - tf.reduce_mean(weekday, axis=-1)
-
-        def transition_rate_fn(t, state):
-
-            w_idx = tf.clip_by_value(tf.cast(t, tf.int64), 0, W.shape[0] - 1)
-            commute_volume = tf.gather(W, w_idx)
-            xi_idx = tf.cast(
-                tf.clip_by_value(t // XI_FREQ, 0, xi.shape[0] - 1),
-                dtype=tf.int64,
-            )
-            xi_ = tf.gather(xi, xi_idx)
-
-            weekday_idx = tf.clip_by_value(
-                tf.cast(t, tf.int64), 0, weekday.shape[0] - 1
-            )
-            weekday_t = tf.gather(weekday, weekday_idx)
-
-            infec_rate = tf.math.exp(xi_) * (
-                state[..., 2]
-                + beta2
-                * commute_volume
-                * tf.linalg.matvec(Cstar, state[..., 2] / tf.squeeze(N))
-            )
-            infec_rate = (
-                infec_rate / tf.squeeze(N) + 0.000000001
-            )  # Vector of length nc
-
-            ei = tf.broadcast_to(
-                [NU], shape=[state.shape[0]]
-            )  # Vector of length nc
-            ir = tf.broadcast_to(
-                [tf.math.exp(gamma0 + gamma1 * weekday_t)],
-                shape=[state.shape[0]],
-            )  # Vector of length nc
-
-            return [infec_rate, ei, ir]
-
         return DiscreteTimeStateTransitionModel(
-            transition_rates=transition_rate_fn,
+            transition_rates=make_transition_rate_fn(
+                covariates, beta2, xi, gamma0, gamma1
+            ),
             stoichiometry=STOICHIOMETRY,
-            initial_state=initial_state,
+            initial_state=seir_initial_state,
             initial_step=initial_step,
             time_delta=TIME_DELTA,
             num_steps=num_steps,
@@ -207,6 +496,46 @@ def CovidUK(covariates, initial_state, initial_step, num_steps):
     )
 
 
+def mixed_precision_log_prob(model, value, dtype):
+    """Computes the joint log probability of a `CovidUK` model whose `seir`
+       component is computed in `dtype`.
+
+    The events are cast to `dtype`.  The log probability of each event
+    count of the `seir` component is computed in `dtype` and cast to
+    `DTYPE` before it is summed, and the log probabilities of the
+    components are accumulated in `DTYPE`.
+
+    :param model: a `CovidUK` instance
+    :param value: a dictionary of values of the model's components
+    :param dtype: the dtype of the model's covariates
+    :returns: a scalar log probability of dtype `DTYPE`
+    """
+    value = dict(value, seir=tf.cast(value["seir"], dtype))
+    if dtype == DTYPE:
+        return tf.add_n(list(model.log_prob_parts(value).values()))
+
+    def component(name):
+        make_dist = model.model[name]
+        args = inspect.signature(make_dist).parameters
+        return make_dist(**{k: value[k] for k in args})
+
+    seir = component("seir").parameters
+    log_probs = [
+        component(name).log_prob(value[name])
+        for name in model.model
+        if name != "seir"
+    ]
+    log_probs.append(
+        _seir_log_prob(
+            seir["transition_rates"],
+            seir["initial_state"],
+            seir["initial_step"],
+            value["seir"],
+        )
+    )
+    return tf.add_n(log_probs)
+
+
 def next_generation_matrix_fn(covar_data, param):
     """The next generation matrix calculates the force of infection from
     individuals in metapopulation i to all other metapopulations j during
@@ -214,22 +543,19 @@ def next_generation_matrix_fn(covar_data, param):
 
       \[ A_{ij} = S_j * \beta_1 ( 1 + \beta_2 * w_t * C_{ij} / N_i) / N_j / gamma \]
 
-    :param covar_data: a dictionary of covariate data
+    :param covar_data: a dictionary of covariate data, or a `CovariateBundle`
     :param param: a dictionary of parameters
     :returns: a function taking arguments `t` and `state` giving the time and
               epidemic state (SEIR) for which the NGM is to be calculated.  This
               function in turn returns an MxM next generation matrix.
     """
 
+    covariates = covariate_bundle(covar_data)
+
     def fn(t, state):
-        C = tf.convert_to_tensor(covar_data["C"], dtype=DTYPE)
-        C = tf.linalg.set_diag(C, -tf.reduce_sum(C, axis=-2))
-        C = tf.linalg.set_diag(C, tf.zeros(C.shape[0], dtype=DTYPE))
-        Cstar = C + tf.transpose(C)
-        Cstar = tf.linalg.set_diag(Cstar, -tf.reduce_sum(C, axis=-2))
-
-        W = tf.constant(covar_data["W"], dtype=DTYPE)
-        N = tf.constant(covar_data["N"], dtype=DTYPE)
+        Cstar = covariates.Cstar
+        W = covariates.W
+        N = covariates.N
 
         w_idx = tf.clip_by_value(tf.cast(t, tf.int64), 0, W.shape[0] - 1)
         commute_volume = tf.gather(W, w_idx)
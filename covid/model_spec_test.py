@@ -0,0 +1,127 @@
+"""Tests the COVID-19 UK model log probabilities"""
+
+import numpy as np
+import pytest
+import tensorflow as tf
+
+from covid import model_spec
+from covid.simulation import chain_binomial_simulate
+
+NUM_META = 380
+NUM_STEPS = 84
+PARAMS = dict(
+    beta2=0.3, xi=np.full(NUM_STEPS // 14, -1.4), gamma0=-1.5, gamma1=0.1
+)
+
+
+@pytest.fixture(scope="module")
+def epidemic():
+    """Covariates and events of the size of the UK analysis"""
+    rng = np.random.default_rng(0)
+    N = rng.uniform(5e4, 5e5, NUM_META)
+    C = rng.uniform(size=[NUM_META, NUM_META]) * 1000.0
+    C = C * (rng.uniform(size=C.shape) < 0.05)
+    covariates = dict(
+        C=C,
+        W=np.ones(NUM_STEPS),
+        N=N,
+        weekday=(np.arange(NUM_STEPS) % 7 < 5).astype(np.float64),
+    )
+    initial_state = np.stack(
+        [N - 300.0, np.full_like(N, 100.0), np.full_like(N, 200.0), 0.0 * N],
+        axis=-1,
+    )
+    events = chain_binomial_simulate(
+        model_spec.make_transition_rate_fn(
+            model_spec.covariate_bundle(covariates), **PARAMS
+        ),
+        model_spec.STOICHIOMETRY,
+        initial_state,
+        initial_step=0,
+        num_steps=NUM_STEPS,
+        seed=[0, 1],
+    ).numpy()
+    value = dict(PARAMS, beta1=0.0, sigma=0.1, seir=events)
+    return covariates, initial_state, value
+
+
+def test_mixed_precision_log_prob(epidemic):
+    covariates, initial_state, value = epidemic
+
+    def log_prob(dtype):
+        model = model_spec.CovidUK(
+            model_spec.covariate_bundle(covariates, dtype),
+            initial_state,
+            initial_step=0,
+            num_steps=NUM_STEPS,
+        )
+        return model_spec.mixed_precision_log_prob(model, value, dtype)
+
+    expected = log_prob(np.float64)
+    actual = log_prob(np.float32)
+
+    assert actual.dtype == tf.float64
+    # The [M, T, 3] event log probabilities are summed in float64, so the
+    #   error is that of the float32 terms, not of a float32 sum.
+    np.testing.assert_allclose(actual, expected, rtol=0.0, atol=1.0)
+
+
+def _move(events, m, t, new_t, transition, count):
+    """Moves `count` events of `transition` in metapopulation `m` from time
+    `t` to `new_t`, as an event time move"""
+    proposed = events.copy()
+    proposed[m, t, transition] -= count
+    proposed[m, new_t, transition] += count
+    return proposed
+
+
+def _add(events, m, t, transition, count):
+    """Adds `count` events of `transition` in metapopulation `m` at time
+    `t`, as an occult move"""
+    proposed = events.copy()
+    proposed[m, t, transition] += count
+    return proposed
+
+
+@pytest.mark.parametrize(
+    "propose,window_size",
+    [
+        # Event time moves of up to `dmax = 4` days
+        (lambda x: _move(x, 3, 0, 2, 0, 1.0), 5),
+        (lambda x: _move(x, 10, 40, 44, 1, 2.0), 5),
+        (lambda x: _move(x, 20, NUM_STEPS - 3, NUM_STEPS - 1, 1, 1.0), 5),
+        (lambda x: _move(x, 20, NUM_STEPS - 1, NUM_STEPS - 4, 0, 1.0), 5),
+        # Occults in the last 21 days
+        (lambda x: _add(x, 7, NUM_STEPS - 1, 0, 3.0), 21),
+        (lambda x: _add(x, 7, NUM_STEPS - 21, 1, -1.0), 21),
+        # Changes spanning more than the window fall back to the full
+        #   log probability
+        (lambda x: _add(_add(x, 1, 2, 0, 1.0), 2, NUM_STEPS - 2, 0, 1.0), 5),
+        (lambda x: _move(x, 5, 30, 35, 0, 1.0), 5),
+        (lambda x: _move(x, 5, 10, 20, 0, 1.0), 5),
+    ],
+)
+def test_seir_delta_log_prob(epidemic, propose, window_size):
+    covariates, initial_state, value = epidemic
+    bundle = model_spec.covariate_bundle(covariates)
+    model = model_spec.CovidUK(
+        bundle, initial_state, initial_step=0, num_steps=NUM_STEPS
+    )
+    current = value["seir"]
+    proposed = propose(current)
+
+    delta = model_spec.seir_delta_log_prob(
+        bundle,
+        initial_state,
+        0,
+        {k: value[k] for k in ["beta2", "xi", "gamma0", "gamma1"]},
+        current,
+        proposed,
+        window_size,
+    )
+    expected = model.log_prob(dict(value, seir=proposed)) - model.log_prob(
+        value
+    )
+
+    assert np.isfinite(expected)
+    np.testing.assert_allclose(delta, expected, rtol=1e-8, atol=1e-6)
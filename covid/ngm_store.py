@@ -0,0 +1,162 @@
+"""On-disc store of next generation matrix reductions, written in batches
+of posterior samples"""
+
+import h5py
+import numpy as np
+import xarray
+
+from covid.posterior_layout import chunk_shape, compression_options
+
+__all__ = [
+    "NGMWriter",
+    "read_local_rt",
+    "read_national_rt",
+    "read_eigenvector",
+    "read_ngm",
+]
+
+
+class NGMWriter:
+    """Writes reductions of `[iteration, dest, src]` next generation
+    matrices to an HDF5 store, one batch of posterior samples at a time.
+
+    The store holds datasets `local_rt`, the `[iteration, location]`
+    column sums of the matrices, `national_rt`, their `[iteration]`
+    dominant eigenvalues, and `eigenvector`, the `[iteration, location]`
+    corresponding unit eigenvectors.  If `store_matrices` is `True`, the matrices are
+    stored in dataset `ngm`, chunked by batch.
+
+    :param filename: the name of the store to create
+    :param num_samples: the total number of posterior samples
+    :param locations: the location labels
+    :param batch_size: the number of posterior samples written at once
+    :param store_matrices: whether to store the full matrices
+    :param compression: the compression filter, see
+                        `covid.posterior_layout.compression_options`
+    """
+
+    def __init__(
+        self,
+        filename,
+        num_samples,
+        locations,
+        batch_size,
+        store_matrices=False,
+        compression="lzf",
+    ):
+        self._file = h5py.File(filename, "w")
+        num_meta = len(locations)
+        self._file.create_dataset(
+            "local_rt", shape=(num_samples, num_meta), dtype=np.float64
+        )
+        self._file.create_dataset(
+            "national_rt", shape=(num_samples,), dtype=np.float64
+        )
+        self._file.create_dataset(
+            "eigenvector", shape=(num_samples, num_meta), dtype=np.float64
+        )
+        if store_matrices:
+            shape = (num_samples, num_meta, num_meta)
+            self._file.create_dataset(
+                "ngm",
+                shape=shape,
+                dtype=np.float64,
+                chunks=chunk_shape(shape, 8, batch_size, 1),
+                **compression_options(compression),
+            )
+        self._file.create_dataset(
+            "location", data=np.asarray(locations, dtype=h5py.string_dtype())
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(
+        self, first_sample, local_rt, national_rt, eigenvector=None, ngm=None
+    ):
+        """Writes a batch of reductions
+
+        :param first_sample: the index of the first sample in the batch
+        :param local_rt: a `[B, M]` array of column sums
+        :param national_rt: a `[B]` array of dominant eigenvalues
+        :param eigenvector: a `[B, M]` array of dominant eigenvectors
+        :param ngm: the `[B, M, M]` matrices, written if the store was
+                    created with `store_matrices=True`
+        """
+        batch = slice(first_sample, first_sample + local_rt.shape[0])
+        self._file["local_rt"][batch] = np.asarray(local_rt)
+        self._file["national_rt"][batch] = np.asarray(national_rt)
+        if eigenvector is not None:
+            self._file["eigenvector"][batch] = np.asarray(eigenvector)
+        if ngm is not None and "ngm" in self._file:
+            self._file["ngm"][batch] = np.asarray(ngm)
+
+    def close(self):
+        self._file.close()
+
+
+def read_local_rt(filename):
+    """Reads local Rt, the column sums of the next generation matrices
+
+    :param filename: an NGM store
+    :returns: an `[iteration, location]` `xarray.DataArray`
+    """
+    with h5py.File(filename, "r") as f:
+        local_rt = f["local_rt"][:]
+        location = f["location"].asstr()[:]
+    return xarray.DataArray(
+        local_rt,
+        coords=[np.arange(local_rt.shape[0]), location],
+        dims=["iteration", "location"],
+    )
+
+
+def read_national_rt(filename):
+    """Reads national Rt, the dominant eigenvalues of the next generation
+    matrices
+
+    :param filename: an NGM store
+    :returns: an `[iteration]` array
+    """
+    with h5py.File(filename, "r") as f:
+        return f["national_rt"][:]
+
+
+def read_eigenvector(filename):
+    """Reads the dominant eigenvectors of the next generation matrices,
+    e.g. to warm start the eigen-solver for the next day's matrices
+
+    :param filename: an NGM store
+    :returns: an `[iteration, location]` `xarray.DataArray`
+    """
+    with h5py.File(filename, "r") as f:
+        eigenvector = f["eigenvector"][:]
+        location = f["location"].asstr()[:]
+    return xarray.DataArray(
+        eigenvector,
+        coords=[np.arange(eigenvector.shape[0]), location],
+        dims=["iteration", "location"],
+    )
+
+
+def read_ngm(filename, batch=slice(None)):
+    """Reads next generation matrices, if stored
+
+    :param filename: an NGM store written with `store_matrices=True`
+    :param batch: a slice of posterior samples to read
+    :returns: an `[iteration, dest, src]` `xarray.DataArray`
+    """
+    with h5py.File(filename, "r") as f:
+        if "ngm" not in f:
+            raise KeyError(f"'{filename}' was written without matrices")
+        ngm = f["ngm"][batch]
+        location = f["location"].asstr()[:]
+        iteration = np.arange(f["ngm"].shape[0])[batch]
+    return xarray.DataArray(
+        ngm,
+        coords=[iteration, location, location],
+        dims=["iteration", "dest", "src"],
+    )
@@ -0,0 +1,44 @@
+"""Tests the on-disc NGM store"""
+
+import os
+
+import numpy as np
+import pytest
+
+from covid.ngm_store import NGMWriter, read_local_rt, read_national_rt, read_ngm
+
+
+def _write(filename, ngm, store_matrices):
+    with NGMWriter(filename, 5, ["a", "b", "c"], 2, store_matrices) as writer:
+        for start in range(0, 5, 2):
+            batch = ngm[start : start + 2]
+            writer.write(
+                start,
+                local_rt=batch.sum(axis=-2),
+                national_rt=np.max(np.linalg.eigvals(batch).real, axis=-1),
+                ngm=batch,
+            )
+
+
+def test_ngm_store(tmp_path):
+    filename = os.path.join(tmp_path, "ngm.hd5")
+    ngm = np.random.default_rng(0).uniform(size=[5, 3, 3])
+
+    _write(filename, ngm, store_matrices=True)
+
+    local_rt = read_local_rt(filename)
+    assert local_rt.dims == ("iteration", "location")
+    np.testing.assert_allclose(local_rt, ngm.sum(axis=-2))
+    np.testing.assert_allclose(
+        read_national_rt(filename),
+        np.max(np.linalg.eigvals(ngm).real, axis=-1),
+    )
+    np.testing.assert_array_equal(read_ngm(filename, slice(1, 3)), ngm[1:3])
+
+
+def test_ngm_store_without_matrices(tmp_path):
+    filename = os.path.join(tmp_path, "ngm.hd5")
+    _write(filename, np.ones([5, 3, 3]), store_matrices=False)
+
+    with pytest.raises(KeyError):
+        read_ngm(filename)
@@ -0,0 +1,124 @@
+"""Chunking and compression of the posterior HDF5 file"""
+
+import math
+
+import h5py
+import numpy as np
+
+from covid.checkpoint import PosteriorAppender
+
+__all__ = ["chunk_shape", "compression_options", "create_posterior"]
+
+MAX_CHUNK_BYTES = 4 * 1024**2
+MIN_CHUNK_BYTES = 64 * 1024
+
+
+def chunk_shape(shape, itemsize, burst_length, read_stride):
+    """Chooses the chunk shape of a `[num_samples, ...]` dataset.
+
+    If samples are read with a stride, each chunk holds a single sample,
+    so a strided read decompresses only the samples it returns.  Samples
+    smaller than `MIN_CHUNK_BYTES` are instead chunked by burst, as whole
+    small datasets are cheap to read.  Chunks are split along the largest
+    dimension until smaller than `MAX_CHUNK_BYTES`.
+
+    :param shape: the shape of the dataset
+    :param itemsize: the size in bytes of an element
+    :param burst_length: the number of samples written at once
+    :param read_stride: the stride with which samples are read, e.g. the
+                        `ThinPosterior` `by` option
+    :returns: a chunk shape tuple
+    """
+    sample_bytes = itemsize * np.prod(shape[1:], dtype=np.int64)
+    if read_stride > 1 and sample_bytes >= MIN_CHUNK_BYTES:
+        chunk = [1] + list(shape[1:])
+    else:
+        chunk = [min(burst_length, shape[0])] + list(shape[1:])
+
+    while itemsize * np.prod(chunk, dtype=np.int64) > MAX_CHUNK_BYTES:
+        i = int(np.argmax(chunk))
+        chunk[i] = math.ceil(chunk[i] / 2)
+
+    return tuple(max(1, c) for c in chunk)
+
+
+def compression_options(compression):
+    """Returns `h5py.Group.create_dataset` keyword arguments for a
+    compression filter.
+
+    :param compression: one of `None`/`"none"`, `"lzf"`, `"gzip"`, or
+                        `"blosc"` (requires the `hdf5plugin` package)
+    :returns: a dictionary of keyword arguments
+    """
+    if compression is None or compression == "none":
+        return {}
+    if compression == "lzf":
+        return dict(compression="lzf", shuffle=True)
+    if compression == "gzip":
+        return dict(compression="gzip", compression_opts=4, shuffle=True)
+    if compression == "blosc":
+        try:
+            import hdf5plugin
+        except ImportError as e:
+            raise ImportError(
+                "Blosc compression requires the `hdf5plugin` package"
+            ) from e
+        return dict(
+            hdf5plugin.Blosc(cname="lz4", shuffle=hdf5plugin.Blosc.SHUFFLE)
+        )
+    raise ValueError(f"Unknown compression '{compression}'")
+
+
+def create_posterior(
+    filename,
+    sample_dict,
+    results_dict,
+    num_samples,
+    burst_length,
+    read_stride=1,
+    compression="lzf",
+):
+    """Creates a posterior HDF5 file laid out for reading samples with
+    stride `read_stride`.
+
+    The layout is recorded in the `read_stride` and `compression` file
+    attributes.
+
+    :param filename: the name of the file to create
+    :param sample_dict: a dictionary of arrays, each of shape
+                        `[burst_length, ...]`, giving the shape and dtype of
+                        the samples
+    :param results_dict: a nested dictionary of arrays, as `sample_dict`,
+                         giving the shape and dtype of the kernel results
+    :param num_samples: the total number of samples
+    :param burst_length: the number of samples written at once
+    :param read_stride: the stride with which samples are read
+    :param compression: the compression filter, see `compression_options`
+    :returns: a `covid.checkpoint.PosteriorAppender` open on the file
+    """
+    filters = compression_options(compression)
+
+    def create_tree(data_dict, group):
+        for k, v in data_dict.items():
+            if isinstance(v, dict):
+                create_tree(v, group.create_group(k))
+                continue
+            dtype = np.dtype(getattr(v.dtype, "as_numpy_dtype", v.dtype))
+            shape = (num_samples,) + tuple(v.shape[1:])
+            group.create_dataset(
+                k,
+                shape=shape,
+                dtype=dtype,
+                chunks=chunk_shape(
+                    shape, dtype.itemsize, burst_length, read_stride
+                ),
+                **filters,
+            )
+
+    with h5py.File(filename, "w", libver="latest") as f:
+        create_tree(sample_dict, f.create_group("samples"))
+        create_tree(results_dict, f.create_group("results"))
+        f.attrs["read_stride"] = read_stride
+        f.attrs["compression"] = str(compression)
+
+    return PosteriorAppender(filename)
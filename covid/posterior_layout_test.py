@@ -0,0 +1,40 @@
+"""Tests the posterior HDF5 layout"""
+
+import h5py
+import numpy as np
+
+from covid.posterior_layout import chunk_shape, create_posterior
+
+
+def test_chunk_shape():
+    # Strided reads of large samples: one sample per chunk
+    assert chunk_shape((1000, 300, 80, 3), 8, 50, 10) == (1, 300, 80, 3)
+    # Small samples and contiguous reads are chunked by burst
+    assert chunk_shape((1000,), 8, 50, 10) == (50,)
+    chunk = chunk_shape((1000, 300, 80, 3), 8, 50, 1)
+    assert chunk[0] > 1
+    assert np.prod(chunk) * 8 <= 4 * 1024**2
+
+
+def test_create_posterior(tmp_path):
+    filename = str(tmp_path / "posterior.hd5")
+    posterior = create_posterior(
+        filename,
+        sample_dict={"events": np.zeros([5, 300, 80, 3])},
+        results_dict={"block0": {"is_accepted": np.zeros([5], bool)}},
+        num_samples=20,
+        burst_length=5,
+        read_stride=10,
+    )
+    posterior.write_samples({"events": np.ones([5, 300, 80, 3])}, 5)
+    del posterior
+
+    with h5py.File(filename, "r") as f:
+        assert f.attrs["read_stride"] == 10
+        assert f.attrs["compression"] == "lzf"
+        assert f["samples/events"].chunks == (1, 300, 80, 3)
+        assert f["samples/events"].compression == "lzf"
+        assert f["results/block0/is_accepted"].dtype == bool
+        np.testing.assert_array_equal(
+            f["samples/events"][::5, 0, 0, 0], [0, 1, 0, 0]
+        )
@@ -0,0 +1,151 @@
+"""Background writer for bursts of MCMC output"""
+
+import queue
+import threading
+from collections import namedtuple
+from time import perf_counter
+
+import numpy as np
+import tensorflow as tf
+
+from covid.checkpoint import write_checkpoint
+
+__all__ = ["AsyncPosteriorWriter"]
+
+PutTimes = namedtuple("PutTimes", ["transfer", "wait"])
+
+
+def _to_host(structure):
+    """Copies a nested structure of tensors into host (numpy) memory"""
+    return tf.nest.map_structure(
+        lambda x: None if x is None else np.asarray(x), structure
+    )
+
+
+class AsyncPosteriorWriter:
+    """Writes bursts of MCMC samples and results to a posterior store
+    on a dedicated thread.
+
+    Bursts are copied off the device when they are `put` on the queue,
+    and written by a single worker thread whilst the sampler computes the
+    next burst.  The queue is bounded such that at most `max_queued` bursts
+    are held in host memory in addition to the burst being written, i.e.
+    `max_queued=1` gives a double buffer.
+
+    :param posterior: an object with `write_samples` and `write_results`
+                      methods accepting a `first_dim_offset` argument,
+                      e.g. a `gemlib.mcmc.Posterior`.
+    :param max_queued: the maximum number of bursts waiting to be written.
+    """
+
+    def __init__(self, posterior, max_queued=1):
+        self._posterior = posterior
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._error = None
+        self.write_time = 0.0
+        self.transfer_time = 0.0
+        self.wait_time = 0.0
+        self._thread = threading.Thread(
+            target=self._run, name="posterior_writer", daemon=True
+        )
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if self._error is None:
+                    (
+                        samples,
+                        results,
+                        first_dim_offset,
+                        checkpoint,
+                        on_written,
+                    ) = item
+                    start = perf_counter()
+                    self._posterior.write_samples(
+                        samples, first_dim_offset=first_dim_offset
+                    )
+                    self._posterior.write_results(
+                        results, first_dim_offset=first_dim_offset
+                    )
+                    if checkpoint is not None:
+                        write_checkpoint(
+                            self._posterior["/"].file, **checkpoint
+                        )
+                    write_time = perf_counter() - start
+                    self.write_time += write_time
+                    if on_written is not None:
+                        on_written(write_time)
+            except Exception as e:  # pylint: disable=broad-except
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise RuntimeError(
+                f"Background posterior write failed: {self._error}"
+            ) from self._error
+
+    def put(
+        self,
+        samples,
+        results,
+        first_dim_offset,
+        checkpoint=None,
+        on_written=None,
+    ):
+        """Queues a burst for writing, blocking if the queue is full.
+
+        :param samples: a dictionary of samples, each with leading
+                        dimension of the burst length
+        :param results: a (nested) dictionary of traced kernel results
+        :param first_dim_offset: the offset of the burst in the first
+                                 dimension of the posterior store
+        :param checkpoint: an optional dictionary of keyword arguments to
+                           `covid.checkpoint.write_checkpoint`, written
+                           once the burst has been stored.
+        :param on_written: an optional function called on the writer thread
+                           with the time in seconds taken to store the
+                           burst.
+        :returns: a `PutTimes` tuple of the times in seconds spent copying
+                  the burst to host memory and waiting for queue space.
+        """
+        self._raise_if_failed()
+        start = perf_counter()
+        item = (
+            _to_host(samples),
+            _to_host(results),
+            first_dim_offset,
+            _to_host(checkpoint),
+            on_written,
+        )
+        transfer = perf_counter() - start
+        self.transfer_time += transfer
+
+        start = perf_counter()
+        self._queue.put(item)
+        wait = perf_counter() - start
+        self.wait_time += wait
+        return PutTimes(transfer, wait)
+
+    def flush(self):
+        """Blocks until all queued bursts have been written"""
+        self._queue.join()
+        self._raise_if_failed()
+
+    def close(self):
+        """Writes all outstanding bursts and stops the worker thread"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_if_failed()
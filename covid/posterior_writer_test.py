@@ -0,0 +1,45 @@
+"""Tests the background posterior writer"""
+
+import numpy as np
+import pytest
+
+from covid.posterior_writer import AsyncPosteriorWriter
+
+
+class _ListPosterior:
+    def __init__(self):
+        self.samples = []
+        self.results = []
+
+    def write_samples(self, samples, first_dim_offset=0):
+        self.samples.append((first_dim_offset, samples))
+
+    def write_results(self, results, first_dim_offset=0):
+        self.results.append((first_dim_offset, results))
+
+
+def test_writes_bursts_in_order():
+
+    posterior = _ListPosterior()
+    with AsyncPosteriorWriter(posterior, max_queued=1) as writer:
+        for i in range(5):
+            writer.put(
+                {"beta1": np.full([3], i)},
+                {"block0": {"is_accepted": np.ones([3], bool)}},
+                first_dim_offset=i * 3,
+            )
+
+    assert [x[0] for x in posterior.samples] == [0, 3, 6, 9, 12]
+    np.testing.assert_array_equal(posterior.samples[-1][1]["beta1"], [4] * 3)
+    assert len(posterior.results) == 5
+
+
+def test_write_error_is_raised():
+    class _FailingPosterior(_ListPosterior):
+        def write_samples(self, samples, first_dim_offset=0):
+            raise IOError("disc full")
+
+    writer = AsyncPosteriorWriter(_FailingPosterior())
+    writer.put({"beta1": np.zeros([1])}, {}, first_dim_offset=0)
+    with pytest.raises(RuntimeError):
+        writer.close()
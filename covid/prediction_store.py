@@ -0,0 +1,159 @@
+"""On-disc store of predicted events, written and read in batches of
+posterior samples"""
+
+import pickle as pkl
+
+import h5py
+import numpy as np
+import xarray
+
+from covid.posterior_layout import chunk_shape, compression_options
+
+__all__ = [
+    "PredictionWriter",
+    "is_prediction_store",
+    "iter_prediction",
+    "map_prediction",
+]
+
+DIMS = ("iteration", "location", "time", "event")
+
+
+class PredictionWriter:
+    """Writes a `[iteration, location, time, event]` prediction to an HDF5
+    store, one batch of posterior samples at a time.
+
+    The store holds datasets `events` and `initial_state`, and the
+    coordinates of the `location`, `time`, and `event` dimensions.  Each
+    batch is written as whole chunks, so that readers may load one batch
+    at a time.
+
+    :param filename: the name of the store to create
+    :param num_samples: the total number of posterior samples
+    :param locations: the location labels
+    :param dates: the `np.datetime64` dates of the time steps
+    :param num_events: the number of event types
+    :param num_states: the number of epidemic states
+    :param batch_size: the number of posterior samples written at once
+    :param compression: the compression filter, see
+                        `covid.posterior_layout.compression_options`
+    """
+
+    def __init__(
+        self,
+        filename,
+        num_samples,
+        locations,
+        dates,
+        num_events,
+        num_states,
+        batch_size,
+        compression="lzf",
+    ):
+        self._file = h5py.File(filename, "w")
+        shape = (num_samples, len(locations), len(dates), num_events)
+        self._file.create_dataset(
+            "events",
+            shape=shape,
+            dtype=np.float64,
+            chunks=chunk_shape(shape, 8, batch_size, 1),
+            **compression_options(compression),
+        )
+        self._file.create_dataset(
+            "initial_state",
+            shape=(num_samples, len(locations), num_states),
+            dtype=np.float64,
+        )
+        self._file.create_dataset(
+            "location", data=np.asarray(locations, dtype=h5py.string_dtype())
+        )
+        self._file.create_dataset(
+            "time", data=np.asarray(dates, "datetime64[D]").astype(np.int64)
+        )
+        self._file.attrs["dims"] = DIMS
+        self._file.attrs["batch_size"] = batch_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, first_sample, events, initial_state):
+        """Writes a batch of predicted events
+
+        :param first_sample: the index of the first sample in the batch
+        :param events: a `[B, M, T, X]` array of events
+        :param initial_state: the `[B, M, S]` initial states
+        """
+        batch = slice(first_sample, first_sample + events.shape[0])
+        self._file["events"][batch] = np.asarray(events)
+        self._file["initial_state"][batch] = np.asarray(initial_state)
+
+    def close(self):
+        self._file.close()
+
+
+def is_prediction_store(filename):
+    """Returns `True` if `filename` is a prediction store, rather than a
+    pickled `xarray.DataArray`"""
+    return h5py.is_hdf5(filename)
+
+
+def iter_prediction(filename, batch_size=None):
+    """Iterates over batches of posterior samples of a prediction.
+
+    :param filename: a prediction store, or a pickled `xarray.DataArray`
+                     which is yielded whole
+    :param batch_size: the number of samples per batch, by default the
+                       batch size with which the store was written
+    :returns: a generator of `xarray.DataArray`s with dimensions
+              `[iteration, location, time, event]`, and attribute
+              `initial_state`
+    """
+    if not is_prediction_store(filename):
+        with open(filename, "rb") as f:
+            yield pkl.load(f)
+        return
+
+    with h5py.File(filename, "r") as f:
+        events = f["events"]
+        if batch_size is None:
+            batch_size = int(f.attrs["batch_size"])
+        location = f["location"].asstr()[:]
+        time = f["time"][:].astype("datetime64[D]")
+        event = np.arange(events.shape[-1])
+        for start in range(0, events.shape[0], batch_size):
+            batch = slice(start, min(start + batch_size, events.shape[0]))
+            prediction = xarray.DataArray(
+                events[batch],
+                coords=[
+                    np.arange(batch.start, batch.stop),
+                    location,
+                    time,
+                    event,
+                ],
+                dims=DIMS,
+            )
+            prediction.attrs["initial_state"] = f["initial_state"][batch]
+            yield prediction
+
+
+def map_prediction(fn, filename, batch_size=None):
+    """Applies `fn` to batches of posterior samples of a prediction, and
+    concatenates the results along the `iteration` dimension.
+
+    Only one batch of the prediction is held in memory at once, so `fn`
+    should reduce over the dimensions that are not needed downstream.
+
+    :param fn: a function taking a `[iteration, ...]` `xarray.DataArray`
+               and returning a `[iteration, ...]` `xarray.DataArray`
+    :param filename: a prediction store, or a pickled `xarray.DataArray`
+    :param batch_size: the number of samples per batch, see
+                       `iter_prediction`
+    :returns: an `xarray.DataArray`
+    """
+    return xarray.concat(
+        [fn(batch) for batch in iter_prediction(filename, batch_size)],
+        dim="iteration",
+    )
@@ -0,0 +1,57 @@
+"""Tests the on-disc prediction store"""
+
+import os
+import pickle as pkl
+
+import numpy as np
+import xarray
+
+from covid.prediction_store import (
+    PredictionWriter,
+    is_prediction_store,
+    iter_prediction,
+    map_prediction,
+)
+
+
+def test_prediction_store(tmp_path):
+    filename = os.path.join(tmp_path, "prediction.hd5")
+    events = np.random.default_rng(0).poisson(3.0, size=[5, 2, 4, 3])
+    initial_state = np.ones([5, 2, 4])
+    dates = np.arange(
+        np.datetime64("2021-01-01"),
+        np.datetime64("2021-01-05"),
+        np.timedelta64(1, "D"),
+    )
+
+    with PredictionWriter(filename, 5, ["a", "b"], dates, 3, 4, 2) as writer:
+        for start in range(0, 5, 2):
+            writer.write(
+                start,
+                events[start : start + 2],
+                initial_state[start : start + 2],
+            )
+
+    assert is_prediction_store(filename)
+    batches = list(iter_prediction(filename))
+    assert [b.shape[0] for b in batches] == [2, 2, 1]
+    np.testing.assert_array_equal(batches[1].coords["iteration"], [2, 3])
+    np.testing.assert_array_equal(batches[0].coords["time"], dates)
+    np.testing.assert_array_equal(batches[0].coords["location"], ["a", "b"])
+
+    total = map_prediction(lambda x: x.sum(dim="time"), filename)
+    np.testing.assert_array_equal(total, events.sum(axis=-2))
+
+
+def test_map_prediction_pickle(tmp_path):
+    filename = os.path.join(tmp_path, "prediction.pkl")
+    prediction = xarray.DataArray(
+        np.ones([3, 2, 4, 3]),
+        dims=("iteration", "location", "time", "event"),
+    )
+    with open(filename, "wb") as f:
+        pkl.dump(prediction, f)
+
+    assert not is_prediction_store(filename)
+    total = map_prediction(lambda x: x[..., 2].sum(dim="time"), filename)
+    np.testing.assert_array_equal(total, np.full([3, 2], 4.0))
@@ -0,0 +1,180 @@
+"""Means and quantiles of many named slices of posterior samples, computed
+in one pass over batches of samples"""
+
+import numpy as np
+
+__all__ = ["quantiles", "QuantileSummary"]
+
+INTERPOLATIONS = ("nearest", "linear")
+
+
+def _ranks(q, num_samples, interpolation):
+    """Returns the lower and upper sample ranks, and interpolation weights,
+    of quantiles `q` of `num_samples` samples"""
+    h = np.asarray(q, dtype=np.float64) * (num_samples - 1)
+    if interpolation == "nearest":
+        # Rounds half to even, as `tfp.stats.percentile`
+        lo = hi = np.round(h).astype(np.int64)
+    elif interpolation == "linear":
+        lo = np.floor(h).astype(np.int64)
+        hi = np.ceil(h).astype(np.int64)
+    else:
+        raise ValueError(
+            f"Unknown interpolation '{interpolation}', expected one of "
+            f"{INTERPOLATIONS}"
+        )
+    return lo, hi, h - lo
+
+
+def quantiles(arr, q, axis=0, interpolation="linear"):
+    """Computes quantiles `q` of `arr` along `axis` by partial selection,
+    i.e. without sorting `arr`.
+
+    :param arr: an array
+    :param q: a list of quantiles in `[0, 1]`
+    :param axis: the sample axis
+    :param interpolation: `"linear"`, as `np.quantile`, or `"nearest"`, as
+                          `tfp.stats.percentile`
+    :returns: an array of shape `[len(q)] + shape of arr without axis`
+    """
+    arr = np.moveaxis(np.asarray(arr), axis, 0)
+    lo, hi, frac = _ranks(q, arr.shape[0], interpolation)
+    part = np.partition(arr, np.unique(np.concatenate([lo, hi])), axis=0)
+    frac = frac.reshape([-1] + [1] * (arr.ndim - 1))
+    return part[lo] + frac * (part[hi] - part[lo])
+
+
+class _Sketch:
+    """A bounded-memory quantile sketch of a batch of elements.
+
+    Samples are held in levels, where a sample at level `l` stands for
+    `2**l` samples.  A full level is sorted and every other sample is
+    promoted to the next level, so the sketch holds
+    `O(size * log(n / size))` samples of each element.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.levels = []
+        self._offsets = []
+
+    def update(self, samples):
+        if len(self.levels) == 0:
+            self.levels.append(samples[:0])
+            self._offsets.append(0)
+        self.levels[0] = np.concatenate([self.levels[0], samples])
+        level = 0
+        while level < len(self.levels):
+            if self.levels[level].shape[0] >= self.size:
+                self._compact(level)
+            level += 1
+
+    def _compact(self, level):
+        buffer = self.levels[level]
+        hold = buffer.shape[0] % 2
+        promoted = np.sort(buffer[hold:], axis=0)[self._offsets[level] :: 2]
+        # Alternate the offset, such that compaction is unbiased on average
+        self._offsets[level] = 1 - self._offsets[level]
+        self.levels[level] = buffer[:hold]
+        if level + 1 == len(self.levels):
+            self.levels.append(promoted[:0])
+            self._offsets.append(0)
+        self.levels[level + 1] = np.concatenate(
+            [self.levels[level + 1], promoted]
+        )
+
+    def quantiles(self, q, num_samples, interpolation):
+        values = np.concatenate(self.levels)
+        weights = np.concatenate(
+            [np.full(x.shape[0], 2**l) for l, x in enumerate(self.levels)]
+        )
+        order = np.argsort(values, axis=0)
+        values = np.take_along_axis(values, order, axis=0)
+        cum_weights = np.cumsum(weights[order], axis=0)
+
+        def at_rank(rank):
+            # The first sample covering `rank`
+            idx = np.sum(cum_weights <= rank, axis=0, keepdims=True)
+            return np.take_along_axis(values, idx, axis=0)[0]
+
+        lo, hi, frac = _ranks(q, num_samples, interpolation)
+        return np.stack(
+            [
+                at_rank(l) + f * (at_rank(h) - at_rank(l))
+                for l, h, f in zip(lo, hi, frac)
+            ]
+        )
+
+
+class QuantileSummary:
+    """Accumulates the mean and quantiles of named slices of posterior
+    samples, one batch of samples at a time.
+
+    By default, all samples of each slice are kept, and quantiles are
+    computed exactly by a single partial selection.  Slices are typically
+    small reductions of a prediction, e.g. incidence over a horizon, so
+    this costs far less memory than the prediction itself.  If
+    `sketch_size` is given, each slice is instead summarised by a
+    bounded-memory sketch, with rank error of order
+    `log2(n / sketch_size) / sketch_size`.
+
+    :param q: a list of quantiles in `[0, 1]`
+    :param interpolation: `"nearest"`, as `tfp.stats.percentile`, or
+                          `"linear"`, as `np.quantile`
+    :param sketch_size: an optional number of samples per sketch level
+    """
+
+    def __init__(
+        self, q=(0.025, 0.975), interpolation="nearest", sketch_size=None
+    ):
+        _ranks(q, 1, interpolation)  # Validates interpolation
+        self.q = np.asarray(q)
+        self.interpolation = interpolation
+        self.sketch_size = sketch_size
+        self._sum = {}
+        self._count = {}
+        self._samples = {}
+
+    def update(self, name, samples):
+        """Adds a batch of samples of slice `name`
+
+        :param name: the name of the slice
+        :param samples: a `[B, ...]` array of samples
+        """
+        samples = np.asarray(samples)
+        if name not in self._sum:
+            self._sum[name] = np.zeros(samples.shape[1:])
+            self._count[name] = 0
+            self._samples[name] = (
+                [] if self.sketch_size is None else _Sketch(self.sketch_size)
+            )
+        self._sum[name] = self._sum[name] + np.sum(samples, axis=0)
+        self._count[name] += samples.shape[0]
+        if self.sketch_size is None:
+            self._samples[name].append(samples)
+        else:
+            self._samples[name].update(samples)
+
+    def __contains__(self, name):
+        return name in self._sum
+
+    def result(self, name):
+        """Returns the summary of slice `name`, keyed as
+        `covid.summary.mean_and_ci`
+
+        :param name: the name of the slice
+        :returns: a dict of `{name}_mean` and `{name}_{q}` arrays
+        """
+        count = self._count[name]
+        if self.sketch_size is None:
+            q = quantiles(
+                np.concatenate(self._samples[name]),
+                self.q,
+                interpolation=self.interpolation,
+            )
+        else:
+            q = self._samples[name].quantiles(self.q, count, self.interpolation)
+        results = {f"{name}_mean": self._sum[name] / count}
+        for i, qq in enumerate(self.q):
+            results[f"{name}_{qq}"] = q[i]
+        return results
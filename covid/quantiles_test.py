@@ -0,0 +1,52 @@
+"""Tests the one-pass quantile summaries"""
+
+import numpy as np
+import pytest
+import tensorflow_probability as tfp
+
+from covid.quantiles import quantiles, QuantileSummary
+
+
+@pytest.fixture
+def samples():
+    return np.random.default_rng(2).gamma(2.0, size=[1000, 3, 4])
+
+
+def test_quantiles(samples):
+    q = [0.05, 0.5, 0.95]
+    np.testing.assert_allclose(
+        quantiles(samples, q), np.quantile(samples, q, axis=0)
+    )
+    np.testing.assert_allclose(
+        quantiles(samples, q, axis=1, interpolation="nearest"),
+        tfp.stats.percentile(samples, np.array(q) * 100.0, axis=1),
+    )
+
+
+def test_quantile_summary(samples):
+    summary = QuantileSummary(q=[0.05, 0.95], interpolation="linear")
+    for start in range(0, 1000, 300):
+        summary.update("x", samples[start : start + 300])
+        summary.update("y", 2.0 * samples[start : start + 300, 0])
+
+    x = summary.result("x")
+    np.testing.assert_allclose(x["x_mean"], samples.mean(axis=0))
+    np.testing.assert_allclose(x["x_0.95"], np.quantile(samples, 0.95, axis=0))
+    np.testing.assert_allclose(
+        summary.result("y")["y_0.05"],
+        np.quantile(2.0 * samples[:, 0], 0.05, axis=0),
+    )
+
+
+def test_quantile_sketch(samples):
+    summary = QuantileSummary(q=[0.05, 0.5, 0.95], sketch_size=64)
+    for start in range(0, 1000, 100):
+        summary.update("x", samples[start : start + 100])
+
+    assert sum(len(x) for x in summary._samples["x"].levels) < 300
+    result = summary.result("x")
+    np.testing.assert_allclose(result["x_mean"], samples.mean(axis=0))
+    # Compare ranks, rather than values, of the sketch quantiles
+    for q in [0.05, 0.5, 0.95]:
+        rank = np.mean(samples <= result[f"x_{q}"], axis=0)
+        np.testing.assert_allclose(rank, q, atol=0.05)
@@ -6,13 +6,16 @@ import pandas as pd
 import ruffus as rf
 
 
+from covid.tasks.thin_posterior import inline_thinned_is_current
 from covid.tasks import (
     assemble_data,
     mcmc,
+    mcmc_chains,
+    mcmc_process,
     thin_posterior,
     next_generation_matrix,
     overall_rt,
-    predict,
+    predict_scenarios,
     summarize,
     within_between,
     case_exceedance,
@@ -42,7 +45,7 @@ def run_pipeline(global_config, results_directory, cli_options):
     @rf.transform(
         save_config,
         rf.formatter(),
-        wd("pipeline_data.pkl"),
+        wd("pipeline_data"),
         global_config,
     )
     def process_data(input_file, output_file, config):
@@ -55,92 +58,107 @@ def run_pipeline(global_config, results_directory, cli_options):
         global_config,
     )
     def run_mcmc(input_file, output_file, config):
-        mcmc(input_file, output_file, config["Mcmc"])
+        # Lay out the posterior for the thinning step's strided reads
+        mcmc_config = dict(config["Mcmc"])
+        if mcmc_config.get("read_stride") is None:
+            mcmc_config["read_stride"] = config["ThinPosterior"]["by"]
+        if mcmc_config.get("num_chain_processes", 1) > 1:
+            mcmc_chains(input_file, output_file, mcmc_config)
+            return
+
+        kwargs = {}
+        if mcmc_config.get("inline_thin", False):
+            kwargs = dict(
+                thin_config=config["ThinPosterior"],
+                thin_output_file=wd("thin_samples"),
+            )
+        # TensorFlow is already initialised in this process, so a compiled
+        #   sampler cache is only used by a new process.
+        if mcmc_config.get("xla_cache_dir") is not None:
+            mcmc_process(input_file, output_file, mcmc_config, **kwargs)
+        else:
+            mcmc(input_file, output_file, mcmc_config, **kwargs)
 
     @rf.transform(
         input=run_mcmc,
         filter=rf.formatter(),
-        output=wd("thin_samples.pkl"),
+        output=wd("thin_samples"),
         extras=[global_config],
     )
     def thin_samples(input_file, output_file, config):
+        if inline_thinned_is_current(
+            input_file, output_file, config["ThinPosterior"]
+        ):
+            return  # Already thinned during the MCMC
         thin_posterior(input_file, output_file, config["ThinPosterior"])
 
     # Rt related steps
-    rf.transform(
+    @rf.transform(
         input=[[process_data, thin_samples]],
         filter=rf.formatter(),
-        output=wd("ngm.pkl"),
-    )(next_generation_matrix)
+        output=wd("ngm.hd5"),
+        extras=[global_config],
+    )
+    def ngm(input_files, output_file, config):
+        # The eigen-solver is warm started from the NGM store of the
+        #   previous run, by default the one this task replaces
+        ngm_config = dict(config.get("NextGenerationMatrix", {}))
+        if ngm_config.get("warm_start") is None:
+            ngm_config["warm_start"] = output_file
+        ngm_config["warm_start"] = os.path.expandvars(ngm_config["warm_start"])
+        next_generation_matrix(input_files, output_file, **ngm_config)
 
     rf.transform(
-        input=next_generation_matrix,
+        input=ngm,
         filter=rf.formatter(),
         output=wd("national_rt.xlsx"),
     )(overall_rt)
 
-    # In-sample prediction
-    @rf.transform(
-        input=[[process_data, thin_samples]],
-        filter=rf.formatter(),
-        output=wd("insample7.pkl"),
-    )
-    def insample7(input_files, output_file):
-        predict(
-            data=input_files[0],
-            posterior_samples=input_files[1],
-            output_file=output_file,
-            initial_step=-8,
-            num_steps=28,
-        )
-
-    @rf.transform(
-        input=[[process_data, thin_samples]],
-        filter=rf.formatter(),
-        output=wd("insample14.pkl"),
-    )
-    def insample14(input_files, output_file):
-        return predict(
-            data=input_files[0],
-            posterior_samples=input_files[1],
-            output_file=output_file,
-            initial_step=-14,
-            num_steps=28,
-        )
-
-    # Medium-term prediction
-    @rf.transform(
-        input=[[process_data, thin_samples]],
-        filter=rf.formatter(),
-        output=wd("medium_term.pkl"),
+    # Predictions as (output file, initial step, number of steps)
+    insample7 = wd("insample7.hd5")
+    insample14 = wd("insample14.hd5")
+    medium_term = wd("medium_term.hd5")
+    prediction_scenarios = [
+        (insample7, -8, 28),
+        (insample14, -14, 28),
+        (medium_term, -1, 61),
+    ]
+
+    # In-sample and medium-term predictions are simulated together, in a
+    #   single job writing all prediction stores.  Tasks that read a
+    #   prediction store follow this task.
+    @rf.split(
+        input=[process_data, thin_samples],
+        output=[scenario[0] for scenario in prediction_scenarios],
     )
-    def medium_term(input_files, output_file):
-        return predict(
+    def predictions(input_files, output_files):
+        predict_scenarios(
             data=input_files[0],
             posterior_samples=input_files[1],
-            output_file=output_file,
-            initial_step=-1,
-            num_steps=61,
+            scenarios=prediction_scenarios,
+            batch_size=global_config.get("Predict", {}).get("batch_size"),
         )
 
     # Summarisation
     rf.transform(
-        input=next_generation_matrix,
+        input=ngm,
         filter=rf.formatter(),
         output=wd("rt_summary.csv"),
     )(summarize.rt)
 
     rf.transform(
-        input=medium_term,
-        filter=rf.formatter(),
+        input=predictions,
+        filter=rf.formatter(r".+/medium_term\.hd5$"),
         output=wd("infec_incidence_summary.csv"),
     )(summarize.infec_incidence)
 
-    rf.transform(
-        input=[[process_data, thin_samples, medium_term]],
-        filter=rf.formatter(),
-        output=wd("prevalence_summary.csv"),
-    )(summarize.prevalence)
+    rf.follows(predictions)(
+        rf.transform(
+            input=[[process_data, thin_samples, medium_term]],
+            filter=rf.formatter(),
+            output=wd("prevalence_summary.csv"),
+        )(summarize.prevalence)
+    )
 
     rf.transform(
         input=[[process_data, thin_samples]],
@@ -148,6 +166,7 @@ def run_pipeline(global_config, results_directory, cli_options):
         output=wd("within_between_summary.csv"),
     )(within_between)
 
+    @rf.follows(predictions)
     @rf.transform(
         input=[[process_data, insample7, insample14]],
         filter=rf.formatter(),
@@ -164,8 +183,8 @@ def run_pipeline(global_config, results_directory, cli_options):
 
     # Plot in-sample
     @rf.transform(
-        input=[insample7, insample14],
-        filter=rf.formatter(".+/insample(?P<LAG>\d+).pkl"),
+        input=predictions,
+        filter=rf.formatter(".+/insample(?P<LAG>\d+).hd5"),
         add_inputs=rf.add_inputs(process_data),
         output="{path[0]}/insample_plots{LAG[0]}",
         extras=["{LAG[0]}"],
@@ -193,10 +212,12 @@ def run_pipeline(global_config, results_directory, cli_options):
     rf.cmdline.run(cli_options)
 
     # DSTL Summary
-    rf.transform(
-        [[process_data, insample14, medium_term, next_generation_matrix]],
-        rf.formatter(),
-        wd("summary_longformat.xlsx"),
-    )(summary_longformat)
+    rf.follows(predictions)(
+        rf.transform(
+            [[process_data, insample14, medium_term, ngm]],
+            rf.formatter(),
+            wd("summary_longformat.xlsx"),
+        )(summary_longformat)
+    )
 
     rf.cmdline.run(cli_options)
@@ -0,0 +1,170 @@
+"""Batched forward simulation, and log probabilities, of discrete-time
+state transition models"""
+
+import numpy as np
+import tensorflow as tf
+import tensorflow_probability as tfp
+
+from covid.state import compute_state
+
+tfd = tfp.distributions
+
+__all__ = ["chain_binomial_simulate", "chain_binomial_log_prob"]
+
+
+def chain_binomial_simulate(
+    transition_rate_fn,
+    stoichiometry,
+    initial_state,
+    initial_step,
+    num_steps,
+    time_delta=1.0,
+    start_steps=None,
+    shared_random_dims=0,
+    seed=None,
+):
+    """Simulates a discrete-time chain binomial epidemic for a batch of
+       parameter sets at once.
+
+    All batch members and metapopulations are advanced together, one time
+    step per iteration of a single `tf.while_loop`, so the simulation
+    may be compiled with XLA as a whole.  The number of events of each
+    transition is binomial given the occupancy of its source state, with
+    probability `1 - exp(-rate * time_delta)`, as for
+    `gemlib.distributions.DiscreteTimeStateTransitionModel` where each
+    state has at most one outgoing transition.
+
+    Batch members may start at different times, given by `start_steps`.
+    Before its start step, a batch member has no events, and its state is
+    held at its initial state.  This allows simulations over overlapping
+    time windows to run as one batch.
+
+    The leading `shared_random_dims` batch dimensions may index scenarios
+    which share random numbers, i.e. their events are drawn from the same
+    random stream for each element of the remaining dimensions.  These
+    common random numbers make differences between scenarios far less
+    noisy than independent simulations.
+
+    :param transition_rate_fn: a function taking arguments `t` and a
+                               `[..., M, S]` state, returning a list of
+                               `[..., M]` transition rates
+    :param stoichiometry: a `[X, S]` stoichiometry matrix
+    :param initial_state: a `[..., M, S]` initial state
+    :param initial_step: the initial time step
+    :param num_steps: the (static) number of time steps to simulate
+    :param time_delta: the size of the time step
+    :param start_steps: an optional tensor, broadcastable to the `[...]`
+                        batch shape, of the time steps at which each batch
+                        member starts.  Defaults to `initial_step`.
+    :param shared_random_dims: the number of leading batch dimensions across
+                               which random numbers are shared
+    :param seed: an optional stateless seed
+    :returns: a `[..., M, num_steps, X]` tensor of events
+    """
+    initial_state = tf.convert_to_tensor(initial_state)
+    dtype = initial_state.dtype
+    source = np.argmax(np.asarray(stoichiometry) < 0, axis=-1)
+    stoichiometry = tf.convert_to_tensor(stoichiometry, dtype=dtype)
+    seeds = tfp.random.split_seed(
+        tfp.random.sanitize_seed(seed), n=num_steps, salt="simulate"
+    )
+
+    def body(i, state, events):
+        t = tf.cast(initial_step, dtype) + tf.cast(i, dtype) * time_delta
+        rates = tf.stack(transition_rate_fn(t, state), axis=-1)
+        probs = -tf.math.expm1(-rates * time_delta)
+        total_count = tf.gather(state, source, axis=-1)
+        if shared_random_dims == 0:
+            counts = tfd.Binomial(total_count=total_count, probs=probs).sample(
+                seed=tf.gather(seeds, i)
+            )
+        else:
+            # Sample each scenario with the same seed and shape
+            shared_shape = total_count.shape[:shared_random_dims].as_list()
+            flat_shape = [-1] + total_count.shape[shared_random_dims:].as_list()
+            counts = tf.stack(
+                [
+                    tfd.Binomial(total_count=n, probs=p).sample(
+                        seed=tf.gather(seeds, i)
+                    )
+                    for n, p in zip(
+                        tf.unstack(tf.reshape(total_count, flat_shape)),
+                        tf.unstack(tf.reshape(probs, flat_shape)),
+                    )
+                ]
+            )
+            counts = tf.reshape(
+                counts, shared_shape + counts.shape[1:].as_list()
+            )
+        if start_steps is not None:
+            started = t >= tf.cast(start_steps, dtype)
+            counts = tf.where(
+                started[..., tf.newaxis, tf.newaxis],
+                counts,
+                tf.zeros_like(counts),
+            )
+        state = state + tf.linalg.matmul(counts, stoichiometry)
+        return i + 1, state, events.write(i, counts)
+
+    _, _, events = tf.while_loop(
+        lambda i, *_: i < num_steps,
+        body,
+        loop_vars=(
+            tf.constant(0),
+            initial_state,
+            tf.TensorArray(dtype, size=num_steps),
+        ),
+    )
+
+    # [T, ..., M, X] -> [..., M, T, X]
+    events = events.stack()
+    rank = len(events.shape)
+    return tf.transpose(events, list(range(1, rank - 1)) + [0, rank - 1])
+
+
+def chain_binomial_log_prob(
+    transition_rate_fn,
+    stoichiometry,
+    initial_state,
+    initial_step,
+    events,
+    time_delta=1.0,
+):
+    """Computes the log probability of each event count of a discrete-time
+       chain binomial epidemic.
+
+    As for `chain_binomial_simulate`, the number of events of each
+    transition is binomial given the occupancy of its source state.  The
+    sum of the result is the log probability of `events` under
+    `gemlib.distributions.DiscreteTimeStateTransitionModel`, where each
+    state has at most one outgoing transition.  The terms are returned
+    unreduced, so that they may be computed at reduced precision and
+    summed at a higher precision.
+
+    :param transition_rate_fn: a function taking arguments `t` and a
+                               `[M, S]` state, returning a list of `[M]`
+                               transition rates
+    :param stoichiometry: a `[X, S]` stoichiometry matrix
+    :param initial_state: a `[M, S]` initial state
+    :param initial_step: the initial time step
+    :param events: a `[M, T, X]` tensor of events
+    :param time_delta: the size of the time step
+    :returns: a `[M, T, X]` tensor of log probabilities, in the dtype of
+              `events`
+    """
+    events = tf.convert_to_tensor(events)
+    dtype = events.dtype
+    source = np.argmax(np.asarray(stoichiometry) < 0, axis=-1)
+    state = compute_state(initial_state, events, stoichiometry)  # [M, T, S]
+    times = (
+        tf.cast(initial_step, dtype)
+        + tf.range(events.shape[-2], dtype=dtype) * time_delta
+    )
+
+    rates = tf.vectorized_map(
+        lambda elems: tf.stack(transition_rate_fn(*elems), axis=-1),
+        elems=(times, tf.transpose(state, [1, 0, 2])),
+    )  # [T, M, X]
+    probs = -tf.math.expm1(-tf.transpose(rates, [1, 0, 2]) * time_delta)
+    total_count = tf.gather(state, source, axis=-1)
+    return tfd.Binomial(total_count=total_count, probs=probs).log_prob(events)
@@ -0,0 +1,116 @@
+"""Tests batched chain binomial simulation"""
+
+import numpy as np
+import tensorflow as tf
+
+from covid.simulation import chain_binomial_simulate
+
+STOICHIOMETRY = np.array([[-1, 1, 0, 0], [0, -1, 1, 0], [0, 0, -1, 1]])
+
+
+def _constant_rates(rates):
+    def transition_rate_fn(t, state):
+        return [
+            tf.broadcast_to(tf.constant(r, state.dtype), state.shape[:-1])
+            for r in rates
+        ]
+
+    return transition_rate_fn
+
+
+def test_chain_binomial_simulate():
+    initial_state = np.tile(
+        np.array([[1000.0, 100.0, 10.0, 0.0]]), [2, 3, 1]
+    )  # [B, M, S]
+
+    events = chain_binomial_simulate(
+        _constant_rates([0.1, 0.2, 0.3]),
+        STOICHIOMETRY,
+        initial_state,
+        initial_step=0,
+        num_steps=5,
+        seed=[0, 1],
+    )
+    events_again = chain_binomial_simulate(
+        _constant_rates([0.1, 0.2, 0.3]),
+        STOICHIOMETRY,
+        initial_state,
+        initial_step=0,
+        num_steps=5,
+        seed=[0, 1],
+    )
+
+    assert events.shape == (2, 3, 5, 3)
+    np.testing.assert_array_equal(events, events_again)
+
+    # No state becomes negative
+    state = initial_state[..., np.newaxis, :] + np.cumsum(
+        np.einsum("...tx,xs->...ts", events, STOICHIOMETRY), axis=-2
+    )
+    assert np.all(state >= 0.0)
+
+
+def test_chain_binomial_simulate_mean():
+    initial_state = np.tile(
+        np.array([[10000.0, 0.0, 0.0, 0.0]]), [200, 1, 1]
+    )  # [B, M, S]
+    rate = 0.1
+
+    events = chain_binomial_simulate(
+        _constant_rates([rate, 0.0, 0.0]),
+        STOICHIOMETRY,
+        initial_state,
+        initial_step=0,
+        num_steps=1,
+        seed=[2, 3],
+    )
+
+    np.testing.assert_allclose(
+        np.mean(events[..., 0, 0]), 10000.0 * (1.0 - np.exp(-rate)), rtol=0.01
+    )
+
+
+def test_chain_binomial_simulate_start_steps():
+    initial_state = np.tile(np.array([[1000.0, 100.0, 10.0, 0.0]]), [2, 3, 1])
+
+    events = chain_binomial_simulate(
+        _constant_rates([0.1, 0.2, 0.3]),
+        STOICHIOMETRY,
+        initial_state,
+        initial_step=10,
+        num_steps=5,
+        start_steps=np.array([10, 13]),
+        seed=[0, 1],
+    )
+
+    assert np.all(events[1, :, :3] == 0.0)
+    assert np.all(np.sum(events[:, :, 3:], axis=(-2, -1)) > 0.0)
+
+
+def test_chain_binomial_simulate_shared_random_dims():
+    initial_state = np.tile(
+        np.array([[1000.0, 100.0, 10.0, 0.0]]), [3, 50, 2, 1]
+    )
+    rates = np.array([0.1, 0.1, 0.11])[:, np.newaxis, np.newaxis]
+
+    def transition_rate_fn(t, state):
+        return [
+            tf.broadcast_to(tf.constant(rates, state.dtype), state.shape[:-1]),
+            tf.broadcast_to(tf.constant(0.2, state.dtype), state.shape[:-1]),
+            tf.broadcast_to(tf.constant(0.3, state.dtype), state.shape[:-1]),
+        ]
+
+    events = chain_binomial_simulate(
+        transition_rate_fn,
+        STOICHIOMETRY,
+        initial_state,
+        initial_step=0,
+        num_steps=5,
+        shared_random_dims=1,
+        seed=[0, 1],
+    ).numpy()
+
+    # Identical scenarios share events; differing scenarios are coupled
+    np.testing.assert_array_equal(events[0], events[1])
+    total = events[..., 0].sum(axis=(-2, -1))
+    assert np.corrcoef(total[0], total[2])[0, 1] > 0.5
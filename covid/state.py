@@ -0,0 +1,126 @@
+"""Reconstruction of epidemic state from posterior events"""
+
+import os
+
+import numpy as np
+import tensorflow as tf
+
+__all__ = ["compute_state", "StateCache"]
+
+
+def _normalise_times(times, num_times):
+    times = np.asarray(times, dtype=np.int64)
+    times = np.where(times < 0, times + num_times, times)
+    if np.any(times < 0) or np.any(times > num_times):
+        raise IndexError(f"Times {times} out of range for {num_times} steps")
+    return times
+
+
+def compute_state(initial_state, events, stoichiometry, times=None):
+    """Computes the state of the epidemic from its initial state and events.
+
+    The state at time `t` is the state at the start of step `t`, i.e. the
+    initial state plus the events in steps `0, ..., t-1`, as for
+    `gemlib.util.compute_state`.  Events are accumulated before they are
+    projected onto the states, so that intermediate results have the size
+    of `events` rather than the state.  If `times` is given, only the
+    selected time slices are computed, by contracting `events` with a
+    `[T, len(times)]` mask, such that the full timeseries of states is
+    never held in memory.
+
+    :param initial_state: a `[..., M, S]` tensor of initial states,
+                          broadcast against the batch dimensions of `events`
+    :param events: a `[..., M, T, X]` tensor of events
+    :param stoichiometry: a `[X, S]` stoichiometry matrix
+    :param times: an optional integer, or list of integers, in `[-T, T]`.
+                  Negative times count back from `T`.
+    :returns: a `[..., M, T, S]` tensor of states if `times` is `None`, a
+              `[..., M, len(times), S]` tensor if `times` is a list, or a
+              `[..., M, S]` tensor if `times` is an integer.
+    """
+    events = tf.convert_to_tensor(events)
+    initial_state = tf.convert_to_tensor(initial_state, dtype=events.dtype)
+    stoichiometry = tf.convert_to_tensor(stoichiometry, dtype=events.dtype)
+    num_times = events.shape[-2]
+
+    if times is None:
+        cum_events = tf.cumsum(events, axis=-2, exclusive=True)
+    else:
+        scalar = np.ndim(times) == 0
+        times = _normalise_times(np.atleast_1d(times), num_times)
+        mask = tf.cast(
+            tf.range(num_times, dtype=tf.int64)[:, tf.newaxis] < times,
+            events.dtype,
+        )
+        cum_events = tf.einsum("...tx,tk->...kx", events, mask)
+
+    state = tf.einsum("...tx,xs->...ts", cum_events, stoichiometry)
+    state = state + initial_state[..., tf.newaxis, :]
+    if times is not None and scalar:
+        state = state[..., 0, :]
+    return state
+
+
+class StateCache:
+    """Caches time slices of the epidemic state computed from a thinned
+    posterior samples file, such that each slice is computed once per
+    pipeline run however many tasks require it.
+
+    Slices are stored as `.npy` files in a directory next to
+    `samples_file`, with extension `.state`.  A stored slice is used only
+    if it is newer than `samples_file`.  Slices are written atomically, so
+    tasks running in parallel may share the cache.
+
+    :param samples_file: the thinned posterior samples artefact
+    :param samples: the contents of `samples_file`
+    :param stoichiometry: a `[X, S]` stoichiometry matrix
+    """
+
+    def __init__(self, samples_file, samples, stoichiometry):
+        self.samples_file = samples_file
+        self.cache_dir = os.path.splitext(samples_file)[0] + ".state"
+        self._samples = samples
+        self._stoichiometry = stoichiometry
+
+    def _slice_file(self, t):
+        return os.path.join(self.cache_dir, f"t{t}.npy")
+
+    def _is_current(self, filename):
+        return os.path.exists(filename) and os.path.getmtime(
+            filename
+        ) >= os.path.getmtime(self.samples_file)
+
+    def state_at(self, times):
+        """Returns the state at `times`, as `compute_state`.
+
+        :param times: an integer, or list of integers, in `[-T, T]`
+        :returns: a `[B, M, len(times), S]` array of states if `times` is a
+                  list, or a `[B, M, S]` array if `times` is an integer.
+        """
+        num_times = self._samples["seir"].shape[-2]
+        scalar = np.ndim(times) == 0
+        times = [
+            int(t) for t in _normalise_times(np.atleast_1d(times), num_times)
+        ]
+
+        missing = [
+            t for t in times if not self._is_current(self._slice_file(t))
+        ]
+        if len(missing) > 0:
+            state = compute_state(
+                self._samples["init_state"],
+                self._samples["seir"],
+                self._stoichiometry,
+                times=missing,
+            ).numpy()
+            os.makedirs(self.cache_dir, exist_ok=True)
+            for i, t in enumerate(missing):
+                tmp_file = f"{self._slice_file(t)}.{os.getpid()}.tmp"
+                with open(tmp_file, "wb") as f:
+                    np.save(f, state[..., i, :])
+                os.replace(tmp_file, self._slice_file(t))
+
+        state = np.stack([np.load(self._slice_file(t)) for t in times], axis=-2)
+        if scalar:
+            state = state[..., 0, :]
+        return state
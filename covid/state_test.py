@@ -0,0 +1,61 @@
+"""Tests epidemic state reconstruction"""
+
+import os
+import pickle as pkl
+
+import numpy as np
+
+from covid.state import compute_state, StateCache
+
+STOICHIOMETRY = np.array(
+    [[-1, 1, 0, 0], [0, -1, 1, 0], [0, 0, -1, 1]], dtype=np.float64
+)
+
+
+def _reference_state(init_state, events):
+    increments = np.einsum("...mtx,xs->...mts", events, STOICHIOMETRY)
+    cum = np.cumsum(increments, axis=-2) - increments
+    return init_state[..., np.newaxis, :] + cum
+
+
+def _samples():
+    rng = np.random.default_rng(0)
+    return dict(
+        init_state=rng.uniform(100, 200, size=[3, 4]),
+        seir=rng.poisson(2.0, size=[5, 3, 7, 3]).astype(np.float64),
+    )
+
+
+def test_compute_state_times():
+    samples = _samples()
+    expected = _reference_state(samples["init_state"], samples["seir"])
+
+    state = compute_state(samples["init_state"], samples["seir"], STOICHIOMETRY)
+    np.testing.assert_allclose(state, expected)
+
+    state = compute_state(
+        samples["init_state"], samples["seir"], STOICHIOMETRY, times=[0, 3, -1]
+    )
+    np.testing.assert_allclose(state, expected[..., [0, 3, 6], :])
+
+    state = compute_state(
+        samples["init_state"], samples["seir"], STOICHIOMETRY, times=-1
+    )
+    np.testing.assert_allclose(state, expected[..., -1, :])
+
+
+def test_state_cache(tmp_path):
+    samples = _samples()
+    samples_file = os.path.join(tmp_path, "thin_samples.pkl")
+    with open(samples_file, "wb") as f:
+        pkl.dump(samples, f)
+    expected = _reference_state(samples["init_state"], samples["seir"])
+
+    cache = StateCache(samples_file, samples, STOICHIOMETRY)
+    np.testing.assert_allclose(cache.state_at(-1), expected[..., -1, :])
+    assert os.path.exists(os.path.join(cache.cache_dir, "t6.npy"))
+
+    # A new cache on the same file reads the stored slice
+    samples["seir"] = np.zeros_like(samples["seir"])
+    cache = StateCache(samples_file, samples, STOICHIOMETRY)
+    np.testing.assert_allclose(cache.state_at([6]), expected[..., [6], :])
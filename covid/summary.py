@@ -2,10 +2,12 @@
 
 import numpy as np
 import tensorflow as tf
-import tensorflow_probability as tfp
 
 from gemlib.util import compute_state
 
+from covid.eigen import dominant_eigenvalue
+from covid.quantiles import quantiles
+
 
 def mean_and_ci(arr, q=(0.025, 0.975), axis=0, name=None):
 
@@ -16,7 +18,7 @@ def mean_and_ci(arr, q=(0.025, 0.975), axis=0, name=None):
 
     q = np.array(q)
     mean = tf.reduce_mean(arr, axis=axis)
-    ci = tfp.stats.percentile(arr, q=q * 100.0, axis=axis)
+    ci = quantiles(arr, q, axis=axis, interpolation="nearest")
 
     results = dict()
     results[name + "mean"] = mean
@@ -26,17 +28,18 @@ def mean_and_ci(arr, q=(0.025, 0.975), axis=0, name=None):
 
 
 def power_iteration(A, tol=1e-3):
-    b_k = tf.random.normal([A.shape[1], 1], dtype=A.dtype)
-    epsilon = tf.constant(1.0, dtype=A.dtype)
-    i = 0
-    while tf.greater(epsilon, tol):
-        b_k1 = tf.matmul(A, b_k)
-        b_k1_norm = tf.linalg.norm(b_k1)
-        b_k_new = b_k1 / b_k1_norm
-        epsilon = tf.reduce_sum(tf.pow(b_k_new - b_k, 2))
-        b_k = b_k_new
-        i += 1
-    return b_k, i
+    """Batched power iteration, see `covid.eigen.dominant_eigenvalue`
+
+    :param A: a `[B, M, M]` batch of matrices
+    :param tol: the relative residual at which a matrix has converged
+    :returns: a tuple of the `[B, M, 1]` dominant eigenvectors and the
+              number of iterations taken by the slowest matrix
+    """
+    result = dominant_eigenvalue(A, method="power", tol=tol)
+    return (
+        result.eigenvector[..., tf.newaxis],
+        int(tf.reduce_max(result.num_iterations)),
+    )
 
 
 def rayleigh_quotient(A, b):
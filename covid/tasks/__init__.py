@@ -2,29 +2,40 @@
 
 from covid.tasks.assemble_data import assemble_data
 from covid.tasks.inference import mcmc
+from covid.tasks.mcmc_chains import mcmc_chains, mcmc_process
 from covid.tasks.thin_posterior import thin_posterior
 from covid.tasks.next_generation_matrix import next_generation_matrix
 from covid.tasks.overall_rt import overall_rt
-from covid.tasks.predict import predict
+from covid.tasks.predict import (
+    predict,
+    predict_scenarios,
+    predict_counterfactuals,
+)
 import covid.tasks.summarize as summarize
 from covid.tasks.within_between import within_between
 from covid.tasks.case_exceedance import case_exceedance
 from covid.tasks.summary_geopackage import summary_geopackage
 from covid.tasks.insample_predictive_timeseries import insample_predictive_timeseries
 from covid.tasks.summary_longformat import summary_longformat
+from covid.tasks.validate_precision import validate_precision
 
 
 __all__ = [
     "assemble_data",
     "mcmc",
+    "mcmc_chains",
+    "mcmc_process",
     "thin_posterior",
     "next_generation_matrix",
     "overall_rt",
     "predict",
+    "predict_scenarios",
+    "predict_counterfactuals",
     "summarize",
     "within_between",
     "case_exceedance",
     "summary_geopackage",
     "insample_predictive_timeseries",
     "summary_longformat",
+    "validate_precision",
 ]
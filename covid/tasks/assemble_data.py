@@ -2,16 +2,14 @@
    to instantiate the COVID19 model"""
 
 
-import pickle as pkl
-
 from covid.model_spec import gather_data
+from covid.covariate_store import save_covariates
 
 
 def assemble_data(output_file, config):
 
     all_data = gather_data(config)
-    with open(output_file, "wb") as f:
-        pkl.dump(all_data, f)
+    save_covariates(output_file, all_data)
 
 
 if __name__ == "__main__":
@@ -19,9 +17,11 @@ if __name__ == "__main__":
     from argparse import ArgumentParser
     import yaml
 
-    parser = ArgumentParser(description="Bundle data into a pickled dictionary")
+    parser = ArgumentParser(
+        description="Bundle data into an artefact directory"
+    )
     parser.add_argument("config_file", help="Global config file")
-    parser.add_argument("output_file", help="Data bundle pkl file")
+    parser.add_argument("output_file", help="Data bundle artefact directory")
     args = parser.parse_args()
 
     with open(args.config_file, "r") as f:
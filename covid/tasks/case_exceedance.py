@@ -1,27 +1,33 @@
 """Calculates case exceedance probabilities"""
 
 import numpy as np
-import pickle as pkl
 import pandas as pd
 
+from covid.horizons import horizon_sums
+from covid.prediction_store import map_prediction
+from covid.covariate_store import open_covariates
+
 
 def case_exceedance(input_files, lag):
     """Calculates case exceedance probabilities,
        i.e. Pr(pred[lag:] < observed[lag:])
 
-    :param input_files: [data pickle, prediction pickle]
+    :param input_files: [data artefact, prediction store or pickle]
     :param lag: the lag for which to calculate the exceedance
     """
     data_file, prediction_file = input_files
 
-    with open(data_file, "rb") as f:
-        data = pkl.load(f)
-
-    with open(prediction_file, "rb") as f:
-        prediction = pkl.load(f)
+    data = open_covariates(data_file)
 
-    modelled_cases = np.sum(prediction[..., :lag, -1], axis=-1)
-    observed_cases = np.sum(data["cases"][:, -lag:], axis=-1)
+    modelled_cases = map_prediction(
+        lambda x: horizon_sums(x[..., -1], {lag: (0, lag)}).isel(
+            horizon=0, drop=True
+        ),
+        prediction_file,
+    )
+    observed_cases = horizon_sums(
+        data["cases"], {lag: (-lag, None)}, dim=data["cases"].dims[-1]
+    ).isel(horizon=0, drop=True)
     if observed_cases.dims[0] == "lad19cd":
         observed_cases = observed_cases.rename({"lad19cd": "location"})
     exceedance = np.mean(modelled_cases < observed_cases, axis=0)
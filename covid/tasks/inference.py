@@ -1,8 +1,8 @@
 """MCMC Test Rig for COVID-19 UK model"""
 # pylint: disable=E402
 
+import warnings
 import h5py
-import pickle as pkl
 from time import perf_counter
 import tqdm
 import yaml
@@ -16,31 +16,150 @@ from gemlib.mcmc import UncalibratedOccultUpdate, TransitionTopology
 from gemlib.mcmc import GibbsKernel
 from gemlib.mcmc import MultiScanKernel
 from gemlib.mcmc import AdaptiveRandomWalkMetropolis
-from gemlib.mcmc import Posterior
 
 import covid.model_spec as model_spec
+from covid.config import mcmc_output_options, precision_dtype
+from covid.posterior_writer import AsyncPosteriorWriter
+from covid.checkpoint import PosteriorAppender, burst_seed, read_checkpoint
+from covid.posterior_layout import create_posterior
+from covid.chain_batch_kernel import ChainBatchKernel
+from covid.incremental_kernel import IncrementalLogProbKernel
+from covid.xla_cache import xla_cache_key, xla_cache_directory
+from covid.telemetry import TelemetryLog, peak_rss_mb
+from covid.tasks.thin_posterior import InlineThinner
+from covid.covariate_store import open_covariates
 
 tfd = tfp.distributions
 tfb = tfp.bijectors
 DTYPE = model_spec.DTYPE
-
-
-def mcmc(data_file, output_file, config, use_autograph=False, use_xla=True):
-    """Constructs and runs the MCMC"""
+OCCULT_WINDOW = 21  # Occults are added/deleted in the last 21 days
+TRACE_LEVELS = ("full", "acceptance", "none")
+KERNEL_NAMES = [
+    "block0",
+    "block1",
+    "move/S->E",
+    "move/E->I",
+    "occult/S->E",
+    "occult/E->I",
+]
+
+
+def _overdispersed_initial_state(state, num_chains, scale, seed):
+    """Returns an initial state for each of `num_chains` chains, whose
+    parameter blocks are jittered by independent normal noise.
+
+    The noise has standard deviation `scale` on the scale on which the
+    sampler proposes, i.e. the log of the positive `beta2` and `sigma`,
+    so that chains start apart and between-chain diagnostics such as
+    R-hat are not optimistic.  All chains share the initial events.
+
+    :param state: the `[block0, block1, events]` initial state
+    :param num_chains: the number of chains, or `1` for an unbatched state
+    :param scale: the standard deviation of the noise
+    :param seed: a stateless seed
+    :returns: a `[block0, block1, events]` state, batched if `num_chains`
+              is greater than `1`
+    """
+    block0, block1, events = state
+    seed0, seed1 = tfp.random.split_seed(seed, n=2)
+    noise0, noise1 = [
+        scale
+        * tf.random.stateless_normal(
+            [num_chains] + list(block.shape), seed=s, dtype=DTYPE
+        ).numpy()
+        for block, s in [(block0, seed0), (block1, seed1)]
+    ]
+    # beta2 and sigma, as for the block0 kernel's bijector
+    log_scale = np.array([True, False, False, True])
+    block0 = np.where(log_scale, block0 * np.exp(noise0), block0 + noise0)
+    block1 = block1 + noise1
+    if num_chains == 1:
+        return [block0[0], block1[0], events]
+    return [block0, block1, np.stack([events] * num_chains)]
+
+
+def _convergence_diagnostics(posterior, names):
+    """Computes and stores the potential scale reduction (R-hat) and
+    effective sample size of multi-chain samples
+
+    :param posterior: a posterior object with samples of shape
+                      [num_samples, num_chains, ...]
+    :param names: the names of the samples to summarise
+    """
+    group = posterior["/"].file.require_group("diagnostics")
+    for name in names:
+        samples = posterior[f"samples/{name}"][:]
+        rhat = tfp.mcmc.potential_scale_reduction(
+            samples, independent_chain_ndims=1
+        ).numpy()
+        ess = tfp.mcmc.effective_sample_size(
+            samples, cross_chain_dims=1
+        ).numpy()
+        print(f"{name}: R-hat {rhat}, ESS {ess}")
+        for stat, value in [("rhat", rhat), ("ess", ess)]:
+            if f"{stat}/{name}" in group:
+                del group[f"{stat}/{name}"]
+            group.create_dataset(f"{stat}/{name}", data=value)
+
+
+def mcmc_xla_cache_key(data_file, config):
+    """Returns the XLA cache key of the sampler `mcmc` compiles for
+    `data_file` and `config`, without running any TensorFlow operation
+
+    :param data_file: the data artefact
+    :param config: the `Mcmc` configuration dictionary
+    :returns: a key, see `covid.xla_cache.xla_cache_key`
+    """
+    # The sampled events span the case data, [M, T]
+    num_meta, num_steps = open_covariates(data_file)["cases"].shape[:2]
+    return xla_cache_key(model_spec.VERSION, num_meta, num_steps, config)
+
+
+def mcmc(
+    data_file,
+    output_file,
+    config,
+    use_autograph=False,
+    use_xla=True,
+    resume=False,
+    thin_config=None,
+    thin_output_file=None,
+):
+    """Constructs and runs the MCMC
+
+    :param data_file: the data artefact
+    :param output_file: the posterior HDF5 file
+    :param config: the `Mcmc` configuration dictionary
+    :param use_autograph: use autograph when tracing the sampler
+    :param use_xla: XLA-compile the sampler
+    :param resume: if `True`, continue the chain from the checkpoint
+                   stored in `output_file` (see `Mcmc.checkpoint`).
+    :param thin_config: optionally, a `ThinPosterior` configuration
+                        dictionary.  If given with `thin_output_file`,
+                        the selected samples are written to
+                        `thin_output_file` as the MCMC runs, as by
+                        `covid.tasks.thin_posterior`.
+    :param thin_output_file: the thinned samples artefact
+    """
 
     if tf.test.gpu_device_name():
         print("Using GPU")
     else:
         print("Using CPU")
 
-    with open(data_file, "rb") as f:
-        data = pkl.load(f)
+    data = open_covariates(data_file)
 
     # We load in cases and impute missing infections first, since this sets the
     # time epoch which we are analysing.
     # Impute censored events, return cases
     print("Data shape:", data["cases"].shape)
-    events = model_spec.impute_censored_events(data["cases"].astype(DTYPE))
+    # The imputation is seeded from the chain's seed, such that a resumed
+    #   chain reconstructs the same initial state.  Burst index -1 is
+    #   reserved for it.
+    events = model_spec.impute_censored_events(
+        data["cases"].astype(DTYPE),
+        seed=burst_seed(int(config.get("seed", 2)), -1),
+    )
 
     # Initial conditions are calculated by calculating the state
     # at the beginning of the inference period
@@ -60,18 +179,38 @@ def mcmc(data_file, output_file, config, use_autograph=False, use_xla=True):
     initial_state = state[:, start_time, :]
     events = events[:, start_time:, :]
 
+    # Compiled samplers are reused across runs with the same model
+    #   version, geography, time window, and sampler configuration.  The
+    #   cache must be enabled before TensorFlow is initialised, so it is
+    #   set up by the launcher, `covid.tasks.mcmc_chains.mcmc_process`.
+    if use_xla and config.get("xla_cache_dir") is not None:
+        if xla_cache_directory() is None:
+            warnings.warn(
+                "Mcmc.xla_cache_dir is set, but the XLA cache is not enabled "
+                "in this process.  Run via "
+                "covid.tasks.mcmc_chains.mcmc_process to use the cache."
+            )
+        else:
+            print("XLA cache:", xla_cache_directory())
+
     ########################################################
     # Construct the MCMC kernels #
     ########################################################
+    # The state transition model may be computed at reduced precision,
+    #   whilst log probabilities are accumulated and the MCMC state held
+    #   in DTYPE.
+    compute_dtype = precision_dtype(config.get("precision"))
+    covariates = model_spec.covariate_bundle(data, dtype=compute_dtype)
     model = model_spec.CovidUK(
-        covariates=data,
+        covariates=covariates,
         initial_state=initial_state,
         initial_step=0,
         num_steps=events.shape[1],
     )
 
     def joint_log_prob(block0, block1, events):
-        return model.log_prob(
+        return model_spec.mixed_precision_log_prob(
+            model,
             dict(
                 beta2=block0[0],
                 gamma0=block0[1],
@@ -80,7 +219,8 @@ def mcmc(data_file, output_file, config, use_autograph=False, use_xla=True):
                 beta1=block1[0],
                 xi=block1[1:],
                 seir=events,
-            )
+            ),
+            compute_dtype,
         )
 
     # Build Metropolis within Gibbs sampler
@@ -119,13 +259,48 @@ def mcmc(data_file, output_file, config, use_autograph=False, use_xla=True):
 
         return fn
 
+    def make_delta_log_prob_fn(global_state, window_size):
+        """Returns the change in `joint_log_prob` for an events proposal,
+        given the parameter blocks in `global_state`"""
+        if not config.get("incremental_log_prob", False):
+            return None
+
+        block0, block1, _ = global_state
+        params = dict(
+            beta2=block0[0], gamma0=block0[1], gamma1=block0[2], xi=block1[1:]
+        )
+
+        def fn(current_events, proposed_events):
+            return model_spec.seir_delta_log_prob(
+                covariates,
+                initial_state,
+                0,
+                params,
+                current_events,
+                proposed_events,
+                window_size,
+            )
+
+        return fn
+
+    def make_event_update(make_kernel, target_log_prob_fn, delta_log_prob_fn):
+        if delta_log_prob_fn is None:
+            return make_kernel(target_log_prob_fn)
+        return IncrementalLogProbKernel(
+            make_kernel, target_log_prob_fn, delta_log_prob_fn
+        )
+
     def make_partially_observed_step(
-        target_event_id, prev_event_id=None, next_event_id=None, name=None
+        target_event_id,
+        prev_event_id=None,
+        next_event_id=None,
+        name=None,
+        delta_log_prob_fn=None,
     ):
         def fn(target_log_prob_fn, _):
-            return tfp.mcmc.MetropolisHastings(
-                inner_kernel=UncalibratedEventTimesUpdate(
-                    target_log_prob_fn=target_log_prob_fn,
+            def make_kernel(log_prob_fn):
+                return UncalibratedEventTimesUpdate(
+                    target_log_prob_fn=log_prob_fn,
                     target_event_id=target_event_id,
                     prev_event_id=prev_event_id,
                     next_event_id=next_event_id,
@@ -133,40 +308,78 @@ def mcmc(data_file, output_file, config, use_autograph=False, use_xla=True):
                     dmax=config["dmax"],
                     mmax=config["m"],
                     nmax=config["nmax"],
+                )
+
+            return tfp.mcmc.MetropolisHastings(
+                inner_kernel=make_event_update(
+                    make_kernel, target_log_prob_fn, delta_log_prob_fn
                 ),
                 name=name,
             )
 
         return fn
 
-    def make_occults_step(prev_event_id, target_event_id, next_event_id, name):
+    def make_occults_step(
+        prev_event_id,
+        target_event_id,
+        next_event_id,
+        name,
+        delta_log_prob_fn=None,
+    ):
         def fn(target_log_prob_fn, _):
-            return tfp.mcmc.MetropolisHastings(
-                inner_kernel=UncalibratedOccultUpdate(
-                    target_log_prob_fn=target_log_prob_fn,
+            def make_kernel(log_prob_fn):
+                return UncalibratedOccultUpdate(
+                    target_log_prob_fn=log_prob_fn,
                     topology=TransitionTopology(
                         prev_event_id, target_event_id, next_event_id
                     ),
                     cumulative_event_offset=initial_state,
                     nmax=config["occult_nmax"],
-                    t_range=(events.shape[1] - 21, events.shape[1]),
+                    t_range=(
+                        events.shape[1] - OCCULT_WINDOW,
+                        events.shape[1],
+                    ),
                     name=name,
+                )
+
+            return tfp.mcmc.MetropolisHastings(
+                inner_kernel=make_event_update(
+                    make_kernel, target_log_prob_fn, delta_log_prob_fn
                 ),
                 name=name,
             )
 
         return fn
 
-    def make_event_multiscan_kernel(target_log_prob_fn, _):
+    def make_event_multiscan_kernel(target_log_prob_fn, global_state):
+        # Event moves change at most `dmax + 1` consecutive time steps, and
+        #   occults only the last `OCCULT_WINDOW`.
+        move_delta = make_delta_log_prob_fn(global_state, config["dmax"] + 1)
+        occult_delta = make_delta_log_prob_fn(global_state, OCCULT_WINDOW)
         return MultiScanKernel(
             config["num_event_time_updates"],
             GibbsKernel(
                 target_log_prob_fn=target_log_prob_fn,
                 kernel_list=[
-                    (0, make_partially_observed_step(0, None, 1, "se_events")),
-                    (0, make_partially_observed_step(1, 0, 2, "ei_events")),
-                    (0, make_occults_step(None, 0, 1, "se_occults")),
-                    (0, make_occults_step(0, 1, 2, "ei_occults")),
+                    (
+                        0,
+                        make_partially_observed_step(
+                            0, None, 1, "se_events", move_delta
+                        ),
+                    ),
+                    (
+                        0,
+                        make_partially_observed_step(
+                            1, 0, 2, "ei_events", move_delta
+                        ),
+                    ),
+                    (
+                        0,
+                        make_occults_step(
+                            None, 0, 1, "se_occults", occult_delta
+                        ),
+                    ),
+                    (0, make_occults_step(0, 1, 2, "ei_occults", occult_delta)),
                 ],
                 name="gibbs1",
             ),
@@ -211,34 +424,112 @@ def mcmc(data_file, output_file, config, use_autograph=False, use_xla=True):
 
         return results_dict
 
+    # Only the traced results selected by `trace_level` are returned from
+    #   the device.  Per-burst summaries are always reduced on the device.
+    trace_level = config.get("trace_level", "full")
+    if trace_level not in TRACE_LEVELS:
+        raise ValueError(
+            f"Unknown trace_level '{trace_level}', expected one of "
+            f"{TRACE_LEVELS}"
+        )
+
+    def select_trace(results):
+        if trace_level == "full":
+            return results
+        if trace_level == "acceptance":
+            return {
+                k: {"is_accepted": v["is_accepted"]} for k, v in results.items()
+            }
+        return {}
+
+    def summarise_trace(results):
+        """Reduces traced results to burst means over samples and chains"""
+        # `proposed_delta` stacks [m, t, delta_t, x_star] after the sample
+        #   and chain dimensions
+        delta_axis = 2 if num_chains > 1 else 1
+
+        def mean(x):
+            return tf.reduce_mean(tf.cast(x, DTYPE))
+
+        summary = {
+            "acceptance": {
+                k: mean(v["is_accepted"]) for k, v in results.items()
+            },
+            "mean_abs_delta_t": {},
+            "mean_x_star": {},
+        }
+        for k, v in results.items():
+            if "proposed_delta" in v:
+                delta = tf.cast(v["proposed_delta"], DTYPE)
+                summary["mean_abs_delta_t"][k] = mean(
+                    tf.abs(tf.gather(delta, 2, axis=delta_axis))
+                )
+                summary["mean_x_star"][k] = mean(
+                    tf.gather(delta, 3, axis=delta_axis)
+                )
+        return summary
+
+    # Multiple chains are run as a leading batch dimension of the state
+    #   and kernel results.  Traced samples and results then have shape
+    #   [num_samples, num_chains, ...].
+    num_chains = int(config.get("num_chains", 1))
+
+    def make_gibbs_kernel(init_state):
+        if num_chains > 1:
+            init_state = [s[0] for s in init_state]
+
+        kernel = GibbsKernel(
+            target_log_prob_fn=joint_log_prob,
+            kernel_list=[
+                (0, make_blk0_kernel(init_state[0].shape, "block0")),
+                (1, make_blk1_kernel(init_state[1].shape, "block1")),
+                (2, make_event_multiscan_kernel),
+            ],
+            name="gibbs0",
+        )
+        if num_chains > 1:
+            return ChainBatchKernel(kernel, num_chains, name="chains")
+        return kernel
+
     # Build MCMC algorithm here.  This will be run in bursts for memory economy
     @tf.function(autograph=use_autograph, experimental_compile=use_xla)
-    def sample(n_samples, init_state, thin=0, previous_results=None):
+    def sample(n_samples, init_state, previous_results, seed, thin=0):
         with tf.name_scope("main_mcmc_sample_loop"):
 
             init_state = init_state.copy()
 
-            gibbs_schema = GibbsKernel(
-                target_log_prob_fn=joint_log_prob,
-                kernel_list=[
-                    (0, make_blk0_kernel(init_state[0].shape, "block0")),
-                    (1, make_blk1_kernel(init_state[1].shape, "block1")),
-                    (2, make_event_multiscan_kernel),
-                ],
-                name="gibbs0",
-            )
-
             samples, results, final_results = tfp.mcmc.sample_chain(
                 n_samples,
                 init_state,
-                kernel=gibbs_schema,
+                kernel=make_gibbs_kernel(init_state),
                 num_steps_between_results=thin,
                 previous_kernel_results=previous_results,
                 return_final_kernel_results=True,
                 trace_fn=trace_results_fn,
+                seed=seed,
             )
 
-            return samples, results, final_results
+            return (
+                samples,
+                select_trace(results),
+                summarise_trace(results),
+                final_results,
+            )
+
+    def posterior_samples(samples):
+        """Names the parts of a burst of Gibbs state samples"""
+        return {
+            "beta2": samples[0][..., 0],
+            "gamma0": samples[0][..., 1],
+            "gamma1": samples[0][..., 2],
+            "sigma": samples[0][..., 3],
+            "beta3": tf.zeros(
+                tuple(samples[0].shape[:-1]) + (5,), dtype=DTYPE
+            ),  # samples[0][..., 4:],
+            "beta1": samples[1][..., 0],
+            "xi": samples[1][..., 1:],
+            "events": samples[2],
+        }
 
     ###############################
     # Construct bursted MCMC loop #
@@ -246,9 +537,13 @@ def mcmc(data_file, output_file, config, use_autograph=False, use_xla=True):
     NUM_BURSTS = int(config["num_bursts"])
     NUM_BURST_SAMPLES = int(config["num_burst_samples"])
     NUM_SAVED_SAMPLES = NUM_BURST_SAMPLES * NUM_BURSTS
+    output_options = mcmc_output_options(config, output_file)
 
-    # RNG stuff
+    # RNG stuff.  Each burst draws from a stateless seed derived from
+    #   `seed` and the burst index, so a resumed chain continues the
+    #   same random number stream.
     tf.random.set_seed(2)
+    seed = int(config.get("seed", 2))
 
     current_state = [
         np.array(
@@ -261,96 +556,177 @@ def mcmc(data_file, output_file, config, use_autograph=False, use_xla=True):
         events,
     ]
     print("Initial logpi:", joint_log_prob(*current_state))
+    # Chains of a multi-chain run, whether batched or in separate
+    #   processes, start from overdispersed parameters.  Burst index -2 is
+    #   reserved for the dispersion.
+    if num_chains * int(config.get("num_chain_processes", 1)) > 1:
+        current_state = _overdispersed_initial_state(
+            current_state,
+            num_chains,
+            float(config.get("initial_dispersion", 0.1)),
+            burst_seed(seed, -2),
+        )
 
-    # Output file
-    samples, results, _ = sample(1, current_state)
-    posterior = Posterior(
-        output_file,
-        sample_dict={
-            "beta2": (samples[0][:, 0], (NUM_BURST_SAMPLES,)),
-            "gamma0": (samples[0][:, 1], (NUM_BURST_SAMPLES,)),
-            "gamma1": (samples[0][:, 2], (NUM_BURST_SAMPLES,)),
-            "sigma": (samples[0][:, 3], (NUM_BURST_SAMPLES,)),
-            "beta3": (
-                tf.zeros([1, 5], dtype=DTYPE),
-                (NUM_BURST_SAMPLES, 2),
-            ),  # (samples[0][:, 4:], (NUM_BURST_SAMPLES, 2)),
-            "beta1": (samples[1][:, 0], (NUM_BURST_SAMPLES,)),
-            "xi": (
-                samples[1][:, 1:],
-                (NUM_BURST_SAMPLES, samples[1].shape[1] - 1),
-            ),
-            "events": (samples[2], (NUM_BURST_SAMPLES, 32, 32, 1)),
-        },
-        results_dict=results,
-        num_samples=NUM_SAVED_SAMPLES,
-    )
-    posterior._file.create_dataset("initial_state", data=initial_state)
-    posterior._file.create_dataset(
-        "date_range",
-        data=np.array(data["date_range"]).astype(h5py.string_dtype()),
+    # Bootstrapping kernel results up front presents the same signature to
+    #   `sample` for every burst, so the burst is traced and compiled once.
+    final_results = make_gibbs_kernel(current_state).bootstrap_results(
+        current_state
     )
+
+    if resume:
+        posterior = PosteriorAppender(output_file)
+        current_state, final_results, seed, last_burst = read_checkpoint(
+            posterior["/"].file, current_state, final_results
+        )
+        first_burst = last_burst + 1
+        print(f"Resuming from burst {first_burst} of {NUM_BURSTS}")
+    else:
+        # Tracing `sample` with the arguments of a burst sizes the posterior
+        #   store, and the trace is reused by the first burst.
+        samples, results, _, _ = tf.nest.map_structure(
+            lambda t: np.zeros(t.shape, t.dtype.as_numpy_dtype),
+            sample.get_concrete_function(
+                NUM_BURST_SAMPLES,
+                init_state=current_state,
+                thin=config["thin"] - 1,
+                previous_results=final_results,
+                seed=burst_seed(seed, 0),
+            ).structured_outputs,
+        )
+        # Chunks are laid out for reads with the `ThinPosterior` stride
+        posterior = create_posterior(
+            output_file,
+            sample_dict=posterior_samples(samples),
+            results_dict=results,
+            num_samples=NUM_SAVED_SAMPLES,
+            burst_length=NUM_BURST_SAMPLES,
+            read_stride=output_options["read_stride"],
+            compression=output_options["compression"],
+        )
+        posterior["/"].attrs["num_chains"] = num_chains
+        posterior["/"].attrs["precision"] = np.dtype(compute_dtype).name
+        posterior["/"].create_dataset("initial_state", data=initial_state)
+        posterior["/"].create_dataset(
+            "date_range",
+            data=np.array(data["date_range"]).astype(h5py.string_dtype()),
+        )
+        first_burst = 0
+
     # We loop over successive calls to sample because we have to dump results
-    #   to disc, or else end OOM (even on a 32GB system).
+    #   to disc, or else end OOM (even on a 32GB system).  Bursts are written
+    #   on a background thread whilst the next burst is sampled.
     # with tf.profiler.experimental.Profile("/tmp/tf_logdir"):
-    final_results = None
+    writer = AsyncPosteriorWriter(
+        posterior, max_queued=output_options["write_queue_size"]
+    )
+
+    # Per-burst telemetry.  Scheduled log probability evaluations follow
+    #   from the kernel schedule: one full evaluation per block0 and block1
+    #   proposal, and per event proposal either one full evaluation or,
+    #   with `incremental_log_prob`, two windowed evaluations.  They are
+    #   not measured, e.g. windowed evaluations that fall back to the full
+    #   log probability are still counted as windowed.
+    telemetry = TelemetryLog(
+        output_options["telemetry_file"],
+        h5group=posterior["/"].file.require_group("telemetry"),
+        num_bursts=NUM_BURSTS,
+    )
+    burst_iterations = NUM_BURST_SAMPLES * config["thin"] * num_chains
+    event_proposals = burst_iterations * 4 * config["num_event_time_updates"]
+    if config.get("incremental_log_prob", False):
+        scheduled_log_prob_evals = dict(
+            full=2 * burst_iterations, window=2 * event_proposals
+        )
+    else:
+        scheduled_log_prob_evals = dict(
+            full=2 * burst_iterations + event_proposals, window=0
+        )
+
+    thinner = None
+    if thin_config is not None and thin_output_file is not None:
+        thinner = InlineThinner(
+            thin_output_file, thin_config, NUM_SAVED_SAMPLES, resume=resume
+        )
+
     for i in tqdm.tqdm(
-        range(NUM_BURSTS), unit_scale=NUM_BURST_SAMPLES * config["thin"]
+        range(first_burst, NUM_BURSTS),
+        unit_scale=NUM_BURST_SAMPLES * config["thin"],
     ):
-        samples, results, final_results = sample(
+        start = perf_counter()
+        samples, results, summary, final_results = sample(
             NUM_BURST_SAMPLES,
             init_state=current_state,
             thin=config["thin"] - 1,
             previous_results=final_results,
+            seed=burst_seed(seed, i),
         )
+        sample_time = perf_counter() - start
         current_state = [s[-1] for s in samples]
         print(current_state[0].numpy(), flush=True)
 
-        start = perf_counter()
-        posterior.write_samples(
-            {
-                "beta2": samples[0][:, 0],
-                "gamma0": samples[0][:, 1],
-                "gamma1": samples[0][:, 2],
-                "sigma": samples[0][:, 3],
-                "beta3": tf.zeros(
-                    [samples[0].shape[0], 5], dtype=DTYPE
-                ),  # samples[0][:, 4:],
-                "beta1": samples[1][:, 0],
-                "xi": samples[1][:, 1:],
-                "events": samples[2],
-            },
-            first_dim_offset=i * NUM_BURST_SAMPLES,
+        burst_record = dict(
+            sample_time=sample_time,
+            samples_per_second=burst_iterations / sample_time,
+            scheduled_log_prob_evals=scheduled_log_prob_evals,
+            **tf.nest.map_structure(float, summary),
         )
-        posterior.write_results(results, first_dim_offset=i * NUM_BURST_SAMPLES)
-        end = perf_counter()
 
-        print("Storage time:", end - start, "seconds")
-        for k, v in results.items():
-            print(
-                f"Acceptance {k}:",
-                tf.reduce_mean(tf.cast(v["is_accepted"], tf.float32)),
+        put_times = writer.put(
+            posterior_samples(samples),
+            results,
+            first_dim_offset=i * NUM_BURST_SAMPLES,
+            checkpoint=dict(
+                state=current_state,
+                kernel_results=final_results,
+                seed=seed,
+                burst=i,
+            )
+            if config.get("checkpoint", False)
+            else None,
+            on_written=lambda write_time, i=i: telemetry.record(
+                i, dict(write_time=write_time), parts=2
+            ),
+        )
+        if thinner is not None:
+            thinner.write_burst(
+                posterior_samples(samples),
+                first_dim_offset=i * NUM_BURST_SAMPLES,
+                attrs=dict(num_chains=num_chains),
+                initial_state=initial_state,
             )
 
-    print(
-        f"Acceptance theta: {posterior['results/block0/is_accepted'][:].mean()}"
-    )
-    print(f"Acceptance xi: {posterior['results/block1/is_accepted'][:].mean()}")
-    print(
-        f"Acceptance move S->E: {posterior['results/move/S->E/is_accepted'][:].mean()}"
-    )
-    print(
-        f"Acceptance move E->I: {posterior['results/move/E->I/is_accepted'][:].mean()}"
-    )
-    print(
-        f"Acceptance occult S->E: {posterior['results/occult/S->E/is_accepted'][:].mean()}"
-    )
-    print(
-        f"Acceptance occult E->I: {posterior['results/occult/E->I/is_accepted'][:].mean()}"
-    )
+        burst_record["transfer_time"] = put_times.transfer
+        burst_record["wait_time"] = put_times.wait
+        burst_record["peak_rss_mb"] = peak_rss_mb()
+        telemetry.record(i, burst_record, parts=2)
+
+        print("Storage wait time:", put_times.wait, "seconds")
+        for k, v in burst_record["acceptance"].items():
+            print(f"Acceptance {k}:", v)
+
+    writer.close()
+    telemetry.close()
+    print("Total storage time:", writer.write_time, "seconds")
+
+    if num_chains > 1:
+        _convergence_diagnostics(
+            posterior, ["beta1", "beta2", "gamma0", "gamma1", "sigma", "xi"]
+        )
 
+    telemetry_group = posterior["telemetry"]
+    for name in KERNEL_NAMES:
+        acceptance = telemetry_group[f"acceptance/{name}"][:]
+        print(f"Acceptance {name}: {np.nanmean(acceptance)}")
+
+    # The writer and telemetry hold references to the file, so close it
+    #   explicitly rather than on garbage collection.
+    posterior["/"].file.close()
     del posterior
 
+    # Written last, so the thinned samples are newer than the posterior
+    if thinner is not None:
+        thinner.finalise()
+
 
 if __name__ == "__main__":
 
@@ -364,11 +740,23 @@ if __name__ == "__main__":
         "-o", "--output", type=str, help="Output file", required=True
     )
     parser.add_argument(
-        "data_file", type=str, help="Data pickle file", required=True
+        "--resume",
+        action="store_true",
+        help="Resume from the checkpoint in the output file",
     )
+    parser.add_argument("data_file", type=str, help="Data artefact")
     args = parser.parse_args()
 
     with open(args.config, "r") as f:
         config = yaml.load(f, Loader=yaml.FullLoader)
 
-    mcmc(args.data_file, args.output, config["Mcmc"])
+    # TensorFlow is initialised by importing this module, so the MCMC is
+    #   run in a new process that can use the XLA cache.
+    if config["Mcmc"].get("xla_cache_dir") is not None:
+        from covid.tasks.mcmc_chains import mcmc_process
+
+        mcmc_process(
+            args.data_file, args.output, config["Mcmc"], resume=args.resume
+        )
+    else:
+        mcmc(args.data_file, args.output, config["Mcmc"], resume=args.resume)
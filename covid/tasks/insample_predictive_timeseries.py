@@ -1,10 +1,12 @@
 """Create insample plots for a given lag"""
 
-import pickle as pkl
 import numpy as np
 from pathlib import Path
 import matplotlib.pyplot as plt
 
+from covid.prediction_store import map_prediction
+from covid.covariate_store import open_covariates
+
 
 def plot_timeseries(prediction, data, dates, title):
     """Plots a predictive timeseries with data
@@ -47,10 +49,10 @@ def insample_predictive_timeseries(input_files, output_dir, lag):
 
     Details
     -------
-    `data_file` is a pickled Python `dict` of data.  It should have a member `cases`
+    `data_file` is a `covid.artefact` of data.  It should have a member `cases`
     which is a `xarray` with dimensions [`location`, `date`] giving the number of 
     detected cases in each `location` on each `date`.
-    `prediction_file` is assumed to be a pickled `xarray` of shape 
+    `prediction_file` is assumed to be a prediction store of shape 
     `[K,M,T,R]` where `K` is the number of posterior samples, `M` is the number
     of locations, `T` is the number of timepoints, `R` is the number of transitions
     in the model.  The prediction is assumed to start at `cases.coords['date'][-1] - lag`.
@@ -63,11 +65,11 @@ def insample_predictive_timeseries(input_files, output_dir, lag):
     prediction_file, data_file = input_files
     lag = int(lag)
     
-    with open(prediction_file, "rb") as f:
-        prediction = pkl.load(f)[..., :lag, -1] # removals
+    prediction = map_prediction(
+        lambda x: x[..., :lag, -1], prediction_file
+    )  # removals
 
-    with open(data_file, "rb") as f:
-        data = pkl.load(f)
+    data = open_covariates(data_file)
 
     cases = data['cases']
     lads = data['locations']
@@ -0,0 +1,208 @@
+"""Runs independent MCMC chains in separate processes"""
+
+import os
+import contextlib
+import multiprocessing
+import h5py
+
+from covid.xla_cache import xla_cache_enabled
+
+__all__ = ["mcmc_chains", "mcmc_process", "merge_posterior_shards"]
+
+
+def _shard_filename(output_file, chain):
+    root, ext = os.path.splitext(output_file)
+    return f"{root}.chain{chain}{ext}"
+
+
+def _xla_cache(data_file, config):
+    """Returns a context in which new processes use the XLA cache of
+    `config['xla_cache_dir']`, if set.
+
+    TensorFlow reads `TF_XLA_FLAGS` once, when it is initialised, which
+    is usually before the sampler is built, e.g. on importing
+    `covid.model_spec`.  Processes started in this context inherit the
+    flags in their environment, so read them from the start.
+    """
+    if config.get("xla_cache_dir") is None:
+        return contextlib.nullcontext()
+
+    from covid.tasks.inference import mcmc_xla_cache_key
+
+    return xla_cache_enabled(
+        config["xla_cache_dir"], mcmc_xla_cache_key(data_file, config)
+    )
+
+
+def _run_mcmc(data_file, output_file, config, kwargs):
+    """Runs `covid.tasks.inference.mcmc` in a child process"""
+    from covid.tasks.inference import mcmc
+
+    mcmc(data_file, output_file, config, **kwargs)
+    return output_file
+
+
+@contextlib.contextmanager
+def _environ(**variables):
+    """A context in which processes started by this process inherit the
+    environment `variables`.  The environment is restored on exit."""
+    previous = {name: os.environ.get(name) for name in variables}
+    os.environ.update(variables)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _run_chain(data_file, output_file, config, cpus):
+    """Runs a single chain, with all threads pinned to the set of `cpus`
+    if given"""
+    from covid.tasks.inference import mcmc
+
+    # TensorFlow is already initialised in this process: importing this
+    #   module imports `covid.tasks`, and so `covid.model_spec`.  Its
+    #   thread pools are therefore sized by the environment, see
+    #   `mcmc_chains`, and every existing thread is pinned.
+    if cpus is not None and hasattr(os, "sched_setaffinity"):
+        for thread in os.listdir("/proc/self/task"):
+            os.sched_setaffinity(int(thread), cpus)
+
+    mcmc(data_file, output_file, config)
+    return output_file
+
+
+def merge_posterior_shards(shard_files, output_file):
+    """Merges single-chain posterior files into a multi-chain view.
+
+    The `samples` and `results` datasets of `output_file` are HDF5 virtual
+    datasets of shape `[num_samples, num_chains, ...]` mapping onto the
+    shards, so no sample data is copied.  Shards are referenced relative to
+    the directory of `output_file`.
+
+    :param shard_files: a list of posterior HDF5 files, one per chain
+    :param output_file: the merged posterior HDF5 file
+    """
+    num_chains = len(shard_files)
+    merged_dir = os.path.dirname(os.path.abspath(output_file))
+    with h5py.File(shard_files[0], "r") as template, h5py.File(
+        output_file, "w", libver="latest"
+    ) as merged:
+
+        def merge_dataset(name, obj):
+            if not isinstance(obj, h5py.Dataset):
+                return
+            layout = h5py.VirtualLayout(
+                shape=(obj.shape[0], num_chains) + obj.shape[1:],
+                dtype=obj.dtype,
+            )
+            for chain, shard in enumerate(shard_files):
+                layout[:, chain, ...] = h5py.VirtualSource(
+                    os.path.relpath(shard, merged_dir),
+                    obj.name,
+                    shape=obj.shape,
+                )
+            merged.create_virtual_dataset(obj.name, layout)
+
+        for group in ["samples", "results"]:
+            template[group].visititems(merge_dataset)
+
+        for name in ["initial_state", "date_range"]:
+            template.copy(name, merged)
+        merged.attrs.update(template.attrs)
+        merged.attrs["num_chains"] = num_chains
+
+
+def mcmc_process(data_file, output_file, config, **kwargs):
+    """Runs `covid.tasks.inference.mcmc` in a new process.
+
+    If `config['xla_cache_dir']` is set, the new process uses the
+    persistent XLA cache from the start, so a re-run with the same model,
+    geography, time window, and sampler configuration loads the compiled
+    sampler rather than compiling it.
+
+    :param data_file: the data artefact
+    :param output_file: the posterior HDF5 file
+    :param config: the `Mcmc` configuration dictionary
+    :param kwargs: further arguments to `covid.tasks.inference.mcmc`
+    """
+    ctx = multiprocessing.get_context("spawn")
+    with _xla_cache(data_file, config), ctx.Pool(1) as pool:
+        pool.apply(_run_mcmc, (data_file, output_file, config, kwargs))
+
+
+def mcmc_chains(data_file, output_file, config):
+    """Runs `config['num_chain_processes']` independent chains of
+    `covid.tasks.inference.mcmc` in separate processes, and merges them.
+
+    Chain `k` is seeded with `config['seed'] + k`, pinned to
+    `config['threads_per_chain']` CPUs, and writes to its own shard
+    `<output_file root>.chain<k>.hd5`.  The shards are then merged into
+    `output_file` by `merge_posterior_shards`.
+
+    :param data_file: the data artefact
+    :param output_file: the merged posterior HDF5 file
+    :param config: the `Mcmc` configuration dictionary
+    """
+    num_chains = int(config["num_chain_processes"])
+    threads = config.get("threads_per_chain")
+    if threads is None:
+        threads = max(1, os.cpu_count() // num_chains)
+
+    args = []
+    for chain in range(num_chains):
+        chain_config = dict(config)
+        chain_config["seed"] = int(config.get("seed", 2)) + chain
+        chain_config["num_chains"] = 1
+        cpus = set(range(chain * threads, (chain + 1) * threads))
+        if max(cpus) >= os.cpu_count():
+            cpus = None  # Oversubscribed: leave placement to the OS
+        args.append(
+            (
+                data_file,
+                _shard_filename(output_file, chain),
+                chain_config,
+                cpus,
+            )
+        )
+
+    # Fork is unsafe once TensorFlow has initialised its thread pools.
+    #   TensorFlow reads its thread pool sizes from the environment when
+    #   it is initialised, which in a spawned process is on unpickling
+    #   `_run_chain`, before it can be configured in code.
+    ctx = multiprocessing.get_context("spawn")
+    thread_pools = _environ(
+        TF_NUM_INTRAOP_THREADS=str(threads), TF_NUM_INTEROP_THREADS="1"
+    )
+    with _xla_cache(data_file, config), thread_pools, ctx.Pool(
+        num_chains
+    ) as pool:
+        shard_files = pool.starmap(_run_chain, args)
+
+    merge_posterior_shards(shard_files, output_file)
+
+
+if __name__ == "__main__":
+
+    from argparse import ArgumentParser
+    import yaml
+
+    parser = ArgumentParser(
+        description="Run independent MCMC chains in separate processes"
+    )
+    parser.add_argument(
+        "-c", "--config", type=str, help="Config file", required=True
+    )
+    parser.add_argument(
+        "-o", "--output", type=str, help="Output file", required=True
+    )
+    parser.add_argument("data_file", type=str, help="Data artefact")
+    args = parser.parse_args()
+
+    with open(args.config, "r") as f:
+        config = yaml.load(f, Loader=yaml.FullLoader)
+
+    mcmc_chains(args.data_file, args.output, config["Mcmc"])
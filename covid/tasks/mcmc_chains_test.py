@@ -0,0 +1,37 @@
+"""Tests merging of per-chain posterior shards"""
+
+import h5py
+import numpy as np
+
+from covid.tasks.mcmc_chains import merge_posterior_shards
+
+
+def test_merge_posterior_shards(tmp_path):
+
+    shard_files = []
+    for chain in range(3):
+        filename = str(tmp_path / f"posterior.chain{chain}.hd5")
+        with h5py.File(filename, "w") as f:
+            f.create_dataset("samples/beta1", data=np.full([4], chain))
+            f.create_dataset("samples/xi", data=np.full([4, 2], chain))
+            f.create_dataset(
+                "results/block0/is_accepted", data=np.ones([4], bool)
+            )
+            f.create_dataset("initial_state", data=np.zeros([5, 4]))
+            f.create_dataset(
+                "date_range",
+                data=np.array(["2020-10-09", "2021-01-01"]).astype(
+                    h5py.string_dtype()
+                ),
+            )
+        shard_files.append(filename)
+
+    output_file = str(tmp_path / "posterior.hd5")
+    merge_posterior_shards(shard_files, output_file)
+
+    with h5py.File(output_file, "r") as f:
+        assert f.attrs["num_chains"] == 3
+        assert f["samples/xi"].shape == (4, 3, 2)
+        np.testing.assert_array_equal(f["samples/beta1"][1], [0, 1, 2])
+        assert f["results/block0/is_accepted"][:].all()
+        assert f["initial_state"].shape == (5, 4)
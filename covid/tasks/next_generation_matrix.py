@@ -1,32 +1,43 @@
 """Calculates and saves a next generation matrix"""
 
-import pickle as pkl
+import os
+import warnings
 import numpy as np
-import xarray
 import tensorflow as tf
 
 
 from covid import model_spec
-from gemlib.util import compute_state
+from covid.eigen import dominant_eigenvalue
+from covid.ngm_store import NGMWriter, read_eigenvector
+from covid.state import compute_state, StateCache
+from covid.artefact import open_artefact
+from covid.covariate_store import open_covariates
 
 
-def calc_posterior_ngm(samples, covar_data):
+def calc_posterior_ngm(samples, covar_data, state=None):
     """Calculates effective reproduction number for batches of metapopulations
     :param theta: a tensor of batched theta parameters [B] + theta.shape
     :param xi: a tensor of batched xi parameters [B] + xi.shape
     :param events: a [B, M, T, X] batched events tensor
     :param init_state: the initial state of the epidemic at earliest inference date
     :param covar_data: the covariate data
+    :param state: the [B, M, S] state on the final inference day, if already
+                  known
     :return a batched vector of R_it estimates
     """
-
-    def r_fn(args):
-        beta1_, beta2_, beta3_, sigma_, xi_, gamma0_, events_ = args
-        t = events_.shape[-2] - 1
+    covariates = model_spec.covariate_bundle(covar_data)
+    t = samples["seir"].shape[-2] - 1
+    if state is None:
+        # State on final inference day, computed once for all samples
         state = compute_state(
-            samples["init_state"], events_, model_spec.STOICHIOMETRY
+            samples["init_state"],
+            samples["seir"],
+            model_spec.STOICHIOMETRY,
+            times=t,
         )
-        state = tf.gather(state, t, axis=-2)  # State on final inference day
+
+    def r_fn(args):
+        beta1_, beta2_, beta3_, sigma_, xi_, gamma0_, state_ = args
 
         par = dict(
             beta1=beta1_,
@@ -36,8 +47,8 @@ def calc_posterior_ngm(samples, covar_data):
             gamma0=gamma0_,
             xi=xi_,
         )
-        ngm_fn = model_spec.next_generation_matrix_fn(covar_data, par)
-        ngm = ngm_fn(t, state)
+        ngm_fn = model_spec.next_generation_matrix_fn(covariates, par)
+        ngm = ngm_fn(t, state_)
         return ngm
 
     return tf.vectorized_map(
@@ -49,33 +60,93 @@ def calc_posterior_ngm(samples, covar_data):
             samples["sigma"],
             samples["xi"],
             samples["gamma0"],
-            samples["seir"],
+            state,
         ),
     )
 
 
-def next_generation_matrix(input_files, output_file):
-
-    with open(input_files[0], "rb") as f:
-        covar_data = pkl.load(f)
-
-    with open(input_files[1], "rb") as f:
-        samples = pkl.load(f)
-
-    # Compute ngm posterior
-    ngm = calc_posterior_ngm(samples, covar_data).numpy()
-    ngm = xarray.DataArray(
-        ngm,
-        coords=[
-            np.arange(ngm.shape[0]),
-            covar_data["locations"]["lad19cd"],
-            covar_data["locations"]["lad19cd"],
-        ],
-        dims=["iteration", "dest", "src"],
-    )
-    # Output
-    with open(output_file, "wb") as f:
-        pkl.dump(ngm, f)
+def _warm_start_vector(filename, locations):
+    """Returns the mean dominant eigenvector stored in NGM store `filename`,
+    aligned to `locations`, or `None` if there is no such store or it holds
+    no eigenvectors"""
+    if filename is None or not os.path.exists(filename):
+        return None
+    try:
+        eigenvector = read_eigenvector(filename).mean(dim="iteration")
+    except KeyError:
+        return None  # A store written before eigenvectors were stored
+    return eigenvector.reindex(
+        location=np.asarray(locations), fill_value=1.0
+    ).values
+
+
+def next_generation_matrix(
+    input_files,
+    output_file,
+    batch_size=50,
+    store_matrices=False,
+    method="arnoldi",
+    warm_start=None,
+):
+    """Computes local and national Rt from the posterior next generation
+       matrices, `batch_size` posterior samples at a time.
+
+    National Rt is computed by `covid.eigen.dominant_eigenvalue`, started
+    from the mean eigenvector of `warm_start` if given, e.g. the previous
+    day's NGM store, and thereafter from the mean eigenvector of the
+    previous batch.
+
+    :param input_files: a list of [data artefact, posterior samples artefact]
+    :param output_file: a `covid.ngm_store` HDF5 store
+    :param batch_size: the number of posterior samples processed at once
+    :param store_matrices: whether to store the full matrices, chunked by
+                           batch, as well as their reductions
+    :param method: the eigen-solver method, see `covid.eigen.METHODS`
+    :param warm_start: an optional NGM store from which to warm start the
+                       eigen-solver
+    """
+    covar_data = open_covariates(input_files[0])
+
+    samples = open_artefact(input_files[1])
+
+    covariates = model_spec.covariate_bundle(covar_data)
+    state = StateCache(
+        input_files[1], samples, model_spec.STOICHIOMETRY
+    ).state_at(-1)
+
+    num_samples = state.shape[0]
+    locations = covar_data["locations"]["lad19cd"]
+    initial_vector = _warm_start_vector(warm_start, locations)
+    with NGMWriter(
+        output_file,
+        num_samples,
+        locations,
+        batch_size,
+        store_matrices,
+    ) as writer:
+        for start in range(0, num_samples, batch_size):
+            batch = slice(start, min(start + batch_size, num_samples))
+            ngm = calc_posterior_ngm(
+                {k: v[batch] for k, v in samples.items() if k != "init_state"},
+                covariates,
+                state[batch],
+            )
+            eigen = dominant_eigenvalue(
+                ngm, method=method, initial_vector=initial_vector
+            )
+            if not np.all(eigen.converged):
+                warnings.warn(
+                    f"National Rt did not converge for samples "
+                    f"{start + np.flatnonzero(~eigen.converged.numpy())}"
+                )
+            writer.write(
+                start,
+                local_rt=tf.reduce_sum(ngm, axis=-2),
+                national_rt=eigen.eigenvalue,
+                eigenvector=eigen.eigenvector,
+                ngm=ngm,
+            )
+            initial_vector = np.mean(eigen.eigenvector, axis=0)
 
 
 if __name__ == "__main__":
@@ -87,14 +158,14 @@ if __name__ == "__main__":
         "-s",
         "--samples",
         type=str,
-        description="A pickle file with MCMC samples",
+        description="An artefact of MCMC samples",
         required=True,
     )
     parser.add_argument(
         "-d",
         "--data",
         type=str,
-        decription="A data glob pickle file",
+        decription="A data artefact",
         require=True,
     )
     parser.add_argument(
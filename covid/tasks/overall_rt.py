@@ -1,22 +1,14 @@
 """Calculates overall Rt given a posterior next generation matix"""
 
 import numpy as np
-import pickle as pkl
 import pandas as pd
 
-from covid.summary import (
-    rayleigh_quotient,
-    power_iteration,
-)
+from covid.ngm_store import read_national_rt
 
 
 def overall_rt(next_generation_matrix, output_file):
 
-    with open(next_generation_matrix, "rb") as f:
-        ngms = pkl.load(f)
-
-    b, _ = power_iteration(ngms)
-    rt = rayleigh_quotient(ngms, b)
+    rt = read_national_rt(next_generation_matrix)
     q = np.arange(0.05, 1.0, 0.05)
     rt_quantiles = pd.DataFrame(
         {"Rt": np.quantile(rt, q, axis=-1)}, index=q
@@ -30,7 +22,7 @@ if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument(
         "input_file",
-        description="The input .pkl file containing the next generation matrix",
+        description="The input NGM store",
     )
     parser.add_argument(
         "output_file", description="The name of the output .xlsx file"
@@ -1,105 +1,412 @@
 """Run predictions for COVID-19 model"""
 
+import collections
 import numpy as np
-import xarray
-import pickle as pkl
 import tensorflow as tf
+import tensorflow_probability as tfp
 
 from covid import model_spec
-from gemlib.util import compute_state
+from covid.artefact import open_artefact
+from covid.covariate_store import open_covariates
+from covid.prediction_store import PredictionWriter
+from covid.simulation import chain_binomial_simulate
+from covid.state import compute_state, StateCache
 
 
-def predicted_incidence(posterior_samples, covar_data, init_step, num_steps):
+def make_scenario_simulator(covar_data, init_steps, num_steps):
+    """Returns a function simulating several scenarios forward in time,
+       each starting at `init_steps[k]` for `num_steps[k]` steps, in one
+       batch.
+
+    The scenarios are simulated together over the union of their time
+    windows, each scenario's state being held at its initial state until
+    its initial step.  The returned function is compiled once, and may be
+    called for successive batches of posterior samples.
+
+    :param covar_data: a dictionary of model covariate data
+    :param init_steps: a list of K initial time steps
+    :param num_steps: a list of K numbers of steps to simulate
+    :returns: a function taking a dictionary of posterior samples, a list of
+              K [B, M, S] states at `init_steps`, and an optional stateless
+              seed, and returning a list of K tensors of events of shape
+              [B, M, num_steps[k], X] where X is the number of state
+              transitions
+    """
+
+    covariates = model_spec.covariate_bundle(covar_data)
+    first_step = min(init_steps)
+    last_step = max(s + n for s, n in zip(init_steps, num_steps))
+
+    # All posterior samples and scenarios are simulated together, in one
+    #   XLA-compiled loop
+    @tf.function(experimental_compile=True)
+    def sim_fn(beta2, xi, gamma0, gamma1, init_state, start_steps, seed):
+        transition_rate_fn = model_spec.make_transition_rate_fn(
+            covariates, beta2, xi, gamma0, gamma1
+        )
+        return chain_binomial_simulate(
+            transition_rate_fn,
+            model_spec.STOICHIOMETRY,
+            init_state,
+            first_step,
+            last_step - first_step,
+            time_delta=model_spec.TIME_DELTA,
+            start_steps=start_steps,
+            seed=seed,
+        )
+
+    def simulate(posterior_samples, init_states, seed=None):
+        events = sim_fn(
+            posterior_samples["beta2"],
+            posterior_samples["xi"],
+            posterior_samples["gamma0"],
+            posterior_samples["gamma1"],
+            tf.stack(
+                [tf.cast(x, covariates.W.dtype) for x in init_states]
+            ),  # [K, B, M, S]
+            tf.constant(init_steps)[:, tf.newaxis],
+            tfp.random.sanitize_seed(seed),
+        )
+        return [
+            events[k, ..., s - first_step : s - first_step + n, :]
+            for k, (s, n) in enumerate(zip(init_steps, num_steps))
+        ]
+
+    return simulate
+
+
+def predicted_incidence_scenarios(
+    posterior_samples,
+    covar_data,
+    init_steps,
+    num_steps,
+    init_states=None,
+    seed=None,
+):
+    """Runs the simulation forward in time for several scenarios in one
+       batch, see `make_scenario_simulator`.
+
+    :param posterior_samples: a dictionary of posterior samples
+    :param covar_data: a dictionary of model covariate data
+    :param init_steps: a list of K initial time steps
+    :param num_steps: a list of K numbers of steps to simulate
+    :param init_states: an optional list of K [B, M, S] states at
+                        `init_steps`, if already known
+    :param seed: an optional stateless seed
+    :returns: a list of K tuples `(init_state, events)`, where `events` is
+              a tensor of shape [B, M, num_steps[k], X] where X is the
+              number of state transitions
+    """
+    if init_states is None:
+        init_states = tf.unstack(
+            compute_state(
+                posterior_samples["init_state"],
+                posterior_samples["seir"],
+                model_spec.STOICHIOMETRY,
+                times=list(init_steps),
+            ),
+            axis=-2,
+        )
+
+    simulate = make_scenario_simulator(covar_data, init_steps, num_steps)
+    events = simulate(posterior_samples, init_states, seed)
+    return list(zip(init_states, events))
+
+
+def predicted_incidence(
+    posterior_samples,
+    covar_data,
+    init_step,
+    num_steps,
+    init_state=None,
+    seed=None,
+):
     """Runs the simulation forward in time from `init_state` at time `init_time`
        for `num_steps`.
     :param param: a dictionary of model parameters
     :covar_data: a dictionary of model covariate data
     :param init_step: the initial time step
     :param num_steps: the number of steps to simulate
+    :param init_state: the [B, M, S] state at `init_step`, if already known
+    :param seed: an optional stateless seed
     :returns: a tensor of srt_quhape [B, M, num_steps, X] where X is the number of state
               transitions
     """
+    return predicted_incidence_scenarios(
+        posterior_samples,
+        covar_data,
+        [init_step],
+        [num_steps],
+        None if init_state is None else [init_state],
+        seed,
+    )[0]
 
-    @tf.function
-    def sim_fn(args):
-        beta1_, beta2_, sigma_, xi_, gamma0_, gamma1_, init_ = args
-
-        par = dict(
-            beta1=beta1_,
-            beta2=beta2_,
-            sigma=sigma_,
-            xi=xi_,
-            gamma0=gamma0_,
-            gamma1=gamma1_,
-        )
-        model = model_spec.CovidUK(
-            covar_data,
-            initial_state=init_,
-            initial_step=init_step,
-            num_steps=num_steps,
+
+def _batch_samples(samples, batch):
+    return {k: v if k == "init_state" else v[batch] for k, v in samples.items()}
+
+
+def predict_scenarios(data, posterior_samples, scenarios, batch_size=None):
+    """Runs several predictions from the same data and posterior samples,
+       loading each once and simulating all scenarios as one batch.
+
+    Each prediction is written to a `covid.prediction_store` HDF5 store.
+    By default, all posterior samples are simulated at once.  If
+    `batch_size` is given, posterior samples are instead simulated
+    `batch_size` at a time, and appended to the stores, such that the
+    number of samples is not limited by memory.
+
+    :param data: the covariate data, see `covid.covariate_store`
+    :param posterior_samples: the posterior samples artefact
+    :param scenarios: a list of `(output_file, initial_step, num_steps)`
+                      tuples.  Negative initial steps count back from the
+                      end of the inference period.
+    :param batch_size: the number of posterior samples simulated at once,
+                       or `None` to simulate all samples at once
+    """
+    covar_data = open_covariates(data)
+    samples = open_artefact(posterior_samples)
+
+    num_times = samples["seir"].shape[-2]
+    scenarios = [
+        (output_file, step + num_times if step < 0 else step, n)
+        for output_file, step, n in scenarios
+    ]
+    output_files, initial_steps, num_steps = zip(*scenarios)
+
+    date0 = covar_data["date_range"][0]
+    locations = covar_data["locations"]["lad19cd"]
+    dates = [
+        np.arange(
+            date0 + np.timedelta64(initial_step, "D"),
+            date0 + np.timedelta64(initial_step + n, "D"),
+            np.timedelta64(1, "D"),
         )
-        sim = model.sample(**par)
-        return sim["seir"]
+        for initial_step, n in zip(initial_steps, num_steps)
+    ]
 
-    posterior_state = compute_state(
-        posterior_samples["init_state"],
-        posterior_samples["seir"],
-        model_spec.STOICHIOMETRY,
+    init_states = StateCache(
+        posterior_samples, samples, model_spec.STOICHIOMETRY
+    ).state_at(initial_steps)
+    simulate = make_scenario_simulator(covar_data, initial_steps, num_steps)
+    _write_predictions(
+        simulate,
+        samples,
+        [init_states[..., k, :] for k in range(len(scenarios))],
+        output_files,
+        locations,
+        dates,
+        batch_size,
     )
-    init_state = posterior_state[..., init_step, :]
 
-    events = tf.map_fn(
-        sim_fn,
-        elems=(
-            posterior_samples["beta1"],
-            posterior_samples["beta2"],
-            posterior_samples["sigma"],
-            posterior_samples["xi"],
-            posterior_samples["gamma0"],
-            posterior_samples["gamma1"],
-            init_state,
-        ),
-        fn_output_signature=(tf.float64),
-    )
-    return init_state, events
 
+def _write_predictions(
+    simulate,
+    samples,
+    init_states,
+    output_files,
+    locations,
+    dates,
+    batch_size=None,
+    seed=None,
+):
+    """Runs `simulate` for all, or batches of, posterior samples, and
+    writes one prediction per output file.
 
-def read_pkl(filename):
-    with open(filename, "rb") as f:
-        return pkl.load(f)
+    :param simulate: a function taking a dictionary of posterior samples, a
+                     list of [B, M, S] initial states, and a seed, and
+                     returning a list of [B, M, T, X] events, one per output
+    :param samples: a dictionary of posterior samples
+    :param init_states: a list of initial states, one per output, each of
+                        shape [num_samples, M, S] and passed to `simulate`
+                        in [B, M, S] batches
+    :param output_files: the output files
+    :param locations: the location labels
+    :param dates: a list of the dates of each output's time steps
+    :param batch_size: the number of posterior samples simulated at once,
+                       or `None` to simulate all samples at once
+    :param seed: an optional stateless seed
+    """
+    seed = tfp.random.sanitize_seed(seed)
+
+    num_samples, _, _, num_events = samples["seir"].shape
+    if batch_size is None:
+        batch_size = num_samples
+    writers = [
+        PredictionWriter(
+            output_file,
+            num_samples,
+            locations,
+            dates[k],
+            num_events,
+            init_states[k].shape[-1],
+            batch_size,
+        )
+        for k, output_file in enumerate(output_files)
+    ]
+    starts = range(0, num_samples, batch_size)
+    seeds = tfp.random.split_seed(seed, n=len(starts))
+    try:
+        for start, batch_seed in zip(starts, tf.unstack(seeds)):
+            batch = slice(start, min(start + batch_size, num_samples))
+            batch_states = [init_state[batch] for init_state in init_states]
+            predictions = simulate(
+                _batch_samples(samples, batch), batch_states, batch_seed
+            )
+            for writer, predicted_events, init_state in zip(
+                writers, predictions, batch_states
+            ):
+                writer.write(start, predicted_events, init_state)
+    finally:
+        for writer in writers:
+            writer.close()
 
 
-def predict(data, posterior_samples, output_file, initial_step, num_steps):
+def _override(value, override, broadcast=False):
+    if callable(override):
+        return override(value)
+    if broadcast:
+        return np.broadcast_to(override, np.shape(value))
+    return override
 
-    covar_data = read_pkl(data)
-    samples = read_pkl(posterior_samples)
 
-    if initial_step < 0:
-        initial_step = samples["seir"].shape[-2] + initial_step
+def predict_counterfactuals(
+    data,
+    posterior_samples,
+    counterfactuals,
+    initial_step,
+    num_steps,
+    batch_size=None,
+    seed=None,
+):
+    """Runs counterfactual predictions, e.g. for changes to commute volume
+       or transmission rate, alongside each other with common random
+       numbers.
+
+    All counterfactuals are simulated in one batch, and for each posterior
+    sample they share their random numbers, so differences between them
+    are due to the overrides rather than Monte Carlo noise.
+
+    :param data: the covariate data, see `covid.covariate_store`
+    :param posterior_samples: the posterior samples artefact
+    :param counterfactuals: a list of `(output_file, overrides)` tuples,
+                            where `overrides` is a dictionary keyed by
+                            covariate (e.g. `W`) or parameter (`beta2`,
+                            `xi`, `gamma0`, `gamma1`) name.  Values replace
+                            a covariate, are broadcast to the shape of a
+                            parameter's posterior samples, or are functions
+                            of the original value.  An empty dictionary
+                            gives the baseline prediction.
+    :param initial_step: the initial time step.  Negative initial steps
+                         count back from the end of the inference period.
+    :param num_steps: the number of steps to simulate
+    :param batch_size: the number of posterior samples simulated at once,
+                       see `predict_scenarios`
+    :param seed: an optional stateless seed
+    """
+    parameters = ["beta2", "xi", "gamma0", "gamma1"]
+    covar_data = open_covariates(data)
+    samples = open_artefact(posterior_samples)
 
-    dates = np.arange(covar_data["date_range"][0] + np.timedelta64(initial_step, "D"),
-                      covar_data["date_range"][0] + np.timedelta64(initial_step + num_steps, "D"),
-                      np.timedelta64(1, "D"))
-    del covar_data["date_range"]
+    num_times = samples["seir"].shape[-2]
+    if initial_step < 0:
+        initial_step = num_times + initial_step
+    output_files = [output_file for output_file, _ in counterfactuals]
 
-    estimated_init_state, predicted_events = predicted_incidence(
-        samples, covar_data, initial_step, num_steps
+    date0 = covar_data["date_range"][0]
+    dates = np.arange(
+        date0 + np.timedelta64(initial_step, "D"),
+        date0 + np.timedelta64(initial_step + num_steps, "D"),
+        np.timedelta64(1, "D"),
     )
 
-    prediction = xarray.DataArray(
-        predicted_events,
-        coords=[
-            np.arange(predicted_events.shape[0]),
-            covar_data["locations"]["lad19cd"],
-            dates,
-            np.arange(predicted_events.shape[3]),
-        ],
-        dims=("iteration", "location", "time", "event"),
+    covariates = []
+    for _, overrides in counterfactuals:
+        # Overridden covariates mask, rather than copy, the covariate data
+        covar_data_ = collections.ChainMap(
+            {
+                k: _override(covar_data[k], v)
+                for k, v in overrides.items()
+                if k not in parameters
+            },
+            covar_data,
+        )
+        covariates.append(model_spec.covariate_bundle(covar_data_))
+
+    # Parameters are held as extra "samples" for each counterfactual
+    scenario_samples = dict(samples)
+    for i, (_, overrides) in enumerate(counterfactuals):
+        for k in parameters:
+            scenario_samples[f"{k}_{i}"] = _override(
+                samples[k], overrides.get(k, lambda x: x), broadcast=True
+            )
+
+    @tf.function(experimental_compile=True)
+    def sim_fn(params, init_state, seed):
+        rate_fns = [
+            model_spec.make_transition_rate_fn(covariates_, *params_)
+            for covariates_, params_ in zip(covariates, params)
+        ]
+
+        def transition_rate_fn(t, state):
+            rates = [
+                fn(t, state_) for fn, state_ in zip(rate_fns, tf.unstack(state))
+            ]
+            return [tf.stack(r) for r in zip(*rates)]
+
+        return chain_binomial_simulate(
+            transition_rate_fn,
+            model_spec.STOICHIOMETRY,
+            tf.stack([init_state] * len(rate_fns)),
+            initial_step,
+            num_steps,
+            time_delta=model_spec.TIME_DELTA,
+            shared_random_dims=1,
+            seed=seed,
+        )
+
+    def simulate(samples_, init_states, seed):
+        params = [
+            [samples_[f"{k}_{i}"] for k in parameters]
+            for i in range(len(counterfactuals))
+        ]
+        events = sim_fn(
+            params,
+            tf.convert_to_tensor(init_states[0], model_spec.DTYPE),
+            seed,
+        )
+        return tf.unstack(events)
+
+    init_state = StateCache(
+        posterior_samples, samples, model_spec.STOICHIOMETRY
+    ).state_at(initial_step)
+    _write_predictions(
+        simulate,
+        scenario_samples,
+        [init_state] * len(counterfactuals),
+        output_files,
+        covar_data["locations"]["lad19cd"],
+        [dates] * len(counterfactuals),
+        batch_size,
+        seed,
     )
-    prediction.attrs["initial_state"] = estimated_init_state
 
-    with open(output_file, "wb") as f:
-        pkl.dump(prediction, f)
+
+def predict(
+    data,
+    posterior_samples,
+    output_file,
+    initial_step,
+    num_steps,
+    batch_size=None,
+):
+
+    predict_scenarios(
+        data,
+        posterior_samples,
+        [(output_file, initial_step, num_steps)],
+        batch_size,
+    )
 
 
 if __name__ == "__main__":
@@ -113,24 +420,22 @@ if __name__ == "__main__":
     parser.add_argument(
         "-n", "--num-steps", type=int, default=1, description="Number of steps"
     )
+    parser.add_argument("data", type=str, description="Covariate data artefact")
     parser.add_argument(
-        "data_pkl", type=str, description="Covariate data pickle"
-    )
-    parser.add_argument(
-        "posterior_samples_pkl",
+        "posterior_samples",
         type=str,
-        description="Posterior samples pickle",
+        description="Posterior samples artefact",
     )
     parser.add_argument(
         "output_file",
         type=str,
-        description="Output pkl file",
+        description="Output prediction store",
     )
     args = parser.parse_args()
 
     predict(
-        args.data_pkl,
-        args.posterior_samples_pkl,
+        args.data,
+        args.posterior_samples,
         args.output_file,
         args.initial_step,
         args.num_steps,
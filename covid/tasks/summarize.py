@@ -1,31 +1,33 @@
 """Summary functions"""
 
 import numpy as np
-import pickle as pkl
 import pandas as pd
 
-from gemlib.util import compute_state
 from covid.summary import mean_and_ci
+from covid.quantiles import QuantileSummary
+from covid.horizons import summarise_horizons
+from covid.state import compute_state, StateCache
+from covid.prediction_store import iter_prediction
+from covid.ngm_store import read_local_rt
 from covid.model_spec import STOICHIOMETRY
+from covid.artefact import open_artefact
+from covid.covariate_store import open_covariates
 
 
 def rt(input_file, output_file):
-    """Reads an array of next generation matrices and
+    """Reads local Rt values computed from next generation matrices and
        outputs mean (ci) local Rt values.
 
-    :param input_file: a pickled xarray of NGMs
+    :param input_file: a `covid.ngm_store` NGM store
     :param output_file: a .csv of mean (ci) values
     """
 
-    with open(input_file, "rb") as f:
-        ngm = pkl.load(f)
-
-    rt = np.sum(ngm, axis=-2)
-    rt_summary = mean_and_ci(rt, name="Rt")
+    rt = read_local_rt(input_file)
+    rt_summary = mean_and_ci(rt.values, name="Rt")
     exceed = np.mean(rt > 1.0, axis=0)
     
     rt_summary = pd.DataFrame(
-        rt_summary, index=pd.Index(ngm.coords["dest"], name="location")
+        rt_summary, index=pd.Index(rt.coords["location"], name="location")
     )
     rt_summary['Rt_exceed'] = exceed
     rt_summary.to_csv(output_file)
@@ -35,32 +37,20 @@ def infec_incidence(input_file, output_file):
     """Summarises cumulative infection incidence
       as a nowcast, 7, 14, 28, and 56 days.
 
-    :param input_file: a pkl of the medium term prediction
+    :param input_file: a store or pickle of the medium term prediction
     :param output_file: csv with prediction summaries
     """
 
-    with open(input_file, "rb") as f:
-        prediction = pkl.load(f)
-
     offset = 4
     timepoints = np.array([1, 7, 14, 28, 56], np.int32) + offset
 
-    # Absolute incidence
-    def pred_events(events, name=None):
-        num_events = np.sum(events, axis=-1)
-        return mean_and_ci(num_events, name=name)
-
-    idx = prediction.coords["location"]
-
-    abs_incidence = pd.DataFrame(
-        pred_events(prediction[..., offset:5, 2], name="cases"), index=idx
+    # Absolute incidence over each horizon, from one pass over the prediction
+    windows = {"cases": (offset, timepoints[0])}
+    windows.update({f"cases{t-offset}": (offset, t) for t in timepoints[1:]})
+    abs_incidence = summarise_horizons(
+        (x[..., : timepoints[-1], 2] for x in iter_prediction(input_file)),
+        windows,
     )
-    for t in timepoints[1:]:
-        tmp = pd.DataFrame(
-            pred_events(prediction[..., offset:t, 2], name=f"cases{t-offset}"),
-            index=idx,
-        )
-        abs_incidence = pd.concat([abs_incidence, tmp], axis="columns")
 
     abs_incidence.to_csv(output_file)
 
@@ -69,42 +59,39 @@ def prevalence(input_files, output_file):
     """Reconstruct predicted prevalence from
        original data and projection.
 
-    :param input_files: a list of [data pickle, samples pickle, prediction  pickle]
+    :param input_files: a list of [data artefact, samples artefact, prediction
+                        store or pickle]
     :param output_file: a csv containing prevalence summary
     """
     offset = 4  # Account for recording lag
     timepoints = np.array([0, 7, 14, 28, 56], np.int32) + offset
 
-    with open(input_files[0], "rb") as f:
-        data = pkl.load(f)
+    data = open_covariates(input_files[0])
 
-    with open(input_files[1], "rb") as f:
-        samples = pkl.load(f)
+    samples = open_artefact(input_files[1])
 
-    with open(input_files[2], "rb") as f:
-        prediction = pkl.load(f)
-
-    insample_state = compute_state(
-        samples["init_state"], samples["seir"], STOICHIOMETRY
-    )
-    predicted_state = compute_state(
-        insample_state[..., -1, :], prediction, STOICHIOMETRY
+    final_state = StateCache(input_files[1], samples, STOICHIOMETRY).state_at(
+        -1
     )
+    names = ["prev"] + [f"prev{t-offset}" for t in timepoints[1:]]
+    summary = QuantileSummary()
+    for prediction in iter_prediction(input_files[2]):
+        predicted_state = compute_state(
+            final_state[prediction.coords["iteration"].values],
+            prediction.values,
+            STOICHIOMETRY,
+            times=timepoints,
+        ).numpy()
+        prev = (
+            np.sum(predicted_state[..., 1:3], axis=-1)
+            / np.squeeze(data["N"])[:, np.newaxis]
+        )
+        for i, name in enumerate(names):
+            summary.update(name, prev[..., i])
 
-    def calc_prev(state, name=None):
-        prev = np.sum(state[..., 1:3], axis=-1) / np.squeeze(data["N"])
-        return mean_and_ci(prev, name=name)
-
-    idx = prediction.coords["location"]
     prev = pd.DataFrame(
-        calc_prev(predicted_state[..., timepoints[0], :], name="prev"),
-        index=idx,
+        {k: v for name in names for k, v in summary.result(name).items()},
+        index=prediction.coords["location"],
     )
-    for t in timepoints[1:]:
-        tmp = pd.DataFrame(
-            calc_prev(predicted_state[..., t, :], name=f"prev{t-offset}"),
-            index=idx,
-        )
-        prev = pd.concat([prev, tmp], axis="columns")
 
     prev.to_csv(output_file)
@@ -1,9 +1,10 @@
 """Summarises posterior distribution into a geopackage"""
 
-import pickle as pkl
 import pandas as pd
 import geopandas as gp
 
+from covid.covariate_store import open_covariates
+
 
 def _tier_enum(design_matrix):
     """Turns a factor variable design matrix into
@@ -16,7 +17,7 @@ def _tier_enum(design_matrix):
 def summary_geopackage(input_files, output_file, config):
     """Creates a summary geopackage file
 
-    :param input_files: a list of data file names [data pkl,
+    :param input_files: a list of data file names [data artefact,
                                                    next_generation_matrix,
                                                    insample7,
                                                    insample14,
@@ -26,8 +27,7 @@ def summary_geopackage(input_files, output_file, config):
     """
 
     # Read in the first input file
-    with open(input_files.pop(0), "rb") as f:
-        data = pkl.load(f)
+    data = open_covariates(input_files.pop(0))
 
     # Load and filter geopackage
     geo = gp.read_file(config["base_geopackage"], layer=config["base_layer"])
@@ -1,34 +1,53 @@
 """Produces a long-format summary of fitted model results"""
 
-import pickle as pkl
 from datetime import date
 import numpy as np
 import pandas as pd
 import xarray
 
-from gemlib.util import compute_state
+from covid.state import compute_state
 from covid.model_spec import STOICHIOMETRY
 from covid import model_spec
 from covid.formats import make_dstl_template
+from covid.prediction_store import iter_prediction
+from covid.quantiles import QuantileSummary
+from covid.ngm_store import read_local_rt
+from covid.covariate_store import open_covariates
 
 
-def xarray2summarydf(arr):
-    mean = arr.mean(dim="iteration").to_dataset(name="value")
-    quantiles = arr.quantile(q=[0.05, 0.5, 0.95], dim="iteration").to_dataset(
-        dim="quantile"
-    )
-    ds = mean.merge(quantiles).rename_vars(
-        {0.05: "0.05", 0.5: "0.5", 0.95: "0.95"}
+def xarray2summarydf(batches):
+    """Summarises the mean and quantiles of an `[iteration, ...]`
+    `xarray.DataArray`, or of an iterable of batches of iterations, in one
+    pass.
+
+    :param batches: an `xarray.DataArray` or iterable of `xarray.DataArray`s
+    :returns: a long format `pd.DataFrame`
+    """
+    if isinstance(batches, xarray.DataArray):
+        batches = [batches]
+    summary = QuantileSummary(q=[0.05, 0.5, 0.95], interpolation="linear")
+    for batch in batches:
+        summary.update("value", batch.transpose("iteration", ...).values)
+    result = summary.result("value")
+    data_vars = {"value": result.pop("value_mean")}
+    data_vars.update({k[len("value_") :]: v for k, v in result.items()})
+
+    template = batch.isel(iteration=0, drop=True)
+    ds = xarray.Dataset(
+        {k: (template.dims, v) for k, v in data_vars.items()},
+        coords=template.coords,
     )
     return ds.to_dataframe().reset_index()
 
 
 def prevalence(events, popsize):
-    prev = compute_state(events.attrs["initial_state"], events, STOICHIOMETRY)
+    prev = compute_state(
+        events.attrs["initial_state"], events.values, STOICHIOMETRY
+    )
     prev = xarray.DataArray(
         prev.numpy(),
         coords=[
-            np.arange(prev.shape[0]),
+            events.coords["iteration"],
             events.coords["location"],
             events.coords["time"],
             np.arange(prev.shape[-1]),
@@ -40,23 +59,23 @@ def prevalence(events, popsize):
         / popsize[np.newaxis, :, np.newaxis]
         * 100000
     )
-    return xarray2summarydf(prev_per_1e5)
+    return prev_per_1e5
 
 
 def summary_longformat(input_files, output_file):
     """Draws together pipeline results into a long format
        csv file.
 
-    :param input_files: a list of filenames [data_pkl,
-                                             insample14_pkl,
-                                             medium_term_pred_pkl,
-                                             ngm_pkl]
+    :param input_files: a list of filenames [data artefact,
+                                             insample14 prediction,
+                                             medium_term prediction,
+                                             ngm_store], where predictions
+                        may be stores or pickles
     :param output_file: the output CSV with columns `[date,
                         location,value_name,value,q0.025,q0.975]`
     """
 
-    with open(input_files[0], "rb") as f:
-        data = pkl.load(f)
+    data = open_covariates(input_files[0])
     da = data["cases"].rename({"date": "time"})
     df = da.to_dataframe(name="value").reset_index()
     df["value_name"] = "newCasesBySpecimenDate"
@@ -65,29 +84,30 @@ def summary_longformat(input_files, output_file):
     df["0.95"] = np.nan
 
     # Insample predictive incidence
-    with open(input_files[1], "rb") as f:
-        insample = pkl.load(f)
-    insample_df = xarray2summarydf(insample[..., 2].reset_coords(drop=True))
+    insample_df = xarray2summarydf(
+        x[..., 2].reset_coords(drop=True)
+        for x in iter_prediction(input_files[1])
+    )
     insample_df["value_name"] = "insample14_Cases"
     df = pd.concat([df, insample_df], axis="index")
 
     # Medium term incidence
-    with open(input_files[2], "rb") as f:
-        medium_term = pkl.load(f)
-    medium_df = xarray2summarydf(medium_term[..., 2].reset_coords(drop=True))
+    medium_df = xarray2summarydf(
+        x[..., 2].reset_coords(drop=True)
+        for x in iter_prediction(input_files[2])
+    )
     medium_df["value_name"] = "Cases"
     df = pd.concat([df, medium_df], axis="index")
 
     # Medium term prevalence
-    prev_df = prevalence(medium_term, data["N"])
+    prev_df = xarray2summarydf(
+        prevalence(x, data["N"]) for x in iter_prediction(input_files[2])
+    )
     prev_df["value_name"] = "prevalence"
     df = pd.concat([df, prev_df], axis="index")
 
     # Rt
-    with open(input_files[3], "rb") as f:
-        ngms = pkl.load(f)
-    rt = ngms.sum(dim="dest")
-    rt = rt.rename({"src": "location"})
+    rt = read_local_rt(input_files[3])
     rt_summary = xarray2summarydf(rt)
     rt_summary["value_name"] = "R"
     rt_summary["time"] = data["date_range"][1]
@@ -1,15 +1,36 @@
 """Thin posterior"""
 
+import os
+import warnings
 import h5py
-import pickle as pkl
+import numpy as np
+
+from covid.artefact import save_artefact
+from covid.checkpoint import PosteriorAppender
+from covid.posterior_layout import create_posterior
 
 
 def thin_posterior(input_file, output_file, config):
 
-    thin_idx = range(config['start'], config['end'], config['by'])
+    # A strided slice reads a hyperslab, rather than point-wise selection
+    thin_idx = slice(config["start"], config["end"], config["by"])
 
     f = h5py.File(input_file, "r", rdcc_nbytes=1024 ** 3, rdcc_nslots=1e6)
-    output_dict = dict(
+    num_chains = f.attrs.get("num_chains", 1)
+    read_stride = f.attrs.get("read_stride", 1)
+    if read_stride == 1 and config["by"] > 1:
+        warnings.warn(
+            "Posterior chunks are laid out for contiguous reads, but "
+            f"samples are read with a stride of {config['by']}"
+        )
+
+    def merge_chains(x):
+        """Pools [iteration, chain, ...] samples into [iteration*chain, ...]"""
+        if num_chains == 1:
+            return x
+        return x.reshape((-1,) + x.shape[2:])
+
+    samples = dict(
         beta1=f["samples/beta1"][thin_idx],
         beta2=f["samples/beta2"][thin_idx],
         beta3=f["samples/beta3"][
@@ -22,14 +43,115 @@ def thin_posterior(input_file, output_file, config):
         gamma0=f["samples/gamma0"][thin_idx],
         gamma1=f["samples/gamma1"][thin_idx],
         seir=f["samples/events"][thin_idx],
-        init_state=f["initial_state"][:],
     )
+    output_dict = {k: merge_chains(v) for k, v in samples.items()}
+    output_dict["init_state"] = f["initial_state"][:]
     f.close()
 
-    with open(output_file, "wb") as f:
-        pkl.dump(
-            output_dict,
-            f,
+    save_artefact(output_file, output_dict)
+
+
+def _inline_store_file(output_file):
+    return os.path.splitext(output_file)[0] + ".hd5"
+
+
+class InlineThinner:
+    """Streams the samples selected by a `ThinPosterior` configuration into
+    a compact HDF5 store whilst the MCMC runs, and writes the thinned
+    samples artefact once the MCMC completes.
+
+    The store mirrors the layout of the posterior file, holding only the
+    selected samples, and lives next to `output_file` with extension
+    `.hd5`.
+
+    :param output_file: the thinned samples artefact
+    :param config: the `ThinPosterior` configuration dictionary
+    :param num_samples: the total number of posterior samples
+    :param resume: if `True`, continue writing an existing store
+    """
+
+    def __init__(self, output_file, config, num_samples, resume=False):
+        self.output_file = output_file
+        self.store_file = _inline_store_file(output_file)
+        self._range = range(
+            config["start"], min(config["end"], num_samples), config["by"]
+        )
+        self._config = config
+        self._store = None
+        if resume and os.path.exists(self.store_file):
+            self._store = PosteriorAppender(self.store_file)
+
+    def _create_store(self, samples, attrs, initial_state):
+        self._store = create_posterior(
+            self.store_file,
+            sample_dict=samples,
+            results_dict={},
+            num_samples=len(self._range),
+            burst_length=len(self._range),
+        )
+        root = self._store["/"]
+        root.attrs.update(attrs)
+        for k in ["start", "end", "by"]:
+            root.attrs[f"thin_{k}"] = self._config[k]
+        root.attrs["complete"] = False
+        root.create_dataset("initial_state", data=initial_state)
+
+    def write_burst(self, samples, first_dim_offset, attrs, initial_state):
+        """Stores the selected samples of a burst
+
+        :param samples: a dictionary of samples, named as in the posterior
+                        file, each with leading dimension of the burst
+                        length
+        :param first_dim_offset: the index of the burst's first sample
+        :param attrs: file attributes of the posterior, e.g. `num_chains`
+        :param initial_state: the initial state of the epidemic
+        """
+        burst_length = next(iter(samples.values())).shape[0]
+        kept = [
+            i - first_dim_offset
+            for i in self._range
+            if first_dim_offset <= i < first_dim_offset + burst_length
+        ]
+        if self._store is None:
+            self._create_store(samples, attrs, initial_state)
+        if len(kept) == 0:
+            return
+        # Slice before copying, so only selected samples leave the device
+        kept = slice(kept[0], kept[-1] + 1, self._range.step)
+        self._store.write_samples(
+            {k: np.asarray(v[kept]) for k, v in samples.items()},
+            first_dim_offset=self._range.index(first_dim_offset + kept.start),
+        )
+
+    def finalise(self):
+        """Writes the thinned samples artefact from the store"""
+        self._store["/"].attrs["complete"] = True
+        del self._store
+        thin_posterior(
+            self.store_file,
+            self.output_file,
+            dict(start=0, end=len(self._range), by=1),
+        )
+
+
+def inline_thinned_is_current(posterior_file, output_file, config):
+    """Tests whether `output_file` was written by an `InlineThinner` with
+    `config`, since `posterior_file` was last modified.
+
+    :param posterior_file: the posterior HDF5 file
+    :param output_file: the thinned samples artefact
+    :param config: the `ThinPosterior` configuration dictionary
+    :returns: `True` if `output_file` need not be re-computed
+    """
+    store_file = _inline_store_file(output_file)
+    if not (os.path.exists(output_file) and os.path.exists(store_file)):
+        return False
+    if os.path.getmtime(output_file) < os.path.getmtime(posterior_file):
+        return False
+    with h5py.File(store_file, "r") as f:
+        return bool(f.attrs.get("complete", False)) and all(
+            f.attrs.get(f"thin_{k}") == config[k]
+            for k in ["start", "end", "by"]
         )
 
 
@@ -0,0 +1,41 @@
+"""Tests inline thinning of MCMC samples"""
+
+import numpy as np
+
+from covid.artefact import open_artefact
+from covid.tasks.thin_posterior import InlineThinner, inline_thinned_is_current
+
+NAMES = ["beta1", "beta2", "beta3", "sigma", "xi", "gamma0", "gamma1"]
+
+
+def test_inline_thinner(tmp_path):
+
+    config = dict(start=2, end=9, by=3)
+    output_file = str(tmp_path / "thin_samples")
+    thinner = InlineThinner(output_file, config, num_samples=10)
+    for burst in range(2):
+        index = np.arange(5) + burst * 5
+        samples = {k: index.astype(np.float64) for k in NAMES}
+        samples["events"] = np.broadcast_to(
+            index[:, np.newaxis, np.newaxis, np.newaxis], [5, 2, 3, 3]
+        )
+        thinner.write_burst(
+            samples,
+            first_dim_offset=burst * 5,
+            attrs=dict(num_chains=1),
+            initial_state=np.zeros([2, 4]),
+        )
+
+    posterior_file = tmp_path / "posterior.hd5"
+    posterior_file.touch()
+    thinner.finalise()
+
+    thinned = open_artefact(output_file)
+    np.testing.assert_array_equal(thinned["beta1"], [2, 5, 8])
+    np.testing.assert_array_equal(thinned["seir"][:, 0, 0, 0], [2, 5, 8])
+    assert thinned["init_state"].shape == (2, 4)
+
+    assert inline_thinned_is_current(posterior_file, output_file, config)
+    assert not inline_thinned_is_current(
+        posterior_file, output_file, dict(config, by=2)
+    )
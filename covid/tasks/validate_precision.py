@@ -0,0 +1,137 @@
+"""Compares posterior summaries of a reduced-precision run against a
+float64 baseline"""
+
+import h5py
+import numpy as np
+import pandas as pd
+import tensorflow_probability as tfp
+
+__all__ = ["summarise_posterior", "validate_precision"]
+
+PARAMETERS = ["beta1", "beta2", "gamma0", "gamma1", "sigma", "xi"]
+
+
+def summarise_posterior(posterior_file, names=PARAMETERS, start=0, by=1):
+    """Summarises the marginal posteriors of scalar and vector parameters.
+
+    :param posterior_file: a posterior HDF5 file
+    :param names: the names of the samples to summarise
+    :param start: the first iteration to include
+    :param by: the thinning interval
+    :returns: a `pd.DataFrame` indexed by parameter name and element, with
+              columns `mean`, `sd`, `ess`, `q0.025`, and `q0.975`.
+    """
+    with h5py.File(posterior_file, "r") as f:
+        num_chains = f.attrs.get("num_chains", 1)
+        summaries = []
+        for name in names:
+            x = f[f"samples/{name}"][start::by]
+            if num_chains == 1:
+                x = x[:, np.newaxis]
+            x = x.reshape(x.shape[:2] + (-1,))  # [iteration, chain, element]
+            ess = tfp.mcmc.effective_sample_size(
+                x, cross_chain_dims=1 if num_chains > 1 else None
+            ).numpy()
+            if num_chains == 1:
+                ess = ess[0]
+            pooled = x.reshape((-1, x.shape[-1]))
+            summaries.append(
+                pd.DataFrame(
+                    {
+                        "mean": pooled.mean(axis=0),
+                        "sd": pooled.std(axis=0),
+                        "ess": ess,
+                        "q0.025": np.quantile(pooled, 0.025, axis=0),
+                        "q0.975": np.quantile(pooled, 0.975, axis=0),
+                    },
+                    index=pd.MultiIndex.from_product(
+                        [[name], range(pooled.shape[-1])],
+                        names=["parameter", "element"],
+                    ),
+                )
+            )
+    return pd.concat(summaries)
+
+
+def validate_precision(
+    baseline_file,
+    candidate_file,
+    names=PARAMETERS,
+    start=0,
+    by=1,
+    max_z=3.0,
+):
+    """Compares the posterior means of `candidate_file` with those of
+       `baseline_file`, e.g. a `precision: float32` run against a
+       `precision: float64` run of the same configuration.
+
+    Differences in means are standardised by their Monte Carlo standard
+    error, `sqrt(sd_b^2/ess_b + sd_c^2/ess_c)`, so that independent runs
+    targeting the same posterior give approximately standard normal `z`.
+
+    :param baseline_file: the baseline posterior HDF5 file
+    :param candidate_file: the candidate posterior HDF5 file
+    :param names: the names of the samples to compare
+    :param start: the first iteration to include, i.e. the burn-in
+    :param by: the thinning interval
+    :param max_z: the largest acceptable absolute `z`
+    :returns: a `pd.DataFrame` with the baseline and candidate summaries,
+              `z`, the ratio of posterior standard deviations `sd_ratio`,
+              and a boolean column `ok`.
+    """
+    baseline = summarise_posterior(baseline_file, names, start, by)
+    candidate = summarise_posterior(candidate_file, names, start, by)
+
+    mcse = np.sqrt(
+        baseline["sd"] ** 2 / baseline["ess"]
+        + candidate["sd"] ** 2 / candidate["ess"]
+    )
+    comparison = baseline.join(
+        candidate, lsuffix="_baseline", rsuffix="_candidate"
+    )
+    comparison["z"] = (candidate["mean"] - baseline["mean"]) / mcse
+    comparison["sd_ratio"] = candidate["sd"] / baseline["sd"]
+    comparison["ok"] = comparison["z"].abs() <= max_z
+    return comparison
+
+
+if __name__ == "__main__":
+
+    import sys
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(
+        description="Compare a reduced-precision posterior with a float64 "
+        "baseline"
+    )
+    parser.add_argument("baseline", type=str, help="Baseline posterior file")
+    parser.add_argument("candidate", type=str, help="Candidate posterior file")
+    parser.add_argument(
+        "--start", type=int, default=0, help="First iteration (burn-in)"
+    )
+    parser.add_argument("--by", type=int, default=1, help="Thinning interval")
+    parser.add_argument(
+        "--max-z", type=float, default=3.0, help="Largest acceptable |z|"
+    )
+    parser.add_argument(
+        "-o", "--output", type=str, help="Optional CSV output file"
+    )
+    args = parser.parse_args()
+
+    comparison = validate_precision(
+        args.baseline,
+        args.candidate,
+        start=args.start,
+        by=args.by,
+        max_z=args.max_z,
+    )
+    if args.output is not None:
+        comparison.to_csv(args.output)
+    with pd.option_context("display.max_rows", None):
+        print(comparison[["mean_baseline", "mean_candidate", "z", "ok"]])
+
+    if not comparison["ok"].all():
+        print(
+            f"{(~comparison['ok']).sum()} elements differ by |z| > {args.max_z}"
+        )
+        sys.exit(1)
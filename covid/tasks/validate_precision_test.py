@@ -0,0 +1,32 @@
+"""Tests the precision validation harness"""
+
+import h5py
+import numpy as np
+
+from covid.tasks.validate_precision import validate_precision
+
+
+def _write_posterior(filename, beta1, xi):
+    with h5py.File(filename, "w") as f:
+        f.create_dataset("samples/beta1", data=beta1)
+        f.create_dataset("samples/xi", data=xi)
+
+
+def test_validate_precision(tmp_path):
+
+    rng = np.random.default_rng(0)
+    baseline = str(tmp_path / "baseline.hd5")
+    _write_posterior(
+        baseline, rng.normal(size=[1000]), rng.normal(size=[1000, 3])
+    )
+    candidate = str(tmp_path / "candidate.hd5")
+    _write_posterior(
+        candidate,
+        rng.normal(size=[1000]).astype(np.float32),
+        rng.normal(loc=[0.0, 0.0, 1.0], size=[1000, 3]).astype(np.float32),
+    )
+
+    comparison = validate_precision(baseline, candidate, ["beta1", "xi"])
+
+    assert comparison.shape[0] == 4
+    np.testing.assert_array_equal(comparison["ok"], [True, True, True, False])
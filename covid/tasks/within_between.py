@@ -1,25 +1,21 @@
 """Creates a medium term prediction"""
 
-import pickle as pkl
 import numpy as np
 import pandas as pd
 import tensorflow as tf
 
-from gemlib.util import compute_state
 from covid import model_spec
+from covid.state import StateCache
+from covid.artefact import open_artefact
+from covid.covariate_store import open_covariates
 
 
 def make_within_rate_fns(covariates, beta2):
 
-    C = tf.convert_to_tensor(covariates["C"], dtype=model_spec.DTYPE)
-    C = tf.linalg.set_diag(C, tf.zeros(C.shape[0], dtype=model_spec.DTYPE))
-
-    W = tf.convert_to_tensor(
-        tf.squeeze(covariates["W"]), dtype=model_spec.DTYPE
-    )
-    N = tf.convert_to_tensor(
-        tf.squeeze(covariates["N"]), dtype=model_spec.DTYPE
-    )
+    covariates = model_spec.covariate_bundle(covariates)
+    C = covariates.C
+    W = covariates.W
+    N = covariates.N
 
     def within_fn(t, state):
         w_idx = tf.clip_by_value(tf.cast(t, tf.int64), 0, W.shape[0] - 1)
@@ -44,11 +40,13 @@ def make_within_rate_fns(covariates, beta2):
 
 # @tf.function
 def calc_pressure_components(covariates, beta2, state):
+    covariates = model_spec.covariate_bundle(covariates)
+
     def atomic_fn(args):
         beta2_, state_ = args
         within_fn, between_fn = make_within_rate_fns(covariates, beta2_)
-        within = within_fn(covariates["W"].shape[0], state_)
-        between = between_fn(covariates["W"].shape[0], state_)
+        within = within_fn(covariates.W.shape[0], state_)
+        between = between_fn(covariates.W.shape[0], state_)
         total = within + between
         return within / total, between / total
 
@@ -58,26 +56,20 @@ def calc_pressure_components(covariates, beta2, state):
 def within_between(input_files, output_file):
     """Calculates PAF for within- and between-location infection.
 
-    :param input_files: a list of [data pickle, posterior samples pickle]
+    :param input_files: a list of [data artefact, posterior samples artefact]
     :param output_file: a csv with within/between summary
     """
 
-    with open(input_files[0], "rb") as f:
-        covar_data = pkl.load(f)
+    covar_data = open_covariates(input_files[0])
 
-    with open(input_files[1], "rb") as f:
-        samples = pkl.load(f)
+    samples = open_artefact(input_files[1])
 
     beta2 = samples["beta2"]
-    events = samples["seir"]
-    init_state = samples["init_state"]
-    state_timeseries = compute_state(
-        init_state, events, model_spec.STOICHIOMETRY
-    )
+    state = StateCache(
+        input_files[1], samples, model_spec.STOICHIOMETRY
+    ).state_at(-1)
 
-    within, between = calc_pressure_components(
-        covar_data, beta2, state_timeseries[..., -1, :]
-    )
+    within, between = calc_pressure_components(covar_data, beta2, state)
 
     df = pd.DataFrame(
         dict(
@@ -96,13 +88,13 @@ if __name__ == "__main__":
 
     parser = ArgumentParser()
     parser.add_argument(
-        "-d", "--datafile", type=str, help="Data pickle file", requied=True
+        "-d", "--datafile", type=str, help="Data artefact", requied=True
     )
     parser.add_argument(
         "-s",
         "--samples",
         type=str,
-        help="Posterior samples pickle",
+        help="Posterior samples artefact",
         required=True,
     )
     parser.add_argument("-o", "--output", type=str, help="Output csv")
@@ -0,0 +1,93 @@
+"""Per-burst MCMC throughput telemetry"""
+
+import json
+import resource
+import threading
+
+import numpy as np
+
+__all__ = ["TelemetryLog", "peak_rss_mb"]
+
+
+def peak_rss_mb():
+    """Returns the peak resident set size of this process in MiB"""
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _flatten(record, prefix=""):
+    flat = {}
+    for k, v in record.items():
+        if isinstance(v, dict):
+            flat.update(_flatten(v, f"{prefix}{k}/"))
+        else:
+            flat[f"{prefix}{k}"] = v
+    return flat
+
+
+class TelemetryLog:
+    """Records one telemetry record per MCMC burst, as a line of a
+    JSON-lines file and as element `burst` of the datasets in an HDF5
+    group.
+
+    Records are dictionaries of scalars, possibly nested.  Nested keys
+    are joined with `/` in the HDF5 group, e.g. `acceptance/block0`.
+    Bursts not (yet) recorded hold NaN.  A record may be assembled from
+    several parts, e.g. timings known to different threads, by passing
+    `parts` to `record`.  `record` may be called from any thread.
+
+    :param jsonl_file: the JSON-lines file, appended to
+    :param h5group: an optional `h5py.Group`
+    :param num_bursts: the length of the HDF5 datasets
+    """
+
+    def __init__(self, jsonl_file, h5group=None, num_bursts=None):
+        self._file = open(jsonl_file, "a")
+        self._h5group = h5group
+        self._num_bursts = num_bursts
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def record(self, burst, record, parts=1):
+        """Writes the telemetry `record` for `burst`, once all of its
+        `parts` have been received.
+
+        :param burst: the burst index
+        :param record: a (nested) dictionary of scalars
+        :param parts: the number of partial records making up the record
+                      for `burst`
+        """
+        with self._lock:
+            received, fields = self._pending.pop(burst, (0, {}))
+            received += 1
+            fields.update(record)
+            if received < parts:
+                self._pending[burst] = (received, fields)
+                return
+            record = dict(burst=burst, **fields)
+            self._file.write(json.dumps(record, default=float) + "\n")
+            self._file.flush()
+            if self._h5group is not None:
+                self._write_h5(burst, _flatten(record))
+
+    def _write_h5(self, burst, record):
+        for k, v in record.items():
+            if k not in self._h5group:
+                self._h5group.create_dataset(
+                    k,
+                    shape=(self._num_bursts,),
+                    dtype=np.float64,
+                    fillvalue=np.nan,
+                )
+            self._h5group[k][burst] = v
+        self._h5group.file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
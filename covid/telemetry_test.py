@@ -0,0 +1,39 @@
+"""Tests per-burst telemetry"""
+
+import json
+
+import h5py
+import numpy as np
+
+from covid.telemetry import TelemetryLog
+
+
+def test_telemetry_log(tmp_path):
+
+    jsonl_file = tmp_path / "telemetry.jsonl"
+    with h5py.File(tmp_path / "posterior.hd5", "w") as f:
+        with TelemetryLog(
+            jsonl_file, f.require_group("telemetry"), num_bursts=3
+        ) as telemetry:
+            telemetry.record(1, {"write_time": 0.5}, parts=2)
+            telemetry.record(
+                1,
+                {"sample_time": 2.0, "acceptance": {"block0": 0.25}},
+                parts=2,
+            )
+
+        np.testing.assert_array_equal(
+            f["telemetry/acceptance/block0"][:], [np.nan, 0.25, np.nan]
+        )
+        assert f["telemetry/write_time"][1] == 0.5
+
+    with open(jsonl_file) as f:
+        records = [json.loads(line) for line in f]
+    assert records == [
+        {
+            "burst": 1,
+            "write_time": 0.5,
+            "sample_time": 2.0,
+            "acceptance": {"block0": 0.25},
+        }
+    ]
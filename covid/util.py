@@ -397,68 +397,110 @@ def plot_event_posterior(posterior, simulation, metapopulation=0):
     return fig, ax
 
 
-def distribute_geom(events, rate, delta_t=1.0):
-    """Given a tensor `events`, returns a tensor of shape `events.shape + [t]`
-    representing the events distributed over a number of days given geometric
-    waiting times with rate `1-exp(-rate*delta_t)`"""
+def impute_previous_cases(events, rate, delta_t=1.0, seed=None):
+    """Imputes previous numbers of cases by using a geometric distribution
 
-    events = tf.convert_to_tensor(events)
-    rate = tf.convert_to_tensor(rate, dtype=events.dtype)
+    Each event at time `t` is preceded by an event at time `t - d`, where
+    the waiting time `d` is geometric on `{1, 2, ...}` with success
+    probability `1-exp(-rate*delta_t)`.  Waiting times are drawn by
+    inversion for all events at once, and binned by metapopulation and
+    time in a single segment sum, so the cost is independent of the
+    length of the waiting times.
 
-    accum = tf.TensorArray(events.dtype, size=0, dynamic_size=True)
-    prob = 1.0 - tf.exp(-rate * delta_t)
+    :param events: a [M, T] tensor of event counts
+    :param rate: the failure rate per `delta_t`
+    :param delta_t: the size of the time step
+    :param seed: an optional stateless seed, for reproducible imputation
+    :returns: a tuple containing the matrix of events and the maximum
+              number of timesteps into the past to allow padding of `events`.
+    """
+    events = tf.convert_to_tensor(events)
+    num_meta, num_times = events.shape
 
-    def body(i, events_, accum_):
-        rv = tfd.Binomial(total_count=events_, probs=prob)
-        failures = rv.sample()
-        accum_ = accum_.write(i, failures)
-        i += 1
-        return i, events_ - failures, accum_
+    # One element per event, holding the event's cell index in [M, T]
+    cell = tf.repeat(
+        tf.range(num_meta * num_times, dtype=tf.int64),
+        tf.reshape(tf.cast(tf.round(events), tf.int64), [-1]),
+    )
+    if seed is None:
+        u = tf.random.uniform(tf.shape(cell), dtype=tf.float64)
+    else:
+        u = tf.random.stateless_uniform(
+            tf.shape(cell), seed=seed, dtype=tf.float64
+        )
 
-    def cond(_1, events_, _2):
-        res = tf.reduce_sum(events_) > tf.constant(0, dtype=events.dtype)
-        return res
+    # Inversion of the geometric CDF, as log(1 - prob) = -rate * delta_t
+    wait = tf.math.ceil(-tf.math.log1p(-u) / (rate * delta_t))
+    wait = tf.maximum(tf.cast(wait, tf.int64), 1)
+    time = cell % num_times - wait
+    first = tf.minimum(tf.reduce_min(time), -1)
+
+    num_prev_times = num_times - first
+    prev_cases = tf.math.unsorted_segment_sum(
+        tf.ones_like(time, dtype=events.dtype),
+        (cell // num_times) * num_prev_times + time - first,
+        num_meta * num_prev_times,
+    )
+    return (
+        tf.reshape(prev_cases, [num_meta, num_prev_times]),
+        int(1 - first),
+    )
 
-    _1, _2, accum = tf.while_loop(cond, body, loop_vars=[1, events, accum])
-    accum = accum.stack()
 
-    return tf.transpose(accum, perm=(1, 0, 2))
+def sparsify_matrix(matrix, threshold=0.0, top_k=None):
+    """Splits a square matrix into a sparse part and a dense residual.
 
+    Diagonal elements are always retained.  Off-diagonal elements are
+    retained if their magnitude exceeds `threshold` and, if `top_k` is
+    given, they are among the `top_k` largest in magnitude in their row.
+    The sum of each row's dropped elements is returned as a residual.
 
-def reduce_diagonals(m):
-    def fn(m_):
-        idx = (
-            tf.range(m_.shape[-1])
-            - tf.range(m_.shape[-2])[:, tf.newaxis]
-            + m_.shape[-2]
-            - 1
+    :param matrix: a [M, M] numpy array
+    :param threshold: the magnitude at or below which elements are dropped
+    :param top_k: the maximum number of off-diagonal elements per row
+    :returns: a tuple `(rows, cols, values, residual)` of the row and
+              column indices and values of the retained elements, in row
+              order, and the [M] vector of row sums of dropped elements.
+    """
+    matrix = np.asarray(matrix)
+    magnitude = np.abs(matrix)
+    keep = magnitude > threshold
+    if top_k is not None and matrix.shape[-1] > 1:
+        top_k = min(int(top_k), matrix.shape[-1] - 1)
+        off_diag = np.where(
+            np.eye(matrix.shape[-1], dtype=bool), 0.0, magnitude
         )
-        idx = tf.expand_dims(idx, axis=-1)
-        return tf.scatter_nd(idx, m_, [m_.shape[-2] + m_.shape[-1] - 1])
+        kth_largest = -np.partition(-off_diag, top_k - 1, axis=-1)[
+            :, top_k - 1 : top_k
+        ]
+        keep &= off_diag >= kth_largest
+    np.fill_diagonal(keep, True)
 
-    return tf.vectorized_map(fn, m)
+    rows, cols = np.nonzero(keep)
+    residual = np.sum(np.where(keep, 0.0, matrix), axis=-1)
+    return rows, cols, matrix[rows, cols], residual
 
 
-def impute_previous_cases(events, rate, delta_t=1.0):
-    """Imputes previous numbers of cases by using a geometric distribution
+def sparse_matvec(rows, cols, values, x, num_rows):
+    """Multiplies a sparse matrix in coordinate format by a (batch of)
+    vector(s) at a cost of O(nnz) per vector.
 
-    :param events: a [M, T] tensor
-    :param rate: the failure rate per `delta_t`
-    :param delta_t: the size of the time step
-    :returns: a tuple containing the matrix of events and the maximum
-              number of timesteps into the past to allow padding of `events`.
-    """
-    prev_case_distn = distribute_geom(events, rate, delta_t)
-    prev_cases = reduce_diagonals(prev_case_distn)
+    Implemented as a gather and segment sum, which XLA compiles.
 
-    # Trim preceding zero days
-    total_events = tf.reduce_sum(prev_cases, axis=-2)
-    num_zero_days = total_events.shape[-1] - tf.math.count_nonzero(
-        tf.cumsum(total_events, axis=-1)
-    )
-    return (
-        prev_cases[..., num_zero_days:],
-        prev_case_distn.shape[-2] - num_zero_days,
+    :param rows: [nnz] row indices
+    :param cols: [nnz] column indices
+    :param values: [nnz] values
+    :param x: a [..., M] tensor
+    :param num_rows: the number of rows of the matrix
+    :returns: a [..., num_rows] tensor
+    """
+    x = tf.convert_to_tensor(x)
+    batch_shape = tf.shape(x)[:-1]
+    x = tf.transpose(tf.reshape(x, [-1, tf.shape(x)[-1]]))  # [M, B]
+    contrib = tf.gather(x, cols) * values[:, tf.newaxis]  # [nnz, B]
+    y = tf.math.unsorted_segment_sum(contrib, rows, num_rows)  # [M, B]
+    return tf.reshape(
+        tf.transpose(y), tf.concat([batch_shape, [num_rows]], axis=0)
     )
 
 
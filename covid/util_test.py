@@ -0,0 +1,56 @@
+"""Tests covid utility functions"""
+
+import numpy as np
+import tensorflow as tf
+
+from covid.util import impute_previous_cases, sparsify_matrix, sparse_matvec
+
+
+def test_sparse_matvec_exact():
+    rng = np.random.default_rng(0)
+    matrix = rng.exponential(size=[6, 6]) * (rng.uniform(size=[6, 6]) < 0.3)
+    x = rng.uniform(size=[2, 6])
+
+    rows, cols, values, residual = sparsify_matrix(matrix)
+    y = sparse_matvec(rows, cols, values, x, 6)
+
+    np.testing.assert_array_equal(residual, np.zeros(6))
+    np.testing.assert_allclose(y, tf.linalg.matvec(matrix, x))
+
+
+def test_sparsify_top_k():
+    matrix = np.array([[-5.0, 3.0, 1.0], [2.0, -4.0, 0.5], [1.0, 4.0, -2.0]])
+
+    rows, cols, values, residual = sparsify_matrix(matrix, top_k=1)
+
+    np.testing.assert_array_equal(rows, [0, 0, 1, 1, 2, 2])
+    np.testing.assert_array_equal(cols, [0, 1, 0, 1, 1, 2])
+    np.testing.assert_array_equal(residual, [1.0, 0.5, 1.0])
+
+
+def test_impute_previous_cases():
+    events = np.array([[3.0, 0.0, 5.0, 2.0], [0.0, 4.0, 1.0, 0.0]])
+    seed = [0, 1]
+
+    prev_cases, lag = impute_previous_cases(events, 0.25, seed=seed)
+    prev_cases_again, _ = impute_previous_cases(events, 0.25, seed=seed)
+
+    assert prev_cases.shape == (2, events.shape[1] + lag - 1)
+    np.testing.assert_array_equal(prev_cases, prev_cases_again)
+    np.testing.assert_array_equal(
+        tf.reduce_sum(prev_cases, axis=-1), events.sum(axis=-1)
+    )
+
+
+def test_impute_previous_cases_wait():
+    rate = 0.5
+    events = np.array([[0.0, 0.0, 20000.0]])
+
+    prev_cases, lag = impute_previous_cases(events, rate, seed=[2, 3])
+
+    # Events at time 2 are offset by lag - 1 in the output
+    wait = (events.shape[1] + lag - 2) - np.arange(prev_cases.shape[1])
+    mean_wait = np.sum(wait * prev_cases[0]) / events.sum()
+    np.testing.assert_allclose(
+        mean_wait, 1.0 / (1.0 - np.exp(-rate)), rtol=0.02
+    )
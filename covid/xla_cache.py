@@ -0,0 +1,127 @@
+"""Persistent on-disc cache of XLA-compiled executables"""
+
+import os
+import json
+import hashlib
+import warnings
+import contextlib
+
+__all__ = [
+    "xla_cache_key",
+    "enable_xla_cache",
+    "xla_cache_enabled",
+    "xla_cache_directory",
+    "xla_cache_supported",
+]
+
+_CACHE_FLAG = "--tf_xla_persistent_cache_directory"
+
+# The first TensorFlow release with `_CACHE_FLAG`.  Earlier releases
+#   abort on unknown flags in `TF_XLA_FLAGS`.
+_MIN_TF_VERSION = (2, 12)
+
+# Mcmc configuration keys that do not change the compiled sampler
+_RUNTIME_KEYS = {
+    "num_bursts",
+    "seed",
+    "checkpoint",
+    "write_queue_size",
+    "num_chain_processes",
+    "threads_per_chain",
+    "xla_cache_dir",
+    "telemetry_file",
+    "read_stride",
+    "compression",
+    "inline_thin",
+    "initial_dispersion",
+}
+
+
+def xla_cache_key(version, num_meta, num_steps, config):
+    """Returns a cache key for a compiled sampler.
+
+    :param version: the model version, e.g. `covid.model_spec.VERSION`
+    :param num_meta: the number of metapopulations M
+    :param num_steps: the number of time steps T
+    :param config: the `Mcmc` configuration dictionary.  Keys that only
+                   affect the run length or I/O are ignored.
+    :returns: a string of the form `<version>-M<M>-T<T>-<config hash>`
+    """
+    compiled_config = {
+        k: v for k, v in config.items() if k not in _RUNTIME_KEYS
+    }
+    config_hash = hashlib.sha256(
+        json.dumps(compiled_config, sort_keys=True, default=str).encode()
+    ).hexdigest()[:12]
+    return f"{version}-M{num_meta}-T{num_steps}-{config_hash}"
+
+
+def xla_cache_supported():
+    """Returns `True` if this TensorFlow supports the XLA cache"""
+    import tensorflow as tf
+
+    version = tuple(int(v) for v in tf.__version__.split(".")[:2])
+    return version >= _MIN_TF_VERSION
+
+
+def enable_xla_cache(cache_root, key):
+    """Directs XLA to save compiled executables in, and load them from,
+    `<cache_root>/<key>`.
+
+    TensorFlow reads `TF_XLA_FLAGS` once, when its runtime is initialised
+    by the first TensorFlow operation, which includes importing
+    `covid.model_spec`.  This must therefore be called before that, or,
+    as by `xla_cache_enabled`, in a parent process whose environment a new
+    process inherits.
+
+    TensorFlow releases before 2.12 do not have the cache, and abort on
+    its flag, so it is not enabled with a warning.
+
+    :param cache_root: the root directory of the cache
+    :param key: a cache key, e.g. from `xla_cache_key`
+    :returns: the cache directory, or `None` if not enabled
+    """
+    if not xla_cache_supported():
+        warnings.warn(
+            "The XLA cache needs TensorFlow >= "
+            f"{'.'.join(map(str, _MIN_TF_VERSION))}, running without it."
+        )
+        return None
+    directory = os.path.join(os.path.expandvars(cache_root), key)
+    os.makedirs(directory, exist_ok=True)
+    flags = [
+        flag
+        for flag in os.environ.get("TF_XLA_FLAGS", "").split()
+        if not flag.startswith(_CACHE_FLAG)
+    ]
+    flags.append(f"{_CACHE_FLAG}={directory}")
+    os.environ["TF_XLA_FLAGS"] = " ".join(flags)
+    return directory
+
+
+@contextlib.contextmanager
+def xla_cache_enabled(cache_root, key):
+    """A context in which processes started by this process use the XLA
+    cache `<cache_root>/<key>`, see `enable_xla_cache`.  `TF_XLA_FLAGS` is
+    restored on exit.
+
+    :param cache_root: the root directory of the cache
+    :param key: a cache key, e.g. from `xla_cache_key`
+    :returns: the cache directory, or `None` if not enabled
+    """
+    previous = os.environ.get("TF_XLA_FLAGS")
+    try:
+        yield enable_xla_cache(cache_root, key)
+    finally:
+        if previous is None:
+            os.environ.pop("TF_XLA_FLAGS", None)
+        else:
+            os.environ["TF_XLA_FLAGS"] = previous
+
+
+def xla_cache_directory():
+    """Returns the XLA cache directory set in `TF_XLA_FLAGS`, or `None`"""
+    for flag in os.environ.get("TF_XLA_FLAGS", "").split():
+        if flag.startswith(f"{_CACHE_FLAG}="):
+            return flag.split("=", 1)[1]
+    return None
@@ -0,0 +1,80 @@
+"""Tests the XLA cache keys"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+import tensorflow as tf
+
+from covid.xla_cache import (
+    xla_cache_key,
+    enable_xla_cache,
+    xla_cache_enabled,
+    xla_cache_directory,
+    xla_cache_supported,
+)
+
+# Initialises TensorFlow, as importing `covid.model_spec` does, before
+#   running an XLA-compiled function
+_COMPILE_SCRIPT = """
+import tensorflow as tf
+
+tf.constant(0.28, dtype=tf.float64)
+
+
+@tf.function(experimental_compile=True)
+def f(x):
+    return tf.reduce_sum(x * x)
+
+
+f(tf.ones([3]))
+"""
+
+
+def test_xla_cache_key():
+    config = {"dmax": 84, "num_bursts": 200, "thin": 20}
+
+    key = xla_cache_key("0.5.0", 382, 84, config)
+    assert key.startswith("0.5.0-M382-T84-")
+    assert key == xla_cache_key("0.5.0", 382, 84, dict(config, num_bursts=1))
+    assert key != xla_cache_key("0.5.0", 382, 84, dict(config, dmax=21))
+    assert key != xla_cache_key("0.5.0", 382, 85, config)
+
+
+@pytest.mark.skipif(
+    not xla_cache_supported(), reason="TensorFlow without the XLA cache"
+)
+def test_enable_xla_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("TF_XLA_FLAGS", "--tf_xla_auto_jit=2")
+
+    directory = enable_xla_cache(str(tmp_path), "key")
+
+    assert os.path.isdir(directory)
+    assert os.environ["TF_XLA_FLAGS"] == (
+        f"--tf_xla_auto_jit=2 --tf_xla_persistent_cache_directory={directory}"
+    )
+    assert xla_cache_directory() == directory
+
+
+def test_enable_xla_cache_unsupported(tmp_path, monkeypatch):
+    monkeypatch.setenv("TF_XLA_FLAGS", "--tf_xla_auto_jit=2")
+    monkeypatch.setattr(tf, "__version__", "2.4.1")
+
+    with pytest.warns(UserWarning, match="TensorFlow >= 2.12"):
+        assert enable_xla_cache(str(tmp_path), "key") is None
+    assert os.environ["TF_XLA_FLAGS"] == "--tf_xla_auto_jit=2"
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.skipif(
+    not xla_cache_supported(), reason="TensorFlow without the XLA cache"
+)
+def test_xla_cache_enabled_process(tmp_path, monkeypatch):
+    monkeypatch.delenv("TF_XLA_FLAGS", raising=False)
+
+    with xla_cache_enabled(str(tmp_path), "key") as directory:
+        subprocess.run([sys.executable, "-c", _COMPILE_SCRIPT], check=True)
+
+    assert "TF_XLA_FLAGS" not in os.environ
+    assert len(os.listdir(directory)) > 0